@@ -0,0 +1,83 @@
+import os
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from common.downstream import AsyncDownstreamClient, service2_urls
+from common.resilience import AsyncResilientClient, ResilienceError, deadline, deadline_from_headers
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
+
+# --------------------------
+# Routes (async: a waiting request holds no thread)
+# --------------------------
+async def index(request):
+    with tracer.start_as_current_span("index-span"):
+        await WORKLOAD.arun("/")
+        return PlainTextResponse("Service 1 - Hello!")
+
+async def call_service2(request):
+    with tracer.start_as_current_span("call-service2"), deadline(deadline_from_headers(request.headers)):
+        try:
+            response = await downstream.get(SERVICE2_URLS[0])
+        except ResilienceError as exc:
+            return PlainTextResponse(f"Service 1 could not call Service 2: {exc}", exc.status)
+        return PlainTextResponse(f"Service 1 called Service 2, Response: {response.text}")
+
+async def call_service2_fanout(request):
+    with tracer.start_as_current_span("call-service2-fanout"):
+        responses = await downstream.fan_out(SERVICE2_URLS, return_exceptions=True)
+        ok = [r.text for r in responses if not isinstance(r, Exception)]
+        return PlainTextResponse(
+            f"Service 1 called {len(SERVICE2_URLS)} Service 2 replicas, {len(ok)} OK: {ok}"
+        )
+
+async def shutdown():
+    await downstream.aclose()
+    WORKLOAD.close()
+    telemetry.shutdown()
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/call_service2", call_service2),
+        Route("/call_service2_fanout", call_service2_fanout),
+    ],
+    on_shutdown=[shutdown],
+)
+
+# --------------------------
+# Telemetry Setup (traces → Tempo); Starlette and httpx are auto-instrumented
+# --------------------------
+telemetry = setup_telemetry(
+    "service1",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
+    instrument_httpx=True,
+)
+tracer = telemetry.tracer(__name__)
+
+# Pooled, keep-alive async client for service2 calls, with deadline, hedging,
+# circuit breaker and concurrency limit (common/resilience.py)
+downstream = AsyncResilientClient.from_env(
+    AsyncDownstreamClient.from_env(), meter=telemetry.meter("service1-downstream")
+)
+SERVICE2_URLS = service2_urls()
+
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env(
+    {"/": "sleep:uniform(0.1,0.5)"}, downstream=downstream, urls=SERVICE2_URLS
+)
+
+# --------------------------
+# Run under uvicorn; WEB_CONCURRENCY worker processes, each with its own loop
+# --------------------------
+if __name__ == "__main__":
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=5000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
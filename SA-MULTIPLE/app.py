@@ -1,62 +1,59 @@
 from flask import Flask
-import random
-import time
-import os
-
-from opentelemetry import trace
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
+
+from common.downstream import DownstreamClient, service2_urls
+from common.resilience import ResilienceError, ResilientClient, install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
-# Dynamic backend selection via environment variable
-backend = os.getenv("OTEL_BACKEND", "tempo")  # tempo, jaeger, dynatrace
+# Dynamic backend selection via the OTEL_BACKEND environment variable
+# (tempo, jaeger, dynatrace; default tempo). Only the selected exporter is
+# imported. A comma-separated list ("tempo,dynatrace") sends every span to
+# each backend through its own queue, encoded once (common/fanout.py).
+# Flask and requests are auto-instrumented by the bootstrap.
+telemetry = setup_telemetry(
+    "service1",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
+    instrument_requests=True,
+)
+tracer = telemetry.tracer(__name__)
 
-# Setup OTel Tracer
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service1"})
-    )
+# Pooled, keep-alive client for service2 calls, with deadline, hedging,
+# circuit breaker and concurrency limit (common/resilience.py)
+downstream = ResilientClient.from_env(
+    DownstreamClient.from_env(), meter=telemetry.meter("service1-downstream")
+)
+install_deadline(app)
+SERVICE2_URLS = service2_urls()
+
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env(
+    {"/": "sleep:uniform(0.1,0.5)"}, downstream=downstream, urls=SERVICE2_URLS
 )
-tracer = trace.get_tracer(__name__)
-
-# Configure exporter based on backend
-if backend == "tempo":
-    exporter = OTLPSpanExporter(endpoint="http://tempo:4318/v1/traces")
-elif backend == "jaeger":
-    exporter = JaegerExporter(agent_host_name="jaeger", agent_port=6831)
-elif backend == "dynatrace":
-    exporter = OTLPSpanExporter(
-        endpoint="https://<YOUR_DYNATRACE_TENANT>/api/v2/otlp/v1/traces",
-        headers=(("Authorization", "Api-Token <YOUR_TOKEN>"),)
-    )
-else:
-    raise ValueError(f"Unknown OTEL_BACKEND: {backend}")
-
-span_processor = BatchSpanProcessor(exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-# Auto-instrument Flask and requests
-FlaskInstrumentor().instrument_app(app)
-RequestsInstrumentor().instrument()
 
 @app.route("/")
 def index():
     with tracer.start_as_current_span("index-span"):
-        time.sleep(random.uniform(0.1, 0.5))
+        WORKLOAD.run("/")
         return "Service 1 - Hello!"
 
 @app.route("/call_service2")
 def call_service2():
     with tracer.start_as_current_span("call-service2"):
-        import requests
-        response = requests.get("http://service2:5001/")
+        try:
+            response = downstream.get(SERVICE2_URLS[0])
+        except ResilienceError as exc:
+            return f"Service 1 could not call Service 2: {exc}", exc.status
         return f"Service 1 called Service 2, Response: {response.text}"
 
+@app.route("/call_service2_fanout")
+def call_service2_fanout():
+    with tracer.start_as_current_span("call-service2-fanout"):
+        responses = downstream.fan_out(SERVICE2_URLS, return_exceptions=True)
+        ok = [r.text for r in responses if not isinstance(r, Exception)]
+        return f"Service 1 called {len(SERVICE2_URLS)} Service 2 replicas, {len(ok)} OK: {ok}"
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -1,97 +1,86 @@
 from flask import Flask
-import random
-import time
-import requests
 
-# OpenTelemetry imports
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.resources import Resource, SERVICE_NAME
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-
-# Logs
-from opentelemetry.sdk._logs import LoggerProvider
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
-
-# Metrics
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.exporter.prometheus import PrometheusMetricReader
+from common.coalesce import CoalescingClient
+from common.downstream import DownstreamClient, service2_urls
+from common.resilience import ResilienceError, ResilientClient, install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
 # --------------------------
-# 1️⃣ Tracing Setup
+# Telemetry Setup
+#   traces → OTel Collector (then → Tempo)
+#   metrics → Prometheus reader; request count/errors/duration are derived
+#             from the Flask server spans (span_metrics)
+#   logs → OTel Collector (then → Loki)
+# Flask and Requests are auto-instrumented by the bootstrap.
 # --------------------------
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service1"})
-    )
+telemetry = setup_telemetry(
+    "service1",
+    app=app,
+    traces_endpoint="http://otel-collector:4318/v1/traces",
+    metrics_exporter="prometheus",
+    logs_exporter="otlp",
+    logs_endpoint="http://otel-collector:4318/v1/logs",
+    instrument_requests=True,
+    span_metrics=True,
 )
-tracer = trace.get_tracer(__name__)
-
-# Export traces to OTel Collector (then → Tempo)
-trace_exporter = OTLPSpanExporter(endpoint="http://otel-collector:4318/v1/traces")
-trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(trace_exporter))
-
-# Auto-instrument Flask and Requests
-FlaskInstrumentor().instrument_app(app)
-RequestsInstrumentor().instrument()
-
-# --------------------------
-# 2️⃣ Metrics Setup (Prometheus)
-# --------------------------
-meter_provider = MeterProvider(
-    metric_readers=[PrometheusMetricReader()]
+tracer = telemetry.tracer(__name__)
+
+logger = telemetry.get_logger("service1-logs")
+
+# Pooled, keep-alive client for service2 calls. Concurrent identical GETs
+# share one in-flight call; DOWNSTREAM_CACHE_TTL/DOWNSTREAM_CACHE_STALE add a
+# response cache. The result (miss, coalesced, hit, stale) is set on the span.
+# Underneath, each call gets a deadline, a hedge after the observed p95, a
+# circuit breaker and a per-upstream concurrency limit (common/resilience.py).
+downstream_meter = telemetry.meter("service1-downstream")
+downstream = CoalescingClient.from_env(
+    ResilientClient.from_env(DownstreamClient.from_env(), meter=downstream_meter),
+    meter=downstream_meter,
 )
-metrics.set_meter_provider(meter_provider)
-meter = metrics.get_meter("service1-metrics")
+# Callers may send their remaining budget as X-Request-Deadline-Ms
+install_deadline(app)
+SERVICE2_URLS = service2_urls()
 
-request_counter = meter.create_counter(
-    name="http_requests_total",
-    description="Total HTTP requests"
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env(
+    {"/": "sleep:uniform(0.1,0.5)"}, downstream=downstream, urls=SERVICE2_URLS
 )
 
-# --------------------------
-# 3️⃣ Logging Setup
-# --------------------------
-logger_provider = LoggerProvider(
-    resource=Resource.create({SERVICE_NAME: "service1"})
-)
-
-# Send logs to OTel Collector (then → Loki)
-log_exporter = OTLPLogExporter(endpoint="http://otel-collector:4318/v1/logs")
-logger_provider.add_log_record_processor(BatchLogRecordProcessor(log_exporter))
-
-
-logger = logger_provider.get_logger("service1-logs")
-
 # --------------------------
 # Routes
 # --------------------------
 @app.route("/")
 def index():
-    # Metrics
-    request_counter.add(1, {"endpoint": "/"})
     # Logs
     logger.info("Index endpoint called")
     # Traces
     with tracer.start_as_current_span("index-span"):
-        time.sleep(random.uniform(0.1, 0.5))
+        WORKLOAD.run("/")
         return "Service 1 - Hello!"
 
 @app.route("/call_service2")
 def call_service2():
-    request_counter.add(1, {"endpoint": "/call_service2"})
     logger.info("Calling service2")
     with tracer.start_as_current_span("call-service2"):
-        response = requests.get("http://service2:5001/")
-        logger.info(f"Response from service2: {response.text}")
+        try:
+            response = downstream.get(SERVICE2_URLS[0])
+        except ResilienceError as exc:
+            logger.warning("service2 call failed: %s", exc)
+            return f"Service 1 could not call Service 2: {exc}", exc.status
+        logger.info("Response from service2: %s", response.text)
         return f"Service 1 called Service 2, Response: {response.text}"
 
+@app.route("/call_service2_fanout")
+def call_service2_fanout():
+    logger.info("Fanning out to %d service2 replicas", len(SERVICE2_URLS))
+    with tracer.start_as_current_span("call-service2-fanout"):
+        responses = downstream.fan_out(SERVICE2_URLS, return_exceptions=True)
+        ok = [r.text for r in responses if not isinstance(r, Exception)]
+        return f"Service 1 called {len(SERVICE2_URLS)} Service 2 replicas, {len(ok)} OK: {ok}"
+
 # --------------------------
 # Run Flask App
 # --------------------------
@@ -1,47 +1,62 @@
 from flask import Flask
-import random
-import time
 
-from opentelemetry import trace
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
+from common.coalesce import CoalescingClient
+from common.downstream import DownstreamClient, service2_urls
+from common.resilience import ResilienceError, ResilientClient, install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
-# Setup OTel Tracer for Tempo
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service1"})
-    )
+# Setup OTel tracing for Tempo (Tempo listens on 4318 by default for HTTP);
+# Flask and Requests are auto-instrumented by the bootstrap
+telemetry = setup_telemetry(
+    "service1",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
+    instrument_requests=True,
 )
-tracer = trace.get_tracer(__name__)
-
-# Configure OTLP Exporter to Tempo (Tempo listens on 4318 by default for HTTP)
-otlp_exporter = OTLPSpanExporter(endpoint="http://tempo:4318/v1/traces")
-
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+tracer = telemetry.tracer(__name__)
+
+# Pooled, keep-alive client for service2 calls. Concurrent identical GETs
+# share one in-flight call; DOWNSTREAM_CACHE_TTL/DOWNSTREAM_CACHE_STALE add a
+# response cache. The result (miss, coalesced, hit, stale) is set on the span.
+# Underneath, each call gets a deadline, a hedge after the observed p95, a
+# circuit breaker and a per-upstream concurrency limit (common/resilience.py).
+downstream_meter = telemetry.meter("service1-downstream")
+downstream = CoalescingClient.from_env(
+    ResilientClient.from_env(DownstreamClient.from_env(), meter=downstream_meter),
+    meter=downstream_meter,
+)
+install_deadline(app)
+SERVICE2_URLS = service2_urls()
 
-# Auto-instrument Flask and Requests
-FlaskInstrumentor().instrument_app(app)
-RequestsInstrumentor().instrument()
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env(
+    {"/": "sleep:uniform(0.1,0.5)"}, downstream=downstream, urls=SERVICE2_URLS
+)
 
 @app.route("/")
 def index():
     with tracer.start_as_current_span("index-span"):
-        time.sleep(random.uniform(0.1, 0.5))
+        WORKLOAD.run("/")
         return "Service 1 - Hello!"
 
 @app.route("/call_service2")
 def call_service2():
     with tracer.start_as_current_span("call-service2"):
-        import requests
-        response = requests.get("http://service2:5001/")
+        try:
+            response = downstream.get(SERVICE2_URLS[0])
+        except ResilienceError as exc:
+            return f"Service 1 could not call Service 2: {exc}", exc.status
         return f"Service 1 called Service 2, Response: {response.text}"
 
+@app.route("/call_service2_fanout")
+def call_service2_fanout():
+    with tracer.start_as_current_span("call-service2-fanout"):
+        responses = downstream.fan_out(SERVICE2_URLS, return_exceptions=True)
+        ok = [r.text for r in responses if not isinstance(r, Exception)]
+        return f"Service 1 called {len(SERVICE2_URLS)} Service 2 replicas, {len(ok)} OK: {ok}"
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
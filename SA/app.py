@@ -1,35 +1,53 @@
 from flask import Flask
-import requests
-import opentracing
-from jaeger_client import Config
-import random
-import time
+
+from common.downstream import DownstreamClient, service2_urls
+from common.resilience import ResilienceError, ResilientClient, install_deadline
+from common.telemetry import init_jaeger_tracer
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
 # Jaeger Tracing Setup
-def init_tracer(service_name='service1'):
-    config = Config(
-        config={'sampler': {'type': 'const', 'param': 1}, 'logging': True},
-        service_name=service_name,
-    )
-    return config.initialize_tracer()
+tracer = init_jaeger_tracer('service1')
+
+# Pooled, keep-alive client for service2 calls, with deadline, hedging,
+# circuit breaker and concurrency limit (common/resilience.py)
+downstream = ResilientClient.from_env(DownstreamClient.from_env())
+install_deadline(app)
+
+SERVICE2_URLS = service2_urls()
 
-tracer = init_tracer()
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env(
+    {'/': 'sleep:uniform(0.1,0.5)'}, downstream=downstream, urls=SERVICE2_URLS
+)
 
 @app.route('/')
 def index():
     span = tracer.start_span('index-span')
-    time.sleep(random.uniform(0.1, 0.5))  # Simulate work
+    WORKLOAD.run('/')
     span.finish()
     return "Service 1 - Hello!"
 
 @app.route('/call_service2')
 def call_service2():
     span = tracer.start_span('call-service2')
-    response = requests.get('http://service2:5001/')
-    span.finish()
+    try:
+        response = downstream.get(SERVICE2_URLS[0])
+    except ResilienceError as exc:
+        span.set_tag('error', True)
+        return f"Service 1 could not call Service 2: {exc}", exc.status
+    finally:
+        span.finish()
     return f"Service 1 called Service 2, Response: {response.text}"
 
+@app.route('/call_service2_fanout')
+def call_service2_fanout():
+    span = tracer.start_span('call-service2-fanout')
+    responses = downstream.fan_out(SERVICE2_URLS, return_exceptions=True)
+    span.finish()
+    ok = [r.text for r in responses if not isinstance(r, Exception)]
+    return f"Service 1 called {len(SERVICE2_URLS)} Service 2 replicas, {len(ok)} OK: {ok}"
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
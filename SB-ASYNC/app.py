@@ -0,0 +1,52 @@
+import os
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from common.resilience import ResilienceError, deadline, deadline_from_headers
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
+
+# --------------------------
+# Routes (async: a waiting request holds no thread)
+# --------------------------
+async def index(request):
+    # Work within the budget service1 sends as X-Request-Deadline-Ms
+    with tracer.start_as_current_span("service2-span"), deadline(deadline_from_headers(request.headers)):
+        try:
+            await WORKLOAD.arun("/")
+        except ResilienceError as exc:
+            return PlainTextResponse(str(exc), exc.status)
+        return PlainTextResponse("Service 2 - Hello!")
+
+async def shutdown():
+    WORKLOAD.close()
+    telemetry.shutdown()
+
+app = Starlette(routes=[Route("/", index)], on_shutdown=[shutdown])
+
+# --------------------------
+# Telemetry Setup (traces → Tempo); Starlette is auto-instrumented
+# --------------------------
+telemetry = setup_telemetry(
+    "service2",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
+)
+tracer = telemetry.tracer(__name__)
+
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)"})
+
+# --------------------------
+# Run under uvicorn; WEB_CONCURRENCY worker processes, each with its own loop
+# --------------------------
+if __name__ == "__main__":
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=5001,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -1,52 +1,34 @@
 from flask import Flask
-import random
-import time
-import os
 
-from opentelemetry import trace
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
+from common.resilience import install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
-# Dynamic backend selection via environment variable
-backend = os.getenv("OTEL_BACKEND", "tempo")  # tempo, jaeger, dynatrace
-
-# Setup OTel Tracer
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service2"})
-    )
+# Dynamic backend selection via the OTEL_BACKEND environment variable
+# (tempo, jaeger, dynatrace; default tempo). Only the selected exporter is
+# imported. A comma-separated list ("tempo,dynatrace") sends every span to
+# each backend through its own queue, encoded once (common/fanout.py).
+# Flask is auto-instrumented by the bootstrap.
+telemetry = setup_telemetry(
+    "service2",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
 )
-tracer = trace.get_tracer(__name__)
-
-# Configure exporter based on backend
-if backend == "tempo":
-    exporter = OTLPSpanExporter(endpoint="http://tempo:4318/v1/traces")
-elif backend == "jaeger":
-    exporter = JaegerExporter(agent_host_name="jaeger", agent_port=6831)
-elif backend == "dynatrace":
-    exporter = OTLPSpanExporter(
-        endpoint="https://<YOUR_DYNATRACE_TENANT>/api/v2/otlp/v1/traces",
-        headers=(("Authorization", "Api-Token <YOUR_TOKEN>"),)
-    )
-else:
-    raise ValueError(f"Unknown OTEL_BACKEND: {backend}")
+tracer = telemetry.tracer(__name__)
 
-span_processor = BatchSpanProcessor(exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+# Work within the budget service1 sends as X-Request-Deadline-Ms: an expired
+# request gets a 504 and the simulated work stops at the deadline
+install_deadline(app)
 
-# Auto-instrument Flask
-FlaskInstrumentor().instrument_app(app)
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)"})
 
 @app.route("/")
 def index():
     with tracer.start_as_current_span("service2-span"):
-        time.sleep(random.uniform(0.1, 0.5))
+        WORKLOAD.run("/")
         return "Service 2 - Hello!"
 
 if __name__ == "__main__":
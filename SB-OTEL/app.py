@@ -1,80 +1,47 @@
 from flask import Flask
-import random
-import time
 
-# OpenTelemetry imports
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-
-# Logs
-from opentelemetry.sdk._logs import LoggerProvider
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
-
-# Metrics
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.exporter.prometheus import PrometheusMetricReader
+from common.resilience import install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
 # --------------------------
-# 1️⃣ Tracing Setup
-# --------------------------
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service2"})
-    )
-)
-tracer = trace.get_tracer(__name__)
-
-# Export traces to OTel Collector (then → Tempo)
-trace_exporter = OTLPSpanExporter(endpoint="http://otel-collector:4318/v1/traces")
-trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(trace_exporter))
-
-# Auto-instrument Flask
-FlaskInstrumentor().instrument_app(app)
-
-# --------------------------
-# 2️⃣ Metrics Setup (Prometheus)
-# --------------------------
-meter_provider = MeterProvider(
-    metric_readers=[PrometheusMetricReader()]
-)
-metrics.set_meter_provider(meter_provider)
-meter = metrics.get_meter("service2-metrics")
-
-request_counter = meter.create_counter(
-    name="http_requests_total",
-    description="Total HTTP requests"
-)
-
-# --------------------------
-# 3️⃣ Logging Setup
-# --------------------------
-logger_provider = LoggerProvider(
-    resource=Resource.create({SERVICE_NAME: "service2"})
+# Telemetry Setup
+#   traces → OTel Collector (then → Tempo)
+#   metrics → Prometheus reader; request count/errors/duration are derived
+#             from the Flask server spans (span_metrics)
+#   logs → OTel Collector (then → Loki)
+# Flask is auto-instrumented by the bootstrap.
+# --------------------------
+telemetry = setup_telemetry(
+    "service2",
+    app=app,
+    traces_endpoint="http://otel-collector:4318/v1/traces",
+    metrics_exporter="prometheus",
+    logs_exporter="otlp",
+    logs_endpoint="http://otel-collector:4318/v1/logs",
+    span_metrics=True,
 )
+tracer = telemetry.tracer(__name__)
 
-# Export logs to OTel Collector (then → Loki)
-log_exporter = OTLPLogExporter(endpoint="http://otel-collector:4318/v1/logs")
-logger_provider.add_log_record_processor(BatchLogRecordProcessor(log_exporter))
+# Work within the budget service1 sends as X-Request-Deadline-Ms: an expired
+# request gets a 504 and the simulated work stops at the deadline
+install_deadline(app)
 
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)"})
 
-logger = logger_provider.get_logger("service2-logs")
+logger = telemetry.get_logger("service2-logs")
 
 # --------------------------
 # Routes
 # --------------------------
 @app.route("/")
 def index():
-    request_counter.add(1, {"endpoint": "/"})
     logger.info("Service2 index endpoint called")
     with tracer.start_as_current_span("service2-span"):
-        time.sleep(random.uniform(0.1, 0.5))
+        WORKLOAD.run("/")
         return "Service 2 - Hello!"
 
 # --------------------------
@@ -1,37 +1,31 @@
 from flask import Flask
-import random
-import time
 
-from opentelemetry import trace
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
+from common.resilience import install_deadline
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
-# Setup OTel Tracer for Tempo
-trace.set_tracer_provider(
-    TracerProvider(
-        resource=Resource.create({SERVICE_NAME: "service2"})
-    )
+# Setup OTel tracing for Tempo (default Tempo listens on 4318 for HTTP);
+# Flask is auto-instrumented by the bootstrap
+telemetry = setup_telemetry(
+    "service2",
+    app=app,
+    traces_endpoint="http://tempo:4318/v1/traces",
 )
-tracer = trace.get_tracer(__name__)
+tracer = telemetry.tracer(__name__)
 
-# Configure OTLP Exporter to Tempo (default Tempo listens on 4318 for HTTP)
-otlp_exporter = OTLPSpanExporter(endpoint="http://tempo:4318/v1/traces")
+# Work within the budget service1 sends as X-Request-Deadline-Ms: an expired
+# request gets a 504 and the simulated work stops at the deadline
+install_deadline(app)
 
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-# Auto-instrument Flask
-FlaskInstrumentor().instrument_app(app)
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)"})
 
 @app.route("/")
 def index():
     with tracer.start_as_current_span("service2-span"):
-        time.sleep(random.uniform(0.1, 0.5))  # Simulate work
+        WORKLOAD.run("/")
         return "Service 2 - Hello!"
 
 if __name__ == "__main__":
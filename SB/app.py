@@ -1,26 +1,28 @@
 from flask import Flask
-import opentracing
-from jaeger_client import Config
-import random
-import time
+
+from common.resilience import install_deadline
+from common.telemetry import init_jaeger_tracer
+from common.workload import WorkloadEngine
 
 app = Flask(__name__)
 
 # Jaeger Tracing Setup
-def init_tracer(service_name='service2'):
-    config = Config(
-        config={'sampler': {'type': 'const', 'param': 1}, 'logging': True},
-        service_name=service_name,
-    )
-    return config.initialize_tracer()
+tracer = init_jaeger_tracer('service2')
+
+# Work within the budget service1 sends as X-Request-Deadline-Ms: an expired
+# request gets a 504 and the simulated work stops at the deadline
+install_deadline(app)
 
-tracer = init_tracer()
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({'/': 'sleep:uniform(0.1,0.5)'})
 
 @app.route('/')
 def index():
     span = tracer.start_span('service2-span')
-    time.sleep(random.uniform(0.1, 0.5))  # Simulate work
-    span.finish()
+    try:
+        WORKLOAD.run('/')
+    finally:
+        span.finish()
     return "Service 2 - Hello!"
 
 if __name__ == '__main__':
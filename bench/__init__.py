@@ -0,0 +1,4 @@
+# bench/__init__.py
+#
+# Benchmarks for the demo services. Run from the repo root, e.g.
+#   python -m bench.overhead --help
@@ -0,0 +1,452 @@
+# bench/critpath.py
+#
+# Offline analysis of OTLP trace dumps: per-operation duration, self time,
+# critical-path time and client->server network gap, aggregated over any
+# number of traces.
+#
+#   python -m bench.critpath dump.jsonl [more files ...] [--report critpath.json]
+#
+# Inputs, streamed one request at a time (".gz" files are decompressed on the fly):
+#   *.json / *.jsonl   OTLP/JSON, one ExportTraceServiceRequest per line (the
+#                      collector's file exporter); a file holding a single JSON
+#                      document (OTLP "resourceSpans" or Tempo "batches") is
+#                      read whole
+#   *.pb / *.bin       varint length-delimited ExportTraceServiceRequest messages
+#
+# Memory stays bounded: spans are buffered per trace and a trace is analysed
+# once it hasn't received spans for --trace-window requests (and at the end of
+# input), in chunks of about --chunk-spans spans. Results go into fixed
+# log-scale histograms (2% resolution) per operation, so the aggregate is the
+# same size after a thousand traces or a hundred million.
+#
+# Per chunk the span trees are built with NumPy (parent lookup by
+# searchsorted over hashed (trace, span id) keys, self time from the union of
+# each span's child intervals). The critical path is walked per trace: from
+# the end of a span, the child that finished last is on the path, then the
+# child that finished last before that one started, and so on; time not
+# covered by such a child is the span's own critical-path time.
+#
+# Needs numpy (pip install numpy); protobuf input also needs opentelemetry-proto.
+import argparse
+import base64
+import gzip
+import json
+import math
+import sys
+
+import numpy as np
+
+SERVER, CLIENT = 2, 3
+_KIND_NAMES = {"SPAN_KIND_INTERNAL": 1, "SPAN_KIND_SERVER": 2, "SPAN_KIND_CLIENT": 3,
+               "SPAN_KIND_PRODUCER": 4, "SPAN_KIND_CONSUMER": 5}
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+# Children are rebased to their parent's start and spaced 2**40 ns (~18 min)
+# apart per parent so one cumulative max covers every parent in the chunk
+_GROUP_SPACING = 1 << 40
+
+# Log-scale histogram: bucket b covers [1us * 1.02**b, 1us * 1.02**(b+1))
+_BASE_NS = 1000.0
+_GROWTH = 1.02
+_BUCKETS = 1100
+
+
+def _buckets(values_ns):
+    scaled = np.maximum(values_ns.astype(np.float64), _BASE_NS) / _BASE_NS
+    return np.minimum((np.log(scaled) / math.log(_GROWTH)).astype(np.int64), _BUCKETS - 1)
+
+
+def _percentile(histogram, pct):
+    total = histogram.sum()
+    if not total:
+        return None
+    bucket = int(np.searchsorted(np.cumsum(histogram), math.ceil(pct / 100 * total)))
+    return _BASE_NS * _GROWTH ** (bucket + 1) / 1e6  # upper bound, in ms
+
+
+# --------------------------
+# Input
+# --------------------------
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _read_varint(stream):
+    shift = result = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if shift:
+                raise ValueError("truncated length prefix")
+            return None
+        result |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return result
+        shift += 7
+
+
+def _id(value, size):
+    if not value:
+        return 0
+    if len(value) == size * 2:
+        return int(value, 16)
+    return int.from_bytes(base64.b64decode(value), "big")
+
+
+def _value(any_value):
+    for key, value in any_value.items():
+        if key == "intValue":
+            return int(value)
+        return value
+    return None
+
+
+def _json_requests(document):
+    """Normalise one OTLP/JSON (or Tempo) document into (service, span dict) pairs."""
+    for resource_spans in document.get("resourceSpans") or document.get("batches") or ():
+        service = "unknown_service"
+        for attribute in resource_spans.get("resource", {}).get("attributes", ()):
+            if attribute["key"] == "service.name":
+                service = _value(attribute["value"])
+        for scope_spans in resource_spans.get("scopeSpans") or resource_spans.get(
+            "instrumentationLibrarySpans", ()
+        ):
+            for span in scope_spans.get("spans", ()):
+                kind = span.get("kind", 0)
+                code = span.get("status", {}).get("code", 0)
+                yield (
+                    _id(span["traceId"], 16),
+                    _id(span["spanId"], 8),
+                    _id(span.get("parentSpanId"), 8),
+                    int(span["startTimeUnixNano"]),
+                    int(span["endTimeUnixNano"]),
+                    _KIND_NAMES.get(kind, 0) if isinstance(kind, str) else kind,
+                    code in (2, "STATUS_CODE_ERROR"),
+                    service,
+                    span["name"],
+                )
+
+
+def _proto_request(message):
+    for resource_spans in message.resource_spans:
+        service = "unknown_service"
+        for kv in resource_spans.resource.attributes:
+            if kv.key == "service.name":
+                service = kv.value.string_value
+        for scope_spans in resource_spans.scope_spans:
+            for span in scope_spans.spans:
+                yield (
+                    int.from_bytes(span.trace_id, "big"),
+                    int.from_bytes(span.span_id, "big"),
+                    int.from_bytes(span.parent_span_id, "big") if span.parent_span_id else 0,
+                    span.start_time_unix_nano,
+                    span.end_time_unix_nano,
+                    span.kind,
+                    span.status.code == 2,
+                    service,
+                    span.name,
+                )
+
+
+def read_requests(path):
+    """Yield each request in a dump as an iterator of span tuples."""
+    stem = path[:-3] if path.endswith(".gz") else path
+    with _open(path) as stream:
+        if stem.endswith((".pb", ".bin")):
+            from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+                ExportTraceServiceRequest,
+            )
+
+            while True:
+                size = _read_varint(stream)
+                if size is None:
+                    return
+                message = ExportTraceServiceRequest()
+                message.ParseFromString(stream.read(size))
+                yield _proto_request(message)
+        first = stream.readline()
+        rest = stream.readline()
+        if rest and not first.strip().endswith(b"}"):
+            # Pretty-printed single document
+            yield _json_requests(json.loads(first + rest + stream.read()))
+            return
+        for line in (first, rest):
+            if line.strip():
+                yield _json_requests(json.loads(line))
+        for line in stream:
+            if line.strip():
+                yield _json_requests(json.loads(line))
+
+
+# --------------------------
+# Buffering
+# --------------------------
+class _TraceBuffer:
+    """Spans grouped by trace until the trace is considered complete."""
+
+    def __init__(self):
+        self.spans = {}  # trace id -> list of span tuples
+        self.last_seen = {}  # trace id -> request number
+        self.count = 0
+
+    def add(self, span, request_number):
+        trace_id = span[0]
+        self.spans.setdefault(trace_id, []).append(span)
+        self.last_seen[trace_id] = request_number
+        self.count += 1
+
+    def take(self, older_than=None):
+        """Remove and return the traces not seen since `older_than` (all if None)."""
+        done = [
+            trace_id for trace_id, seen in self.last_seen.items()
+            if older_than is None or seen < older_than
+        ]
+        traces = []
+        for trace_id in done:
+            spans = self.spans.pop(trace_id)
+            del self.last_seen[trace_id]
+            self.count -= len(spans)
+            traces.append(spans)
+        return traces
+
+
+# --------------------------
+# Analysis
+# --------------------------
+class Analyzer:
+    def __init__(self):
+        self.operations = {}  # (service, name) -> op id
+        self.op_names = []
+        self.edges = {}  # (client service, server service) -> edge id
+        self.edge_names = []
+        self.counts = np.zeros(0, np.int64)
+        self.errors = np.zeros(0, np.int64)
+        self.duration = np.zeros((0, _BUCKETS), np.int64)
+        self.self_time = np.zeros((0, _BUCKETS), np.int64)
+        self.critical = np.zeros((0, _BUCKETS), np.int64)
+        self.critical_total_ns = np.zeros(0, np.float64)
+        self.gap = np.zeros((0, _BUCKETS), np.int64)
+        self.traces = 0
+        self.spans = 0
+
+    def _intern(self, table, names, key):
+        index = table.get(key)
+        if index is None:
+            index = table[key] = len(names)
+            names.append(key)
+        return index
+
+    def _grow(self):
+        ops, edges = len(self.op_names), len(self.edge_names)
+        pad = lambda a, n: np.concatenate([a, np.zeros((n - a.shape[0],) + a.shape[1:], a.dtype)])
+        self.counts, self.errors = pad(self.counts, ops), pad(self.errors, ops)
+        self.duration, self.self_time = pad(self.duration, ops), pad(self.self_time, ops)
+        self.critical, self.critical_total_ns = pad(self.critical, ops), pad(self.critical_total_ns, ops)
+        self.gap = pad(self.gap, edges)
+
+    @staticmethod
+    def _histogram(groups, values, size):
+        flat = groups * _BUCKETS + _buckets(values)
+        return np.bincount(flat, minlength=size * _BUCKETS).reshape(size, _BUCKETS)
+
+    def add_traces(self, traces):
+        if not traces:
+            return
+        spans = [span for trace in traces for span in trace]
+        n = len(spans)
+        trace_index = np.repeat(np.arange(len(traces), dtype=np.int64), [len(t) for t in traces])
+        span_id = np.fromiter((s[1] for s in spans), np.uint64, n)
+        parent_id = np.fromiter((s[2] for s in spans), np.uint64, n)
+        start = np.fromiter((s[3] for s in spans), np.int64, n)
+        end = np.maximum(np.fromiter((s[4] for s in spans), np.int64, n), start)
+        kind = np.fromiter((s[5] for s in spans), np.int8, n)
+        error = np.fromiter((s[6] for s in spans), np.bool_, n)
+        op = np.fromiter(
+            (self._intern(self.operations, self.op_names, (s[7], s[8])) for s in spans), np.int64, n
+        )
+        service = [s[7] for s in spans]
+        duration = end - start
+
+        # Parent row of every span (-1 for roots and orphans)
+        salt = trace_index.astype(np.uint64) * _MIX
+        keys = span_id ^ salt
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, parent_id ^ salt), n - 1)
+        candidate = order[pos]
+        found = (parent_id != 0) & (sorted_keys[pos] == (parent_id ^ salt)) & (
+            trace_index[candidate] == trace_index
+        )
+        parent = np.where(found, candidate, -1)
+
+        # Self time: duration minus the union of child intervals clipped to the parent
+        children = np.nonzero(parent >= 0)[0]
+        covered = np.zeros(n, np.int64)
+        if len(children):
+            p = parent[children]
+            child_start = np.clip(start[children], start[p], end[p]) - start[p]
+            child_end = np.clip(end[children], start[p], end[p]) - start[p]
+            by_parent = np.lexsort((child_start, p))
+            p, child_start, child_end = p[by_parent], child_start[by_parent], child_end[by_parent]
+            _, group = np.unique(p, return_inverse=True)
+            offset = group.astype(np.int64) * _GROUP_SPACING
+            child_start = np.minimum(child_start, _GROUP_SPACING - 1) + offset
+            child_end = np.minimum(child_end, _GROUP_SPACING - 1) + offset
+            previous_end = np.concatenate([[0], np.maximum.accumulate(child_end)[:-1]])
+            contribution = np.maximum(child_end - np.maximum(child_start, previous_end), 0)
+            covered = np.bincount(p, weights=contribution, minlength=n).astype(np.int64)
+        self_time = np.maximum(duration - covered, 0)
+
+        critical = self._critical_path(parent, start, end)
+
+        # Network gap: client span time not spent in its remote server child
+        remote = np.nonzero(found & (kind == SERVER))[0]
+        remote = remote[kind[parent[remote]] == CLIENT]
+        edge = np.fromiter(
+            (
+                self._intern(self.edges, self.edge_names, (service[parent[r]], service[r]))
+                for r in remote
+            ),
+            np.int64,
+            len(remote),
+        )
+        gap = np.maximum(duration[parent[remote]] - duration[remote], 0)
+
+        self._grow()
+        ops = len(self.op_names)
+        self.counts += np.bincount(op, minlength=ops)
+        self.errors += np.bincount(op, weights=error, minlength=ops).astype(np.int64)
+        self.duration += self._histogram(op, duration, ops)
+        self.self_time += self._histogram(op, self_time, ops)
+        on_path = critical > 0
+        self.critical += self._histogram(op[on_path], critical[on_path], ops)
+        self.critical_total_ns += np.bincount(op, weights=critical, minlength=ops)
+        if len(remote):
+            self.gap += self._histogram(edge, gap, len(self.edge_names))
+        self.traces += len(traces)
+        self.spans += n
+
+    @staticmethod
+    def _critical_path(parent, start, end):
+        n = len(parent)
+        critical = np.zeros(n, np.int64)
+        children = np.nonzero(parent >= 0)[0]
+        # Children grouped by parent, latest end first
+        order = children[np.lexsort((-end[children], parent[children]))]
+        grouped_parent = parent[order]
+        first = np.searchsorted(grouped_parent, np.arange(n), side="left")
+        last = np.searchsorted(grouped_parent, np.arange(n), side="right")
+        start_l, end_l, order_l = start.tolist(), end.tolist(), order.tolist()
+        first_l, last_l = first.tolist(), last.tolist()
+        critical_l = [0] * n
+
+        for root in np.nonzero(parent < 0)[0].tolist():
+            stack = [(root, end_l[root])]
+            while stack:
+                span, cursor = stack.pop()
+                own = 0
+                for i in range(first_l[span], last_l[span]):
+                    child = order_l[i]
+                    if start_l[child] >= cursor:
+                        continue
+                    child_end = min(end_l[child], cursor)
+                    own += cursor - child_end
+                    stack.append((child, child_end))
+                    cursor = start_l[child]
+                own += max(cursor - start_l[span], 0)
+                critical_l[span] = own
+        critical[:] = critical_l
+        return critical
+
+    # --------------------------
+    # Report
+    # --------------------------
+    def report(self):
+        operations = []
+        for op, (service, name) in enumerate(self.op_names):
+            histogram = lambda h: {f"p{p}": _round(_percentile(h[op], p)) for p in (50, 90, 99)}
+            operations.append(
+                {
+                    "service": service,
+                    "name": name,
+                    "count": int(self.counts[op]),
+                    "errors": int(self.errors[op]),
+                    "duration_ms": histogram(self.duration),
+                    "self_ms": histogram(self.self_time),
+                    "critical_path_ms": histogram(self.critical),
+                    "critical_path_share": round(
+                        float(self.critical_total_ns[op] / self.critical_total_ns.sum()), 4
+                    ) if self.critical_total_ns.sum() else None,
+                }
+            )
+        operations.sort(key=lambda o: -(o["critical_path_share"] or 0))
+        edges = [
+            {
+                "client_service": client,
+                "server_service": server,
+                "count": int(self.gap[e].sum()),
+                "network_gap_ms": {f"p{p}": _round(_percentile(self.gap[e], p)) for p in (50, 90, 99)},
+            }
+            for e, (client, server) in enumerate(self.edge_names)
+        ]
+        return {"traces": self.traces, "spans": self.spans, "operations": operations, "network": edges}
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def analyze(paths, chunk_spans=200_000, trace_window=1000):
+    analyzer = Analyzer()
+    buffer = _TraceBuffer()
+    request_number = next_check = 0
+    for path in paths:
+        for request in read_requests(path):
+            request_number += 1
+            for span in request:
+                buffer.add(span, request_number)
+            if buffer.count >= chunk_spans and request_number >= next_check:
+                analyzer.add_traces(buffer.take(older_than=request_number - trace_window))
+                # Everything left is recent; don't rescan the buffer on every request
+                next_check = request_number + max(trace_window // 10, 1)
+    analyzer.add_traces(buffer.take())
+    return analyzer
+
+
+def _print_report(report):
+    print(f"{report['traces']} traces, {report['spans']} spans")
+    header = f"{'operation':<40} {'count':>8} {'err':>6} {'p50 ms':>9} {'p99 ms':>9} {'self p50':>9} {'crit p50':>9} {'crit %':>7}"
+    print(header)
+    print("-" * len(header))
+    for o in report["operations"]:
+        share = o["critical_path_share"]
+        print(
+            f"{(o['service'] + ' ' + o['name'])[:40]:<40} {o['count']:>8} {o['errors']:>6} "
+            f"{o['duration_ms']['p50'] or '-':>9} {o['duration_ms']['p99'] or '-':>9} "
+            f"{o['self_ms']['p50'] or '-':>9} {o['critical_path_ms']['p50'] or '-':>9} "
+            f"{'-' if share is None else round(share * 100, 1):>7}"
+        )
+    for e in report["network"]:
+        gap = e["network_gap_ms"]
+        print(f"network {e['client_service']} -> {e['server_service']}: n={e['count']} "
+              f"p50={gap['p50']} p90={gap['p90']} p99={gap['p99']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Critical-path and self-time analysis of OTLP trace dumps")
+    parser.add_argument("paths", nargs="+", help="OTLP JSON lines or length-delimited protobuf files")
+    parser.add_argument("--chunk-spans", type=int, default=200_000, help="spans analysed per chunk")
+    parser.add_argument("--trace-window", type=int, default=1000,
+                        help="requests after which a trace without new spans is treated as complete")
+    parser.add_argument("--report", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    report = analyze(args.paths, args.chunk_spans, args.trace_window).report()
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
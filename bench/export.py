@@ -0,0 +1,314 @@
+# bench/export.py
+#
+# OTLP export transport benchmark.
+#
+# Builds a fixed set of spans (or metric data points) once, then exports it
+# through the exporter layer in common/telemetry.py for every combination of
+# protocol, compression and batch size. The stub receivers (OTLP/HTTP and
+# OTLP/gRPC, each behind a byte-counting TCP proxy) run in a child process,
+# so the CPU time read here belongs to encoding, compression and the
+# transport alone.
+#
+#   python -m bench.export                              # spans, full matrix
+#   python -m bench.export --signal metrics
+#   python -m bench.export -p grpc -c gzip -b 512 -b 2048 --items 50000
+#
+# Reported per setting: export latency per batch, CPU ms per 1k items, bytes
+# on the wire per 1k items (request direction, including headers/framing)
+# and the ratio to the uncompressed protobuf payload. zstd is measured for
+# OTLP/HTTP spans only, through the spilling exporter, and only when the
+# zstandard package is installed.
+import argparse
+import datetime
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.load import percentile
+from common.telemetry import TelemetryConfig, _otlp_exporter
+
+PROTOCOLS = ["http/protobuf", "grpc"]
+COMPRESSIONS = ["none", "gzip", "deflate", "zstd"]
+ROUTES = ["/", "/call_service2", "/call_service2_fanout", "/error"]
+
+
+# --------------------------
+# Receiver side (runs in the child process)
+# --------------------------
+def receive():
+    from bench.stubs import ByteCountingProxy, StubCollector, StubGrpcCollector
+
+    http = StubCollector().start()
+    grpc = StubGrpcCollector().start()
+    proxies = {
+        "http/protobuf": ByteCountingProxy(http.port).start(),
+        "grpc": ByteCountingProxy(grpc.port).start(),
+    }
+    print(json.dumps({name: proxy.port for name, proxy in proxies.items()}), flush=True)
+    # One "stats" line in, one JSON line out, until the driver closes stdin
+    for _ in sys.stdin:
+        print(json.dumps({name: proxy.snapshot() for name, proxy in proxies.items()}), flush=True)
+    http.stop()
+    grpc.stop()
+
+
+class _Receivers:
+    def __init__(self):
+        self.child = subprocess.Popen(
+            [sys.executable, "-m", "bench.export", "receive"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.ports = json.loads(self.child.stdout.readline())
+
+    def stats(self):
+        self.child.stdin.write("stats\n")
+        self.child.stdin.flush()
+        return json.loads(self.child.stdout.readline())
+
+    def close(self):
+        self.child.stdin.close()
+        self.child.wait(timeout=10)
+
+
+# --------------------------
+# Test data
+# --------------------------
+def make_spans(count):
+    """`count` finished spans shaped like service1 traffic (server, internal, client)."""
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.trace import SpanKind
+
+    memory = InMemorySpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": "service1"}))
+    provider.add_span_processor(SimpleSpanProcessor(memory))
+    tracer = provider.get_tracer("bench.export")
+
+    for i in range(0, count, 3):
+        route = ROUTES[i % len(ROUTES)]
+        with tracer.start_as_current_span(
+            route,
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.method": "GET",
+                "http.route": route,
+                "http.target": route,
+                "http.scheme": "http",
+                "http.status_code": 200,
+                "net.host.name": "service1",
+                "net.peer.ip": f"10.0.{i % 256}.{i % 7}",
+                "http.user_agent": "python-requests/2.31.0",
+            },
+        ):
+            with tracer.start_as_current_span("call-service2"):
+                with tracer.start_as_current_span(
+                    "GET",
+                    kind=SpanKind.CLIENT,
+                    attributes={
+                        "http.method": "GET",
+                        "http.url": "http://service2:5001/",
+                        "http.status_code": 200,
+                    },
+                ):
+                    pass
+    provider.shutdown()
+    return list(memory.get_finished_spans())[:count]
+
+
+def make_metrics(count):
+    """One MetricsData with about `count` data points (RED metrics per route/instance)."""
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.resources import Resource
+
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(
+        metric_readers=[reader], resource=Resource.create({"service.name": "service1"})
+    )
+    meter = provider.get_meter("bench.export")
+    requests_total = meter.create_counter("http_requests_total")
+    duration = meter.create_histogram("http_request_duration_seconds", unit="s")
+    for i in range((count + 1) // 2):
+        attributes = {
+            "endpoint": ROUTES[i % len(ROUTES)],
+            "status_class": "5xx" if i % 13 == 0 else "2xx",
+            "instance": f"worker-{i}",
+        }
+        requests_total.add(1, attributes)
+        duration.record(0.001 * (i % 500), attributes)
+    data = reader.get_metrics_data()
+    provider.shutdown()
+    return data
+
+
+def _data_points(metrics_data):
+    return sum(
+        len(metric.data.data_points)
+        for resource_metrics in metrics_data.resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    )
+
+
+def _raw_bytes(signal, batch):
+    if signal == "traces":
+        from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+
+        return encode_spans(batch).ByteSize()
+    from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+
+    return encode_metrics(batch).ByteSize()
+
+
+# --------------------------
+# Driver side
+# --------------------------
+def _exporter(signal, protocol, compression, port, spill_dir):
+    base = f"http://127.0.0.1:{port}"
+    endpoint = base if protocol == "grpc" else f"{base}/v1/{signal}"
+    config = TelemetryConfig(
+        service_name="bench",
+        spill_dir=spill_dir if compression == "zstd" else "",
+        **{
+            f"{signal}_protocol": protocol,
+            f"{signal}_endpoint": endpoint,
+            f"{signal}_compression": compression,
+        },
+    )
+    return _otlp_exporter(config, signal)
+
+
+def _settings(args):
+    try:
+        import zstandard  # noqa: F401
+
+        have_zstd = True
+    except ImportError:
+        have_zstd = False
+    for protocol in args.protocols or PROTOCOLS:
+        for compression in args.compressions or COMPRESSIONS:
+            if compression == "zstd" and not (
+                have_zstd and protocol != "grpc" and args.signal == "traces"
+            ):
+                continue
+            for batch_size in args.batch_sizes or [512]:
+                yield protocol, compression, batch_size
+
+
+def run_setting(args, receivers, data, protocol, compression, batch_size, spill_dir):
+    if args.signal == "traces":
+        batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+        items = len(data)
+    else:
+        # Metrics are exported as one MetricsData per collection, repeated
+        batches = [data] * args.repeat
+        items = _data_points(data) * args.repeat
+    raw_bytes = sum(_raw_bytes(args.signal, batch) for batch in batches)
+
+    exporter = _exporter(args.signal, protocol, compression, receivers.ports[protocol], spill_dir)
+    try:
+        exporter.export(batches[0])  # connect, warm caches
+
+        before = receivers.stats()[protocol]
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        latencies = []
+        failures = 0
+        for batch in batches:
+            start = time.perf_counter()
+            result = exporter.export(batch)
+            latencies.append(time.perf_counter() - start)
+            failures += getattr(result, "name", "SUCCESS") != "SUCCESS"
+        wall_seconds = time.perf_counter() - wall_before
+        cpu_seconds = time.process_time() - cpu_before
+        after = receivers.stats()[protocol]
+    finally:
+        exporter.shutdown()
+
+    wire_bytes = after["sent"] - before["sent"]
+    latencies.sort()
+    per_1k = 1000 / items
+    return {
+        "protocol": protocol,
+        "compression": compression,
+        "batch_size": batch_size if args.signal == "traces" else None,
+        "items": items,
+        "exports": len(batches),
+        "failures": failures,
+        "wall_seconds": round(wall_seconds, 3),
+        "export_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+        },
+        "cpu_ms_per_1k": round(cpu_seconds * 1000 * per_1k, 3),
+        "wire_bytes_per_1k": round(wire_bytes * per_1k),
+        "raw_bytes_per_1k": round(raw_bytes * per_1k),
+        "wire_to_raw": round(wire_bytes / raw_bytes, 3) if raw_bytes else None,
+    }
+
+
+def _print_table(results, signal):
+    unit = "spans" if signal == "traces" else "points"
+    header = (
+        f"{'protocol':<14} {'compr':<8} {'batch':>6} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'cpu ms/1k ' + unit:>18} {'wire B/1k ' + unit:>18} {'wire/raw':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['protocol']:<14} {r['compression']:<8} {r['batch_size'] or '-':>6} "
+            f"{r['export_ms']['p50']:>8} {r['export_ms']['p99']:>8} {r['cpu_ms_per_1k']:>18} "
+            f"{r['wire_bytes_per_1k']:>18} {r['wire_to_raw'] or '-':>9}"
+        )
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "receive":
+        return receive()
+
+    parser = argparse.ArgumentParser(description="OTLP export transport benchmark")
+    parser.add_argument("--signal", choices=["traces", "metrics"], default="traces")
+    parser.add_argument("-p", "--protocol", dest="protocols", action="append", choices=PROTOCOLS)
+    parser.add_argument("-c", "--compression", dest="compressions", action="append", choices=COMPRESSIONS)
+    parser.add_argument("-b", "--batch-size", dest="batch_sizes", action="append", type=int,
+                        help="spans per export, repeatable (default 512, the SDK default)")
+    parser.add_argument("--items", type=int, default=20000, help="spans, or data points per export")
+    parser.add_argument("--repeat", type=int, default=20, help="metrics: exports per setting")
+    parser.add_argument("--report", default="bench-export.json", help="where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    data = make_spans(args.items) if args.signal == "traces" else make_metrics(args.items)
+    receivers = _Receivers()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-export-spill-") as spill_dir:
+            for protocol, compression, batch_size in _settings(args):
+                print(f"running {protocol} {compression} batch={batch_size} ...", file=sys.stderr)
+                results.append(
+                    run_setting(args, receivers, data, protocol, compression, batch_size, spill_dir)
+                )
+    finally:
+        receivers.close()
+
+    report = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "signal": args.signal,
+        "results": results,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_table(results, args.signal)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# bench/histograms.py
+#
+# Histogram aggregation / temporality comparison for the OTel metric apps.
+#
+# Records the mimir/flask-app-otel workload (flask_request_latency_seconds
+# and flask_work_time_seconds per endpoint and status class, plus the request
+# counter) into an SDK MeterProvider for each aggregation mode and temporality
+# of common/aggregation.py, collects it once per export interval, and reports:
+#
+#   bytes per export        OTLP protobuf payload size, raw and gzipped
+#   points per export       data points sent (delta mode skips idle series)
+#   mimir series            series the collector's remote write creates:
+#                           explicit histogram = buckets + _sum + _count per
+#                           attribute set, exponential = one native histogram
+#   p50/p99 error           relative error of the quantile estimated from the
+#                           final histogram against the exact recorded value
+#
+#   python -m bench.histograms
+#   python -m bench.histograms --intervals 60 --requests 2000 --report bench-histograms.json
+#
+# Modes: "default" (SDK explicit buckets, meant for milliseconds), "seconds"
+# (explicit buckets for second-based latencies via per-instrument views),
+# "exponential" (max_size 160) and "exponential-40" (max_size 40).
+import argparse
+import datetime
+import gzip
+import json
+import math
+import random
+import sys
+
+from bench.load import percentile
+from common.aggregation import (
+    EXPLICIT,
+    EXPONENTIAL,
+    histogram_views,
+    preferred_aggregation,
+    preferred_temporality,
+)
+
+LATENCY = "flask_request_latency_seconds"
+WORK = "flask_work_time_seconds"
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+MODES = {
+    "default": {"aggregation": EXPLICIT},
+    "seconds": {"aggregation": EXPLICIT, "buckets": {LATENCY: SECONDS_BUCKETS, WORK: SECONDS_BUCKETS}},
+    "exponential": {"aggregation": EXPONENTIAL, "max_size": 160},
+    "exponential-40": {"aggregation": EXPONENTIAL, "max_size": 40},
+}
+TEMPORALITIES = ["cumulative", "delta"]
+
+# (route, share of traffic, latency sampler) after the flask-app handlers
+ROUTES = [
+    ("/", 0.6, lambda rng: rng.uniform(0.1, 0.5)),
+    ("/work", 0.35, lambda rng: rng.uniform(0.2, 1.0) + rng.expovariate(20)),
+    ("/error", 0.05, lambda rng: rng.lognormvariate(math.log(0.002), 0.5)),
+]
+
+
+def workload(intervals, requests, seed):
+    """Per interval, a list of (route, status class, latency); a few routes go idle."""
+    rng = random.Random(seed)
+    routes = [r for r, _, _ in ROUTES]
+    weights = [w for _, w, _ in ROUTES]
+    samplers = {r: s for r, _, s in ROUTES}
+    batches = []
+    for interval in range(intervals):
+        # /error only fails in bursts: idle in most intervals, as in production
+        active = routes if interval % 4 == 0 else routes[:2]
+        chosen = rng.choices(active, weights[: len(active)], k=requests)
+        batches.append(
+            [(route, "5xx" if route == "/error" else "2xx", samplers[route](rng)) for route in chosen]
+        )
+    return batches
+
+
+# --------------------------
+# Quantiles from data points
+# --------------------------
+def _interpolate(cumulative, counts, lower_bounds, upper_bounds, rank):
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower, upper = lower_bounds[i], upper_bounds[i]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return None
+
+
+def explicit_quantile(point, q):
+    bounds = list(point.explicit_bounds)
+    lower = [point.min] + bounds
+    upper = bounds + [point.max]
+    # Clamp the bucket edges to the observed range
+    lower = [min(max(b, point.min), point.max) for b in lower]
+    upper = [min(max(b, point.min), point.max) for b in upper]
+    return _interpolate(0, list(point.bucket_counts), lower, upper, q * point.count)
+
+
+def exponential_quantile(point, q):
+    base = 2 ** (2 ** -point.scale)
+    offset = point.positive.offset
+    counts = list(point.positive.bucket_counts)
+    lower = [base ** (offset + i) for i in range(len(counts))]
+    upper = [base ** (offset + i + 1) for i in range(len(counts))]
+    rank = q * point.count
+    if rank <= point.zero_count:
+        return 0.0
+    value = _interpolate(point.zero_count, counts, lower, upper, rank)
+    return None if value is None else min(max(value, point.min), point.max)
+
+
+# --------------------------
+# One run
+# --------------------------
+def _iter_metrics(metrics_data):
+    for resource_metrics in metrics_data.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            yield from scope_metrics.metrics
+
+
+def _series(point, is_histogram, exponential):
+    if not is_histogram:
+        return 1
+    if exponential:
+        return 1  # native histogram
+    return len(point.bucket_counts) + 2  # le buckets (incl. +Inf), _sum, _count
+
+
+def run_mode(mode, temporality, batches):
+    from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.resources import Resource
+
+    settings = MODES[mode]
+    exponential = settings["aggregation"] == EXPONENTIAL
+    reader = InMemoryMetricReader(
+        preferred_temporality=preferred_temporality(temporality),
+        preferred_aggregation=preferred_aggregation(
+            settings["aggregation"], max_size=settings.get("max_size", 160)
+        ),
+    )
+    provider = MeterProvider(
+        metric_readers=[reader],
+        resource=Resource.create({"service.name": "flask-app"}),
+        views=histogram_views(settings.get("buckets", {})),
+    )
+    meter = provider.get_meter("bench.histograms")
+    requests_total = meter.create_counter("flask_request_count_total")
+    latency = meter.create_histogram(LATENCY, unit="s")
+    work = meter.create_histogram(WORK, unit="s")
+
+    raw_bytes, gzip_bytes, points = [], [], []
+    series = {}  # (metric, attributes) -> series count
+    last_points = {}  # (metric, route) -> last data point
+    exact = {}  # (metric, route) -> recorded values
+    for batch in batches:
+        for route, status_class, seconds in batch:
+            attributes = {"endpoint": route, "status_class": status_class}
+            requests_total.add(1, attributes)
+            latency.record(seconds, attributes)
+            exact.setdefault((LATENCY, route), []).append(seconds)
+            if route == "/work":
+                work.record(seconds, {"endpoint": route})
+                exact.setdefault((WORK, route), []).append(seconds)
+        data = reader.get_metrics_data()
+        if data is None:
+            raw_bytes.append(0)
+            gzip_bytes.append(0)
+            points.append(0)
+            continue
+        payload = encode_metrics(data).SerializeToString()
+        raw_bytes.append(len(payload))
+        gzip_bytes.append(len(gzip.compress(payload)))
+        exported = 0
+        for metric in _iter_metrics(data):
+            is_histogram = metric.name in (LATENCY, WORK)
+            for point in metric.data.data_points:
+                exported += 1
+                key = (metric.name, tuple(sorted(point.attributes.items())))
+                series[key] = max(series.get(key, 0), _series(point, is_histogram, exponential))
+                if is_histogram and temporality == "cumulative":
+                    last_points[(metric.name, point.attributes["endpoint"])] = point
+        points.append(exported)
+    provider.shutdown()
+
+    errors = {}
+    for (name, route), point in last_points.items():
+        values = sorted(exact[(name, route)])
+        for q in (0.5, 0.99):
+            estimate = (exponential_quantile if exponential else explicit_quantile)(point, q)
+            true = percentile(values, q * 100)
+            if estimate is not None and true:
+                errors.setdefault(f"p{int(q * 100)}", []).append(abs(estimate - true) / true)
+    return {
+        "mode": mode,
+        "temporality": temporality,
+        "bytes_per_export": round(sum(raw_bytes) / len(raw_bytes)),
+        "gzip_bytes_per_export": round(sum(gzip_bytes) / len(gzip_bytes)),
+        "points_per_export": round(sum(points) / len(points), 1),
+        "mimir_series": sum(series.values()),
+        # Quantile error is a property of the aggregation; measured on cumulative runs
+        "p50_error": round(max(errors["p50"]), 4) if errors.get("p50") else None,
+        "p99_error": round(max(errors["p99"]), 4) if errors.get("p99") else None,
+    }
+
+
+def _print_table(results):
+    header = (
+        f"{'mode':<16} {'temporality':<11} {'B/export':>9} {'gz B/export':>12} "
+        f"{'points':>7} {'series':>7} {'p50 err':>8} {'p99 err':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['mode']:<16} {r['temporality']:<11} {r['bytes_per_export']:>9} "
+            f"{r['gzip_bytes_per_export']:>12} {r['points_per_export']:>7} {r['mimir_series']:>7} "
+            f"{r['p50_error'] if r['p50_error'] is not None else '-':>8} "
+            f"{r['p99_error'] if r['p99_error'] is not None else '-':>8}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histogram aggregation and temporality comparison")
+    parser.add_argument("-m", "--mode", dest="modes", action="append", choices=list(MODES))
+    parser.add_argument("-t", "--temporality", dest="temporalities", action="append", choices=TEMPORALITIES)
+    parser.add_argument("--intervals", type=int, default=24, help="export intervals to simulate")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per interval")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", default="bench-histograms.json", help="where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    batches = workload(args.intervals, args.requests, args.seed)
+    results = []
+    for mode in args.modes or list(MODES):
+        errors = None
+        for temporality in args.temporalities or TEMPORALITIES:
+            print(f"running {mode} {temporality} ...", file=sys.stderr)
+            result = run_mode(mode, temporality, batches)
+            if result["p50_error"] is None and errors is not None:
+                result["p50_error"], result["p99_error"] = errors
+            errors = result["p50_error"], result["p99_error"]
+            results.append(result)
+
+    report = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "intervals": args.intervals,
+        "requests_per_interval": args.requests,
+        "results": results,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
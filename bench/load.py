@@ -0,0 +1,148 @@
+# bench/load.py
+#
+# HTTP load generation and latency statistics shared by the benchmarks.
+#
+#   closed_loop(): `concurrency` workers send back-to-back requests
+#   open_loop():   requests are started on a fixed schedule (target RPS or a
+#                  replayed workload file) no matter how slow responses are,
+#                  and latency is measured from the scheduled start, so a
+#                  stalled server shows up in the tail instead of hiding it
+#
+# Workload files are JSONL, one request per line:
+#   {"path": "/call_service2", "t": 0.25}
+# where "t" is the offset in seconds from the start of the run. Lines without
+# "t" are spaced evenly at the requested RPS, and lines without "path" (for
+# example the backlog's requests.jsonl) fall back to the default paths in turn.
+import itertools
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    to_ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "requests": len(ordered) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": to_ms(sum(ordered) / len(ordered)) if ordered else None,
+            "p50": to_ms(percentile(ordered, 50)),
+            "p95": to_ms(percentile(ordered, 95)),
+            "p99": to_ms(percentile(ordered, 99)),
+            "max": to_ms(ordered[-1]) if ordered else None,
+        },
+    }
+
+
+class _Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def add(self, latency, ok):
+        with self._lock:
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+
+_local = threading.local()
+
+
+def _session():
+    # One keep-alive session per load thread
+    session = getattr(_local, "session", None)
+    if session is None:
+        import requests
+
+        session = _local.session = requests.Session()
+    return session
+
+
+def _fetch(url, timeout):
+    # Imported here so percentile()/summarize() users (bench.remotewrite)
+    # don't need requests installed
+    import requests
+
+    try:
+        return _session().get(url, timeout=timeout).ok
+    except requests.RequestException:
+        return False
+
+
+def closed_loop(base_url, paths, concurrency, duration, timeout=10.0):
+    recorder = _Recorder()
+    deadline = time.perf_counter() + duration
+    path_cycle = itertools.cycle(paths)
+    cycle_lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with cycle_lock:
+                path = next(path_cycle)
+            start = time.perf_counter()
+            ok = _fetch(base_url + path, timeout)
+            recorder.add(time.perf_counter() - start, ok)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder.latencies, recorder.errors, time.perf_counter() - start)
+
+
+def read_workload(path, default_paths, rps):
+    """[(offset_seconds, path)] from a JSONL workload file."""
+    schedule = []
+    fallback = itertools.cycle(default_paths)
+    with open(path) as f:
+        for index, line in enumerate(filter(None, (l.strip() for l in f))):
+            entry = json.loads(line)
+            target = entry.get("path") if isinstance(entry.get("path"), str) else None
+            offset = entry.get("t")
+            schedule.append(
+                (float(offset) if offset is not None else index / rps, target or next(fallback))
+            )
+    schedule.sort()
+    return schedule
+
+
+def fixed_rate_schedule(paths, rps, duration):
+    count = int(rps * duration)
+    path_cycle = itertools.cycle(paths)
+    return [(i / rps, next(path_cycle)) for i in range(count)]
+
+
+def open_loop(base_url, schedule, concurrency, timeout=10.0):
+    recorder = _Recorder()
+
+    def send(scheduled, path):
+        ok = _fetch(base_url + path, timeout)
+        recorder.add(time.perf_counter() - scheduled, ok)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset, path in schedule:
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled, path)
+    return summarize(recorder.latencies, recorder.errors, time.perf_counter() - start)
@@ -0,0 +1,298 @@
+# bench/overhead.py
+#
+# Instrumentation-overhead benchmark for the service1 variants.
+#
+# Each variant's app.py is imported into its own server process (the OTel
+# SDK keeps global providers, so variants can't share a process), served
+# with werkzeug's threaded server, and pointed at a local stub collector
+# and a stub service2 that run in this process. Load comes from this process
+# too, so the CPU and RSS read from /proc/<pid> belong to the app alone.
+#
+#   python -m bench.overhead                          # all variants, closed loop
+#   python -m bench.overhead -v baseline -v SA-OTEL --concurrency 32 --duration 30
+#   python -m bench.overhead --rps 200                # open loop at 200 req/s
+#   python -m bench.overhead --workload load.jsonl    # open-loop replay
+#   python -m bench.overhead --compare old.json       # exit 1 on regressions
+#
+# The handlers' simulated work (time.sleep) is scaled by --sleep-scale;
+# the default of 0 removes it so the numbers show the instrumentation cost.
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from bench.load import closed_loop, fixed_rate_schedule, open_loop, read_workload
+from bench.stubs import StubCollector, StubService2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# variant -> (app.py path or None for the built-in baseline, extra env)
+VARIANTS = {
+    "baseline": (None, {}),
+    "SA": ("SA/app.py", {}),
+    "SA-TEMPO": ("SA-TEMPO/app.py", {}),
+    "SA-OTEL": ("SA-OTEL/app.py", {}),
+    "SA-MULTIPLE": ("SA-MULTIPLE/app.py", {"OTEL_BACKEND": "tempo"}),
+}
+DEFAULT_PATHS = ["/", "/call_service2"]
+
+
+# --------------------------
+# Server side (runs in the child process)
+# --------------------------
+class _ScaledTime:
+    """Stands in for the `time` module inside an app, scaling sleep()."""
+
+    def __init__(self, scale):
+        self._scale = scale
+
+    def sleep(self, seconds):
+        if self._scale:
+            time.sleep(seconds * self._scale)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def _baseline_app(sleep_scale):
+    """Same routes as service1 with no telemetry at all."""
+    import random
+
+    from flask import Flask
+
+    from common.downstream import DownstreamClient, service2_urls
+
+    app = Flask(__name__)
+    downstream = DownstreamClient.from_env()
+    urls = service2_urls()
+
+    @app.route("/")
+    def index():
+        if sleep_scale:
+            time.sleep(random.uniform(0.1, 0.5) * sleep_scale)
+        return "Service 1 - Hello!"
+
+    @app.route("/call_service2")
+    def call_service2():
+        response = downstream.get(urls[0])
+        return f"Service 1 called Service 2, Response: {response.text}"
+
+    return app
+
+
+def _load_app(variant, sleep_scale):
+    app_path = VARIANTS[variant][0]
+    if app_path is None:
+        return _baseline_app(sleep_scale)
+    app_path = os.path.join(REPO_ROOT, app_path)
+    spec = importlib.util.spec_from_file_location(f"bench_app_{variant.replace('-', '_')}", app_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.time = _ScaledTime(sleep_scale)
+    return module.app
+
+
+def serve(variant, port, sleep_scale):
+    from werkzeug.serving import make_server
+
+    started = time.perf_counter()
+    app = _load_app(variant, sleep_scale)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    print(json.dumps({"ready": True, "startup_seconds": time.perf_counter() - started}), flush=True)
+    server.serve_forever()
+
+
+# --------------------------
+# Driver side
+# --------------------------
+def _proc_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of the full line
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _proc_memory_mb(pid):
+    memory = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                memory[key] = int(value.split()[0]) / 1024
+    return round(memory.get("VmRSS", 0), 1), round(memory.get("VmHWM", 0), 1)
+
+
+def _free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_variant(variant, args, collector, service2):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update(VARIANTS[variant][1])
+    env.update(
+        {
+            "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")])),
+            "SERVICE2_URL": f"{service2.url}/",
+            "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT": f"{collector.url}/v1/traces",
+            "OTEL_EXPORTER_OTLP_LOGS_ENDPOINT": f"{collector.url}/v1/logs",
+            "OTEL_EXPORTER_OTLP_METRICS_ENDPOINT": f"{collector.url}/v1/metrics",
+            "JAEGER_AGENT_HOST": "127.0.0.1",
+        }
+    )
+    child = subprocess.Popen(
+        [sys.executable, "-m", "bench.overhead", "serve", variant, str(port), str(args.sleep_scale)],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        ready = json.loads(child.stdout.readline() or "{}")
+        if not ready.get("ready"):
+            raise RuntimeError(f"{variant} server failed to start")
+        base_url = f"http://127.0.0.1:{port}"
+
+        # Warm up connection pools, lazy imports and caches
+        for path in args.paths * max(1, args.warmup // len(args.paths)):
+            requests.get(base_url + path, timeout=args.timeout)
+
+        exported_before = collector.snapshot()
+        cpu_before = _proc_cpu_seconds(child.pid)
+        if args.workload:
+            schedule = read_workload(args.workload, args.paths, args.rps or 100)
+            result = open_loop(base_url, schedule, args.concurrency, args.timeout)
+        elif args.rps:
+            schedule = fixed_rate_schedule(args.paths, args.rps, args.duration)
+            result = open_loop(base_url, schedule, args.concurrency, args.timeout)
+        else:
+            result = closed_loop(base_url, args.paths, args.concurrency, args.duration, args.timeout)
+        cpu_seconds = _proc_cpu_seconds(child.pid) - cpu_before
+        rss_mb, max_rss_mb = _proc_memory_mb(child.pid)
+
+        completed = result["requests"] - result["errors"]
+        result.update(
+            {
+                "startup_seconds": round(ready["startup_seconds"], 4),
+                "cpu_seconds": round(cpu_seconds, 3),
+                "cpu_ms_per_request": round(cpu_seconds * 1000 / completed, 4) if completed else None,
+                "rss_mb": rss_mb,
+                "max_rss_mb": max_rss_mb,
+                "exported": _diff_exported(exported_before, collector.snapshot()),
+            }
+        )
+        return result
+    finally:
+        child.terminate()
+        child.wait(timeout=10)
+
+
+def _diff_exported(before, after):
+    return {
+        path: {
+            key: stats[key] - before.get(path, {}).get(key, 0) for key in ("requests", "bytes")
+        }
+        for path, stats in after.items()
+    }
+
+
+# Lower is better for all of these
+COMPARED = [("latency_ms", "p50"), ("latency_ms", "p99"), ("cpu_ms_per_request",), ("max_rss_mb",)]
+
+
+def compare(report, previous, tolerance):
+    regressions = []
+    for variant, result in report["variants"].items():
+        old = previous.get("variants", {}).get(variant)
+        if not old:
+            continue
+        for path in COMPARED:
+            new_value, old_value = result, old
+            for key in path:
+                new_value, old_value = new_value.get(key), old_value.get(key)
+            if new_value and old_value and new_value > old_value * (1 + tolerance):
+                regressions.append(
+                    f"{variant} {'.'.join(path)}: {old_value} -> {new_value} "
+                    f"(+{(new_value / old_value - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def _print_table(report):
+    header = f"{'variant':<12} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cpu ms/req':>11} {'rss MB':>8} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for variant, r in report["variants"].items():
+        lat = r["latency_ms"]
+        print(
+            f"{variant:<12} {r['throughput_rps']:>9} {lat['p50'] or '-':>9} {lat['p95'] or '-':>9} "
+            f"{lat['p99'] or '-':>9} {r['cpu_ms_per_request'] or '-':>11} {r['rss_mb']:>8} {r['errors']:>7}"
+        )
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        variant, port, sleep_scale = argv[1], int(argv[2]), float(argv[3])
+        return serve(variant, port, sleep_scale)
+
+    parser = argparse.ArgumentParser(description="Instrumentation-overhead benchmark for the service1 variants")
+    parser.add_argument("-v", "--variant", action="append", choices=list(VARIANTS), help="repeatable; default all")
+    parser.add_argument("--path", dest="paths", action="append", help="repeatable; default / and /call_service2")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds (closed loop and --rps)")
+    parser.add_argument("--rps", type=float, default=0, help="open-loop arrival rate; 0 = closed loop")
+    parser.add_argument("--workload", help="JSONL workload file replayed open-loop")
+    parser.add_argument("--warmup", type=int, default=50, help="requests sent before measuring")
+    parser.add_argument("--sleep-scale", type=float, default=0.0, help="multiplier for the handlers' time.sleep")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--report", default="bench-report.json", help="where to write the JSON report")
+    parser.add_argument("--compare", help="previous report; exit 1 if a metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression ratio for --compare")
+    args = parser.parse_args(argv)
+    args.paths = args.paths or DEFAULT_PATHS
+
+    collector = StubCollector().start()
+    service2 = StubService2().start()
+    report = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {
+            key: getattr(args, key)
+            for key in ("paths", "concurrency", "duration", "rps", "workload", "warmup", "sleep_scale")
+        },
+        "variants": {},
+    }
+    try:
+        for variant in args.variant or list(VARIANTS):
+            print(f"running {variant} ...", file=sys.stderr)
+            report["variants"][variant] = run_variant(variant, args, collector, service2)
+    finally:
+        collector.stop()
+        service2.stop()
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_table(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
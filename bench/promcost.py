@@ -0,0 +1,525 @@
+# bench/promcost.py
+#
+# PromQL cost analysis for the Grafana dashboards and rule files, and a
+# recording-rule generator for what they repeat.
+#
+#   python -m bench.promcost mimir/operations
+#   python -m bench.promcost mimir/operations --out promcost-out --report promcost.json
+#
+# Every Prometheus panel target (Loki targets are skipped) and every rule /
+# alert expression is parsed with bench/promql.py and given an estimated cost:
+#
+#   selector        series x samples read; a *_bucket selector counts as 10x the
+#                   series, each fixed "=" matcher halves them, a range reads
+#                   range / scrape interval samples per series
+#   subquery        inner cost x range / step
+#   functions, aggregations, binary operators
+#                   their inputs' cost plus one unit per input series
+#
+# per evaluation; a dashboard query is a range query of --points steps run at
+# the dashboard's refresh rate (--refresh when it has none), a rule runs once
+# per group interval. The units are relative: they rank queries and estimate
+# savings, they don't predict seconds.
+#
+# Reported: the most expensive queries per hour, queries that are identical
+# (after normalisation) across panels and files, the subexpressions shared
+# most often, and recording-rule candidates:
+#
+#   sum|min|max|count [by|without (...)] ([histogram_count|histogram_sum(]rate|irate|increase(metric{...}[range]))
+#
+# used by at least --min-uses dashboard targets. Matchers on dashboard
+# variables ($cluster, $namespace, ...) can't go into a rule, so their labels
+# are added to the rule's "by" clause and the matchers are applied to the
+# recorded series instead; $__rate_interval becomes --rate-interval. A
+# candidate equal to a rule already in rules.yaml reuses that rule's series.
+#
+# With --out, recording-rules.yaml and the dashboards rewritten to read the
+# recorded series are written to that directory; the inputs are not changed.
+import argparse
+import collections
+import copy
+import hashlib
+import json
+import math
+import os
+import sys
+
+from bench.promql import (
+    Aggregate,
+    Binary,
+    Call,
+    Number,
+    ParseError,
+    Paren,
+    Selector,
+    String,
+    Subquery,
+    Var,
+    duration_seconds,
+    parse,
+)
+
+RANGE_FUNCTIONS = ("rate", "irate", "increase")
+ADDITIVE_WRAPPERS = ("histogram_count", "histogram_sum")
+RULE_AGGREGATIONS = ("sum", "min", "max", "count")
+
+Query = collections.namedtuple("Query", "source location kind expr node evals_per_hour steps target")
+
+
+# --------------------------
+# Cost model
+# --------------------------
+class CostModel:
+    def __init__(self, variables, scrape_seconds=15, subquery_step_seconds=60):
+        self.variables = variables
+        self.scrape_seconds = scrape_seconds
+        self.subquery_step_seconds = subquery_step_seconds
+
+    def _seconds(self, text, default=60):
+        seconds = duration_seconds(text, self.variables)
+        return seconds if seconds else default
+
+    def selector_series(self, selector):
+        metric = selector.metric() or ""
+        series = 10.0 if metric.endswith("_bucket") else 1.0
+        for matcher in selector.matchers:
+            if matcher.op == "=" and not matcher.dynamic and matcher.label != "__name__":
+                series *= 0.5
+        return max(series, 0.01)
+
+    def cost(self, node):
+        """(cost per evaluation, estimated output series) of `node`."""
+        if isinstance(node, Selector):
+            series = self.selector_series(node)
+            samples = math.ceil(self._seconds(node.range) / self.scrape_seconds) if node.range else 1
+            return series * samples, series
+        if isinstance(node, Subquery):
+            cost, series = self.cost(node.expr)
+            step = self._seconds(node.step, self.subquery_step_seconds) if node.step else self.subquery_step_seconds
+            return cost * max(self._seconds(node.range) / step, 1), series
+        if isinstance(node, (Number, String, Var)):
+            return 0.0, 1.0
+        if isinstance(node, Paren):
+            return self.cost(node.expr)
+        if isinstance(node, Aggregate):
+            cost, series = self.cost(node.expr)
+            if node.param is not None:
+                cost += self.cost(node.param)[0]
+            if node.op in ("topk", "bottomk", "limitk"):
+                out = series
+            elif node.grouping == "by":
+                out = min(series, 3.0 ** len(node.labels))
+            elif node.grouping == "without":
+                out = max(series / 3.0 ** len(node.labels), 1.0)
+            else:
+                out = 1.0
+            return cost + series, out
+        if isinstance(node, Binary):
+            lhs_cost, lhs_series = self.cost(node.lhs)
+            rhs_cost, rhs_series = self.cost(node.rhs)
+            series = max(lhs_series, rhs_series)
+            return lhs_cost + rhs_cost + series, series
+        costs = [self.cost(child) for child in node.children()]
+        series = max((s for _, s in costs), default=1.0)
+        return sum(c for c, _ in costs) + series, series
+
+
+def aggregation_depth(node):
+    children = [aggregation_depth(child) for child in node.children()]
+    return (1 if isinstance(node, Aggregate) else 0) + max(children, default=0)
+
+
+# --------------------------
+# Loading
+# --------------------------
+def _refresh_per_hour(refresh, default):
+    seconds = duration_seconds(refresh or default) or duration_seconds(default)
+    return 3600 / seconds
+
+
+def _time_range_seconds(dashboard, default_seconds=3600):
+    start = (dashboard.get("time") or {}).get("from", "")
+    if start.startswith("now-"):
+        return duration_seconds(start[4:]) or default_seconds
+    return default_seconds
+
+
+def _is_loki(datasource):
+    if isinstance(datasource, dict):
+        return datasource.get("type") == "loki"
+    return isinstance(datasource, str) and "loki" in datasource.lower()
+
+
+def _panels(node, inherited_datasource=None):
+    """(panel, datasource) for every panel with targets, including rows and nested panels."""
+    if isinstance(node, dict):
+        datasource = node.get("datasource", inherited_datasource)
+        if isinstance(node.get("targets"), list):
+            yield node, datasource
+        for key in ("panels", "rows"):
+            for child in node.get(key) or ():
+                yield from _panels(child, datasource)
+
+
+def load_dashboard(path, args, errors):
+    with open(path) as f:
+        dashboard = json.load(f)
+    evals = _refresh_per_hour(dashboard.get("refresh"), args.refresh)
+    range_seconds = _time_range_seconds(dashboard)
+    steps = min(args.points, max(range_seconds // args.scrape_interval, 1))
+    queries = []
+    for panel, datasource in _panels(dashboard):
+        for index, target in enumerate(panel["targets"]):
+            expr = target.get("expr")
+            if not isinstance(expr, str) or not expr.strip():
+                continue
+            if _is_loki(target.get("datasource", datasource)):
+                continue
+            location = f"{panel.get('title') or 'untitled'} [{target.get('refId') or index}]"
+            try:
+                node = parse(expr)
+            except ParseError as exc:
+                errors.append({"source": path, "location": location, "error": str(exc)})
+                continue
+            queries.append(Query(path, location, "dashboard", expr, node, evals, steps, target))
+    return dashboard, queries
+
+
+def load_rules(path, args, errors):
+    import yaml
+
+    with open(path) as f:
+        document = yaml.safe_load(f) or {}
+    queries = []
+    for group in document.get("groups") or ():
+        evals = _refresh_per_hour(group.get("interval"), args.rule_interval)
+        for rule in group.get("rules") or ():
+            expr = rule.get("expr")
+            if not isinstance(expr, str):
+                continue
+            kind = "rule" if "record" in rule else "alert"
+            location = f"{group.get('name')}/{rule.get('record') or rule.get('alert')}"
+            try:
+                node = parse(expr)
+            except ParseError as exc:
+                errors.append({"source": path, "location": location, "error": str(exc)})
+                continue
+            queries.append(Query(path, location, kind, expr, node, evals, 1, rule))
+    return queries
+
+
+def _inputs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".json", ".yaml", ".yml")):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+# --------------------------
+# Recording rules
+# --------------------------
+Candidate = collections.namedtuple("Candidate", "key record expr rewrite")
+
+
+def _unwrap(node):
+    while isinstance(node, Paren):
+        node = node.expr
+    return node
+
+
+def _matchers_text(matchers):
+    return ", ".join(m.canonical() for m in matchers)
+
+
+def rule_candidate(node, rate_interval):
+    """Candidate for `node` if it has the recordable shape, else None."""
+    if not isinstance(node, Aggregate) or node.op not in RULE_AGGREGATIONS or node.param is not None:
+        return None
+    wrappers = []
+    inner = _unwrap(node.expr)
+    while isinstance(inner, Call) and inner.func in ADDITIVE_WRAPPERS and len(inner.args) == 1:
+        wrappers.append(inner.func)
+        inner = _unwrap(inner.args[0])
+    if not (isinstance(inner, Call) and inner.func in RANGE_FUNCTIONS and len(inner.args) == 1):
+        return None
+    selector = inner.args[0]
+    if not isinstance(selector, Selector) or not selector.range or selector.offset or selector.at:
+        return None
+    metric = selector.metric()
+    if not metric or ":" in metric or any(m.op is None for m in selector.matchers):
+        return None
+
+    dynamic = [m for m in selector.matchers if m.dynamic]
+    static = [m for m in selector.matchers if not m.dynamic and m.label != "__name__"]
+    dynamic_labels = {m.label for m in dynamic}
+    if node.grouping == "without":
+        if dynamic_labels & set(node.labels):
+            return None
+        grouping = f"without ({', '.join(sorted(node.labels))})"
+        level = "without_" + "_".join(sorted(node.labels))
+    else:
+        labels = sorted(set(node.labels) | dynamic_labels)
+        grouping = f"by ({', '.join(labels)})"
+        level = "_".join(labels) or "total"
+    range_ = rate_interval if selector.range.startswith(("$", "[[")) else selector.range
+
+    recorded = Selector(metric, static)
+    recorded.range = range_
+    text = f"{inner.func}({recorded.canonical()})"
+    for wrapper in reversed(wrappers):
+        text = f"{wrapper}({text})"
+    expr = parse(f"{node.op} {grouping} ({text})").canonical()
+
+    operation = "_".join([node.op] + wrappers + [inner.func])
+    if range_ != "1m":
+        operation += range_
+    if static:
+        # Fixed matchers change what is recorded; keep such rules apart
+        operation += "_" + hashlib.sha1(_matchers_text(static).encode()).hexdigest()[:6]
+    record = f"{level}:{metric}:{operation}"
+
+    outer = "sum" if node.op == "count" else node.op
+    outer_grouping = f" {node.grouping} ({', '.join(node.labels)})" if node.grouping else ""
+    return Candidate(expr, record, expr, (outer + outer_grouping, dynamic))
+
+
+def _rewrite_text(candidate, record):
+    prefix, dynamic = candidate.rewrite
+    selector = f"{record}{{{_matchers_text(dynamic)}}}" if dynamic else record
+    return f"{prefix} ({selector})"
+
+
+# --------------------------
+# Analysis
+# --------------------------
+def analyze(queries, model, args):
+    results = []
+    for q in queries:
+        cost, series = model.cost(q.node)
+        results.append(
+            {
+                "source": os.path.basename(q.source),
+                "location": q.location,
+                "kind": q.kind,
+                "cost_per_eval": round(cost * q.steps, 1),
+                "cost_per_hour": round(cost * q.steps * q.evals_per_hour),
+                "aggregation_depth": aggregation_depth(q.node),
+                "expr": q.node.canonical(),
+            }
+        )
+
+    # Identical queries (normalised) in more than one place
+    by_text = collections.defaultdict(list)
+    for q, result in zip(queries, results):
+        by_text[result["expr"]].append(result)
+    duplicates = sorted(
+        (
+            {
+                "expr": text,
+                "count": len(uses),
+                "cost_per_hour": sum(r["cost_per_hour"] for r in uses),
+                "locations": [f"{r['source']}: {r['location']}" for r in uses],
+            }
+            for text, uses in by_text.items()
+            if len(uses) > 1
+        ),
+        key=lambda d: -d["cost_per_hour"],
+    )
+
+    # Shared subexpressions (anything over a range vector, below the query root)
+    subexpressions = collections.Counter()
+    subexpression_cost = {}
+    for q in queries:
+        seen = set()
+        for node in q.node.walk():
+            if node is q.node or isinstance(node, (Number, String, Var, Paren, Selector)):
+                continue
+            if not any(isinstance(n, (Subquery, Selector)) and getattr(n, "range", None) for n in node.walk()):
+                continue
+            text = node.canonical()
+            if text not in seen:
+                seen.add(text)
+                subexpressions[text] += 1
+                subexpression_cost[text] = model.cost(node)[0]
+    shared = [
+        {"expr": text, "queries": count, "cost_per_eval": round(subexpression_cost[text], 1)}
+        for text, count in subexpressions.most_common()
+        if count > 1
+    ]
+
+    return results, duplicates, shared
+
+
+def plan_rules(queries, model, args, existing):
+    """Recording-rule candidates with their uses and estimated savings."""
+    uses = collections.defaultdict(list)
+    candidates = {}
+    for q in queries:
+        if q.kind != "dashboard":
+            continue
+        for node in q.node.walk():
+            candidate = rule_candidate(node, args.rate_interval)
+            if candidate is not None:
+                candidates[candidate.key] = candidate
+                uses[candidate.key].append((q, node, candidate))
+
+    rule_evals = _refresh_per_hour(None, args.rule_interval)
+    planned = []
+    for key, candidate_uses in uses.items():
+        if len(candidate_uses) < args.min_uses:
+            continue
+        candidate = candidates[key]
+        record = existing.get(key)
+        rule_cost, rule_series = model.cost(parse(candidate.expr))
+        before = sum(model.cost(node)[0] * q.steps * q.evals_per_hour for q, node, _ in candidate_uses)
+        after = sum(rule_series * q.steps * q.evals_per_hour for q, _, _ in candidate_uses)
+        if record is None:
+            after += rule_cost * rule_evals
+        planned.append(
+            {
+                "record": record or candidate.record,
+                "expr": candidate.expr,
+                "existing_rule": record is not None,
+                "uses": len(candidate_uses),
+                "cost_per_hour_before": round(before),
+                "cost_per_hour_after": round(after),
+                "_uses": candidate_uses,
+            }
+        )
+    planned.sort(key=lambda p: p["cost_per_hour_after"] - p["cost_per_hour_before"])
+    return [p for p in planned if p["cost_per_hour_after"] < p["cost_per_hour_before"]]
+
+
+def rewrite_dashboards(dashboards, planned):
+    """Copies of the dashboards with targets reading the recorded series."""
+    edits = collections.defaultdict(list)  # id(target) -> [(start, end, text)]
+    targets = {}
+    for plan in planned:
+        for q, node, candidate in plan["_uses"]:
+            edits[id(q.target)].append((node.start, node.end, _rewrite_text(candidate, plan["record"])))
+            targets[id(q.target)] = q.target
+    originals = {}
+    for key, target_edits in edits.items():
+        target = targets[key]
+        expr = target["expr"]
+        last_start = len(expr) + 1
+        for start, end, text in sorted(target_edits, reverse=True):
+            if end > last_start:
+                continue  # nested in an expression already rewritten
+            expr = expr[:start] + text + expr[end:]
+            last_start = start
+        originals[key] = target["expr"]
+        target["expr"] = expr
+    try:
+        changed = {path: copy.deepcopy(dashboard) for path, dashboard in dashboards.items()
+                   if any(id(t) in originals for t, _ in _all_targets(dashboard))}
+    finally:
+        # The loaded dashboards stay as they were on disk
+        for key, expr in originals.items():
+            targets[key]["expr"] = expr
+    return changed
+
+
+def _all_targets(dashboard):
+    for panel, datasource in _panels(dashboard):
+        for target in panel["targets"]:
+            yield target, datasource
+
+
+# --------------------------
+# Output
+# --------------------------
+def _print_report(report, top):
+    print(f"{report['queries']} queries, {len(report['parse_errors'])} not parsed")
+    print("\nMost expensive queries (cost units per hour):")
+    for r in report["top_queries"][:top]:
+        print(f"  {r['cost_per_hour']:>12}  {r['source']}: {r['location']}")
+    print("\nDuplicated queries:")
+    for d in report["duplicates"][:top]:
+        print(f"  {d['count']:>4}x {d['cost_per_hour']:>12}  {d['expr'][:100]}")
+    print("\nShared subexpressions:")
+    for s in report["shared_subexpressions"][:top]:
+        print(f"  {s['queries']:>4} queries  {s['expr'][:100]}")
+    print(f"\nRecording rules ({len(report['recording_rules'])}):")
+    for p in report["recording_rules"][:top]:
+        existing = " (existing)" if p["existing_rule"] else ""
+        print(
+            f"  {p['uses']:>4} uses {p['cost_per_hour_before']:>12} -> {p['cost_per_hour_after']:<10} "
+            f"{p['record']}{existing}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PromQL cost analysis and recording-rule generator")
+    parser.add_argument("paths", nargs="+", help="dashboard JSON / rule YAML files or directories")
+    parser.add_argument("--out", help="write recording-rules.yaml and rewritten dashboards here")
+    parser.add_argument("--report", help="write the JSON report here")
+    parser.add_argument("--min-uses", type=int, default=2, help="dashboard targets needed for a rule")
+    parser.add_argument("--rate-interval", default="1m", help="range used for $__rate_interval in rules")
+    parser.add_argument("--rule-interval", default="1m", help="group interval when a rule group has none")
+    parser.add_argument("--refresh", default="5m", help="refresh of dashboards that have none")
+    parser.add_argument("--points", type=int, default=250, help="steps per dashboard range query")
+    parser.add_argument("--scrape-interval", type=int, default=15, help="seconds between samples")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    variables = {
+        "__rate_interval": args.rate_interval,
+        "__interval": args.rate_interval,
+        "__auto": args.rate_interval,
+        "__range": "1h",
+    }
+    model = CostModel(variables, scrape_seconds=args.scrape_interval)
+    errors, queries, dashboards = [], [], {}
+    existing = {}
+    for path in _inputs(args.paths):
+        if path.endswith(".json"):
+            dashboard, found = load_dashboard(path, args, errors)
+            if found:
+                dashboards[path] = dashboard
+        else:
+            found = load_rules(path, args, errors)
+            for q in found:
+                if q.kind == "rule":
+                    existing.setdefault(q.node.canonical(), q.target["record"])
+        queries.extend(found)
+
+    results, duplicates, shared = analyze(queries, model, args)
+    planned = plan_rules(queries, model, args, existing)
+    report = {
+        "queries": len(queries),
+        "parse_errors": errors,
+        "top_queries": sorted(results, key=lambda r: -r["cost_per_hour"]),
+        "duplicates": duplicates,
+        "shared_subexpressions": shared,
+        "recording_rules": [{k: v for k, v in p.items() if not k.startswith("_")} for p in planned],
+    }
+
+    if args.out:
+        import yaml
+
+        os.makedirs(args.out, exist_ok=True)
+        rules = [{"record": p["record"], "expr": p["expr"]} for p in planned if not p["existing_rule"]]
+        with open(os.path.join(args.out, "recording-rules.yaml"), "w") as f:
+            yaml.safe_dump(
+                {"groups": [{"name": "promcost_generated", "interval": args.rule_interval, "rules": rules}]},
+                f,
+                sort_keys=False,
+                width=1000,
+            )
+        for path, dashboard in rewrite_dashboards(dashboards, planned).items():
+            with open(os.path.join(args.out, os.path.basename(path)), "w") as f:
+                json.dump(dashboard, f, indent=2)
+                f.write("\n")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    _print_report(report, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
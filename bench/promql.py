@@ -0,0 +1,458 @@
+# bench/promql.py
+#
+# PromQL parser for bench/promcost.py.
+#
+#   expr = parse('histogram_quantile(0.99, sum by (le) (rate(x_bucket{job=~"$job"}[$__rate_interval])))')
+#   expr.canonical()   normalised text: label lists and matchers sorted, "by" before
+#                      the arguments, so equivalent queries compare equal
+#   expr.walk()        every node, outermost first
+#
+# Covers the PromQL used by the Grafana dashboards and rule files in
+# mimir/operations: selectors, range vectors and subqueries, offset/@,
+# function calls, aggregations with by/without on either side, binary
+# operators with bool/on/ignoring/group_left/group_right, and Grafana template
+# variables ($var, ${var}, [[var]]) as durations, values, matchers or whole
+# expressions. Every node keeps its start/end offset in the source, so a
+# subexpression can be replaced without reformatting the rest of the query.
+import re
+
+AGGREGATIONS = {
+    "sum", "avg", "min", "max", "count", "group", "stddev", "stdvar",
+    "topk", "bottomk", "quantile", "count_values", "limitk", "limit_ratio",
+}
+PARAMETER_AGGREGATIONS = {"topk", "bottomk", "quantile", "count_values", "limitk", "limit_ratio"}
+BINARY_PRECEDENCE = {
+    "or": 1,
+    "and": 2, "unless": 2,
+    "==": 3, "!=": 3, "<=": 3, "<": 3, ">=": 3, ">": 3,
+    "+": 4, "-": 4,
+    "*": 5, "/": 5, "%": 5, "atan2": 5,
+    "^": 6,
+}
+_UNARY_PRECEDENCE = 6
+
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>\s+|\#[^\n]*)
+   |(?P<duration>(?:\d+(?:ms|[smhdwy]))+)(?![\w.])
+   |(?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+   |(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`[^`]*`)
+   |(?P<var>\$\{[^}]*\}|\$\w+|\[\[\w+\]\])
+   |(?P<ident>[a-zA-Z_][\w:]*)
+   |(?P<op>=~|!~|==|!=|>=|<=|[-+*/%^<>=(){}\[\],:@])
+    """,
+    re.X,
+)
+_DURATION_PART = re.compile(r"(\d+)(ms|[smhdwy])")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+
+
+class ParseError(ValueError):
+    pass
+
+
+def duration_seconds(text, variables=None):
+    """"1h30m" -> 5400; Grafana variables are looked up in `variables`."""
+    if text.startswith(("$", "[[")):
+        name = text.strip("${}[]")
+        text = (variables or {}).get(name)
+        if text is None:
+            return None
+    return sum(int(n) * _UNIT_SECONDS[unit] for n, unit in _DURATION_PART.findall(text))
+
+
+# --------------------------
+# Nodes
+# --------------------------
+class Node:
+    start = end = 0
+
+    def children(self):
+        return ()
+
+    def walk(self):
+        yield self
+        for child in self.children():
+            yield from child.walk()
+
+    def __str__(self):
+        return self.canonical()
+
+
+class Number(Node):
+    def __init__(self, text):
+        self.text = text
+
+    def canonical(self):
+        return self.text
+
+
+class String(Node):
+    def __init__(self, text):
+        self.text = text
+
+    def canonical(self):
+        return self.text
+
+
+class Var(Node):
+    """A template variable standing for a whole value or expression."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def canonical(self):
+        return self.text
+
+
+class Matcher:
+    __slots__ = ("label", "op", "value", "quote")
+
+    def __init__(self, label, op=None, value=None, quote='"'):
+        self.label, self.op, self.value, self.quote = label, op, value, quote
+
+    @property
+    def dynamic(self):
+        """Depends on a dashboard variable (or is one)."""
+        return self.op is None or "$" in self.value or "[[" in self.value
+
+    def canonical(self):
+        if self.op is None:
+            return self.label  # a variable expanding to matchers
+        return f"{self.label}{self.op}{self.quote}{self.value}{self.quote}"
+
+
+class Selector(Node):
+    def __init__(self, name, matchers):
+        self.name = name
+        self.matchers = matchers
+        self.range = None
+        self.offset = None
+        self.at = None
+
+    def metric(self):
+        if self.name:
+            return self.name
+        for m in self.matchers:
+            if m.label == "__name__" and m.op == "=":
+                return m.value
+        return None
+
+    def canonical(self):
+        text = self.name or ""
+        if self.matchers or not self.name:
+            text += "{" + ", ".join(sorted(m.canonical() for m in self.matchers)) + "}"
+        if self.range:
+            text += f"[{self.range}]"
+        if self.offset:
+            text += f" offset {self.offset}"
+        if self.at:
+            text += f" @ {self.at}"
+        return text
+
+
+class Subquery(Node):
+    def __init__(self, expr, range_, step):
+        self.expr, self.range, self.step = expr, range_, step
+        self.offset = None
+        self.at = None
+
+    def children(self):
+        return (self.expr,)
+
+    def canonical(self):
+        text = f"{self.expr.canonical()}[{self.range}:{self.step or ''}]"
+        if self.offset:
+            text += f" offset {self.offset}"
+        if self.at:
+            text += f" @ {self.at}"
+        return text
+
+
+class Call(Node):
+    def __init__(self, func, args):
+        self.func, self.args = func, args
+
+    def children(self):
+        return self.args
+
+    def canonical(self):
+        return f"{self.func}({', '.join(a.canonical() for a in self.args)})"
+
+
+class Aggregate(Node):
+    def __init__(self, op, expr, grouping=None, labels=(), param=None):
+        self.op, self.expr, self.grouping, self.labels, self.param = op, expr, grouping, list(labels), param
+
+    def children(self):
+        return (self.param, self.expr) if self.param is not None else (self.expr,)
+
+    def canonical(self):
+        text = self.op
+        if self.grouping:
+            text += f" {self.grouping} ({', '.join(sorted(self.labels))})"
+        args = self.expr.canonical()
+        if self.param is not None:
+            args = f"{self.param.canonical()}, {args}"
+        return f"{text} ({args})"
+
+
+class Binary(Node):
+    def __init__(self, op, lhs, rhs, modifiers=""):
+        self.op, self.lhs, self.rhs, self.modifiers = op, lhs, rhs, modifiers
+
+    def children(self):
+        return (self.lhs, self.rhs)
+
+    def canonical(self):
+        modifiers = f" {self.modifiers}" if self.modifiers else ""
+        return f"{self.lhs.canonical()} {self.op}{modifiers} {self.rhs.canonical()}"
+
+
+class Unary(Node):
+    def __init__(self, op, expr):
+        self.op, self.expr = op, expr
+
+    def children(self):
+        return (self.expr,)
+
+    def canonical(self):
+        return f"{self.op}{self.expr.canonical()}"
+
+
+class Paren(Node):
+    def __init__(self, expr):
+        self.expr = expr
+
+    def children(self):
+        return (self.expr,)
+
+    def canonical(self):
+        return f"({self.expr.canonical()})"
+
+
+# --------------------------
+# Parser
+# --------------------------
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise ParseError(f"unexpected character {text[pos]!r} at {pos}")
+        kind = match.lastgroup
+        if kind != "ws":
+            tokens.append((kind, match.group(kind), match.start(), match.end()))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None, len(self.text), len(self.text))
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ParseError("unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def accept(self, value):
+        if self.peek()[1] == value:
+            return self.next()
+        return None
+
+    def expect(self, value):
+        token = self.next()
+        if token[1] != value:
+            raise ParseError(f"expected {value!r}, got {token[1]!r} at {token[2]}")
+        return token
+
+    def parse(self):
+        node = self.expr(0)
+        if self.peek()[0] is not None:
+            kind, value, start, _ = self.peek()
+            raise ParseError(f"unexpected {value!r} at {start}")
+        return node
+
+    # Binary operators, by precedence climbing
+    def _binary_op(self):
+        kind, value, _, _ = self.peek()
+        if kind == "op" and value in BINARY_PRECEDENCE:
+            return value
+        if kind == "ident" and value.lower() in ("and", "or", "unless", "atan2"):
+            return value.lower()
+        return None
+
+    def expr(self, min_precedence):
+        lhs = self.unary()
+        while True:
+            op = self._binary_op()
+            if op is None or BINARY_PRECEDENCE[op] < min_precedence:
+                return lhs
+            self.next()
+            modifiers = self._modifiers()
+            precedence = BINARY_PRECEDENCE[op]
+            rhs = self.expr(precedence if op == "^" else precedence + 1)
+            lhs = self._span(Binary(op, lhs, rhs, modifiers), lhs.start, rhs.end)
+
+    def _modifiers(self):
+        parts = []
+        if self.accept("bool"):
+            parts.append("bool")
+        for keywords in (("on", "ignoring"), ("group_left", "group_right")):
+            kind, value, _, _ = self.peek()
+            if kind == "ident" and value in keywords:
+                self.next()
+                if self.peek()[1] == "(":
+                    parts.append(f"{value} ({', '.join(self._labels())})")
+                else:
+                    parts.append(value)
+        return " ".join(parts)
+
+    def unary(self):
+        kind, value, start, _ = self.peek()
+        if kind == "op" and value in ("-", "+"):
+            self.next()
+            operand = self.expr(_UNARY_PRECEDENCE)
+            return self._span(Unary(value, operand), start, operand.end)
+        return self.postfix(self.primary())
+
+    def _labels(self):
+        self.expect("(")
+        labels = []
+        while not self.accept(")"):
+            kind, value, start, _ = self.next()
+            if kind not in ("ident", "string"):
+                raise ParseError(f"expected label name, got {value!r} at {start}")
+            labels.append(value.strip("\"'"))
+            if not self.accept(","):
+                self.expect(")")
+                break
+        return labels
+
+    def primary(self):
+        kind, value, start, end = self.next()
+        if kind == "number" or (kind == "ident" and value.lower() in ("inf", "nan")):
+            return self._span(Number(value), start, end)
+        if kind == "string":
+            return self._span(String(value), start, end)
+        if kind == "var":
+            return self._span(Var(value), start, end)
+        if value == "(":
+            inner = self.expr(0)
+            close = self.expect(")")
+            return self._span(Paren(inner), start, close[3])
+        if value == "{":
+            return self._selector(None, start)
+        if kind != "ident":
+            raise ParseError(f"unexpected {value!r} at {start}")
+        following = self.peek()[1]
+        if value in AGGREGATIONS and following in ("(", "by", "without"):
+            return self._aggregate(value, start)
+        if following == "(":
+            self.next()
+            args = []
+            while not self.accept(")"):
+                args.append(self.expr(0))
+                if not self.accept(","):
+                    self.expect(")")
+                    break
+            return self._span(Call(value, args), start, self.tokens[self.pos - 1][3])
+        if following == "{":
+            self.next()
+            return self._selector(value, start)
+        return self._span(Selector(value, []), start, end)
+
+    def _selector(self, name, start):
+        matchers = []
+        while not self.accept("}"):
+            kind, label, label_start, _ = self.next()
+            if kind == "var":
+                matchers.append(Matcher(label))
+            elif kind in ("ident", "string"):
+                op = self.next()[1]
+                if op not in ("=", "!=", "=~", "!~"):
+                    raise ParseError(f"bad matcher operator {op!r} at {label_start}")
+                kind, raw, value_start, _ = self.next()
+                if kind != "string":
+                    raise ParseError(f"expected a string at {value_start}")
+                matchers.append(Matcher(label.strip("\"'"), op, raw[1:-1], raw[0]))
+            else:
+                raise ParseError(f"unexpected {label!r} in selector at {label_start}")
+            if not self.accept(","):
+                self.expect("}")
+                break
+        return self._span(Selector(name, matchers), start, self.tokens[self.pos - 1][3])
+
+    def _aggregate(self, op, start):
+        grouping, labels = None, []
+        if self.peek()[1] in ("by", "without"):
+            grouping = self.next()[1]
+            labels = self._labels()
+        self.expect("(")
+        param = None
+        expr = self.expr(0)
+        if op in PARAMETER_AGGREGATIONS and self.accept(","):
+            param, expr = expr, self.expr(0)
+        self.expect(")")
+        if grouping is None and self.peek()[1] in ("by", "without"):
+            grouping = self.next()[1]
+            labels = self._labels()
+        return self._span(Aggregate(op, expr, grouping, labels, param), start, self.tokens[self.pos - 1][3])
+
+    def _duration(self):
+        kind, value, start, _ = self.next()
+        if kind not in ("duration", "var", "number"):
+            raise ParseError(f"expected a duration at {start}")
+        return value
+
+    def postfix(self, node):
+        while True:
+            value = self.peek()[1]
+            if value == "[":
+                self.next()
+                range_ = self._duration()
+                if self.accept(":"):
+                    step = None if self.peek()[1] == "]" else self._duration()
+                    close = self.expect("]")
+                    node = self._span(Subquery(node, range_, step), node.start, close[3])
+                elif isinstance(node, Selector) and node.range is None:
+                    node.range = range_
+                    node.end = self.expect("]")[3]
+                else:
+                    raise ParseError(f"range on a non-selector at {node.start}")
+            elif value == "offset":
+                self.next()
+                sign = "-" if self.accept("-") else ""
+                node.offset = sign + self._duration()
+                node.end = self.tokens[self.pos - 1][3]
+            elif value == "@":
+                self.next()
+                kind, at, _, end = self.next()
+                if at in ("start", "end"):
+                    self.expect("(")
+                    end = self.expect(")")[3]
+                    at += "()"
+                node.at = at
+                node.end = end
+            else:
+                return node
+
+    @staticmethod
+    def _span(node, start, end):
+        node.start, node.end = start, end
+        return node
+
+
+def parse(text):
+    """Parse a PromQL expression; raises ParseError."""
+    return _Parser(text).parse()
@@ -0,0 +1,210 @@
+# bench/receiver.py
+#
+# Local OTLP/HTTP receiver with a queryable trace store: a stand-in for the
+# collector + Tempo/Jaeger/Loki stack in load tests and CI.
+#
+#   python -m bench.receiver --port 4318
+#   OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318 PYTHONPATH=. python SA-OTEL/app.py
+#
+# Ingest (what the existing exporters send; protobuf, optionally gzip/deflate/zstd):
+#   POST /v1/traces    spans go to the TraceStore (bench/tracestore.py)
+#   POST /v1/logs      kept in a bounded list with their trace/span ids
+#   POST /v1/metrics   data points are counted per metric name
+#
+# Queries (JSON):
+#   GET /api/traces/<trace id>     every span of one trace
+#   GET /api/search?service=service1&name=/call_service2&minDuration=100ms&limit=20
+#                                  also maxDuration, start/end (unix seconds)
+#   GET /api/logs?trace_id=<hex>   stored log records, optionally for one trace
+#   GET /api/metrics               data points received per metric name
+#   GET /api/stats                 span counts, evictions, services
+#
+# In tests, start it in-process instead: `Receiver().start()` and query
+# `receiver.store` directly.
+import argparse
+import collections
+import gzip
+import json
+import re
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+from bench.stubs import StubServer, _QuietHandler
+from bench.tracestore import TraceStore, any_value
+
+_UNITS = {"ns": 1, "us": 1_000, "ms": 1_000_000, "s": 1_000_000_000}
+_TRACE_ID = re.compile(r"^[0-9a-fA-F]{1,32}$")
+
+
+def parse_duration_ns(value):
+    """"250ms", "1.5s", "800us" or plain nanoseconds -> nanoseconds."""
+    if not value:
+        return 0
+    for unit in ("ns", "us", "ms", "s"):
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * _UNITS[unit])
+    return int(value)
+
+
+def _decompress(body, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        return zlib.decompress(body)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(body, max_output_size=64 << 20)
+    return body
+
+
+class _ReceiverHandler(_QuietHandler):
+    def do_POST(self):
+        receiver = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        handler = {
+            "/v1/traces": receiver.receive_traces,
+            "/v1/logs": receiver.receive_logs,
+            "/v1/metrics": receiver.receive_metrics,
+        }.get(self.path)
+        if handler is None:
+            return self._reply(404)
+        try:
+            handler(_decompress(body, self.headers.get("Content-Encoding")))
+        except Exception as exc:  # corrupt compression or malformed payload
+            return self._reply(400, str(exc).encode())
+        # Empty Export*ServiceResponse is a valid protobuf message
+        self._reply(200, content_type="application/x-protobuf")
+
+    def do_GET(self):
+        receiver = self.server.stub
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path.startswith("/api/traces/"):
+            trace_id = url.path.rsplit("/", 1)[1]
+            if not _TRACE_ID.match(trace_id):
+                return self._json({"error": "trace id must be 1-32 hex digits"}, 400)
+            spans = receiver.store.get_trace(trace_id)
+            return self._json({"spans": spans}, 200 if spans else 404)
+        if url.path == "/api/search":
+            try:
+                criteria = dict(
+                    service=query.get("service"),
+                    name=query.get("name"),
+                    min_duration_ns=parse_duration_ns(query.get("minDuration")),
+                    max_duration_ns=parse_duration_ns(query.get("maxDuration")),
+                    start_ns=int(float(query.get("start", 0)) * 1e9),
+                    end_ns=int(float(query.get("end", 0)) * 1e9),
+                    limit=int(query.get("limit", 20)),
+                )
+            except ValueError as exc:
+                return self._json({"error": f"invalid search parameter: {exc}"}, 400)
+            return self._json({"traces": receiver.store.search(**criteria)})
+        if url.path == "/api/logs":
+            return self._json({"logs": receiver.logs_for(query.get("trace_id"))})
+        if url.path == "/api/metrics":
+            return self._json({"data_points": receiver.metric_points()})
+        if url.path == "/api/stats":
+            return self._json(receiver.stats())
+        self._reply(404)
+
+    def _json(self, payload, status=200):
+        self._reply(status, json.dumps(payload).encode(), content_type="application/json")
+
+
+class Receiver(StubServer):
+    """OTLP/HTTP receiver storing spans, logs and metric point counts."""
+
+    handler = _ReceiverHandler
+
+    def __init__(self, port=0, store=None, max_logs=100_000, host="127.0.0.1"):
+        StubServer.__init__(self, port, host)
+        self.store = store or TraceStore()
+        self._lock = threading.Lock()
+        self.logs = collections.deque(maxlen=max_logs)
+        self.metric_data_points = collections.Counter()
+
+    def receive_traces(self, body):
+        from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+            ExportTraceServiceRequest,
+        )
+
+        request = ExportTraceServiceRequest()
+        request.ParseFromString(body)
+        return self.store.add_request(request)
+
+    def receive_logs(self, body):
+        from opentelemetry.proto.collector.logs.v1.logs_service_pb2 import ExportLogsServiceRequest
+
+        request = ExportLogsServiceRequest()
+        request.ParseFromString(body)
+        records = [
+            {
+                "time_unix_nano": record.time_unix_nano or record.observed_time_unix_nano,
+                "severity": record.severity_text,
+                "body": any_value(record.body),
+                "trace_id": record.trace_id.hex() or None,
+                "span_id": record.span_id.hex() or None,
+                "attributes": {kv.key: any_value(kv.value) for kv in record.attributes},
+            }
+            for resource_logs in request.resource_logs
+            for scope_logs in resource_logs.scope_logs
+            for record in scope_logs.log_records
+        ]
+        with self._lock:
+            self.logs.extend(records)
+
+    def receive_metrics(self, body):
+        from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import (
+            ExportMetricsServiceRequest,
+        )
+
+        request = ExportMetricsServiceRequest()
+        request.ParseFromString(body)
+        counts = collections.Counter()
+        for resource_metrics in request.resource_metrics:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    data = getattr(metric, metric.WhichOneof("data"))
+                    counts[metric.name] += len(data.data_points)
+        with self._lock:
+            self.metric_data_points.update(counts)
+
+    def logs_for(self, trace_id=None):
+        with self._lock:
+            return [log for log in self.logs if trace_id is None or log["trace_id"] == trace_id]
+
+    def metric_points(self):
+        with self._lock:
+            return dict(self.metric_data_points)
+
+    def stats(self):
+        stats = self.store.stats()
+        with self._lock:
+            stats.update({"logs": len(self.logs), "metrics": len(self.metric_data_points)})
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OTLP/HTTP receiver with a queryable trace store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--retention", type=float, default=900, help="seconds spans are kept")
+    parser.add_argument("--max-spans", type=int, default=2_000_000)
+    args = parser.parse_args(argv)
+
+    store = TraceStore(retention_seconds=args.retention, max_spans=args.max_spans)
+    receiver = Receiver(args.port, store=store, host=args.host).start()
+    print(f"OTLP/HTTP receiver on http://{args.host}:{receiver.port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        receiver.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,705 @@
+# bench/remotewrite.py
+#
+# Synthetic Prometheus remote-write load for Mimir capacity tests, and a local
+# receiver standing in for Mimir's distributors.
+#
+# The generator takes the series the mimir flask-app exposes (request count,
+# latency and CPU histograms, in-progress gauge, /work summary and the process
+# metrics of common/resources.py, each with its labels), multiplies them over
+# `--pods` simulated pods, and adds synthetic endpoints until `--series` is
+# reached. Worker processes (`--processes`) each own a shard of the series,
+# encode snappy-compressed WriteRequest protobufs of `--batch-size` samples
+# and hand them to `--connections` sender threads, paced so that together they
+# send `--rate` samples per second.
+#
+#   python -m bench.remotewrite generate --pods 50 --series 200000 --rate 40000 --duration 60
+#   python -m bench.remotewrite generate --url http://localhost:9009/api/v1/push --tenant demo
+#   python -m bench.remotewrite receive --port 9009
+#
+# Without --url the generator starts the receiver in a child process and
+# reports its side too. The receiver accepts POST /api/v1/push (what
+# Prometheus, Alloy and the generator send), decodes every request and serves
+# GET /api/stats: requests, samples, distinct series, samples/sec, decode
+# latency and sample age on arrival (receive time - sample timestamp).
+#
+# Snappy comes from python-snappy or cramjam when installed; otherwise a pure
+# Python codec is used (valid snappy, but literal-only: no compression and
+# much slower, so install one of them for real load tests).
+import argparse
+import collections
+import datetime
+import http.client
+import itertools
+import json
+import math
+import os
+import queue
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from bench.load import percentile
+from bench.stubs import StubServer, _QuietHandler
+
+# --------------------------
+# Series of the mimir flask-app
+# --------------------------
+# prometheus_client defaults, used by flask_request_latency_seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+CPU_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# (name, type, labels, buckets or median, ...) after mimir/flask-app/app.py and
+# PrometheusProcessMetrics; histograms carry the lognormal median/sigma their
+# bucket counts are drawn from
+METRICS = [
+    ("flask_request_count_total", "counter", ("endpoint", "status_class")),
+    ("flask_request_latency_seconds", "histogram", ("endpoint", "status_class"), DEFAULT_BUCKETS, 0.3, 0.6),
+    ("flask_inprogress_requests", "gauge", ("endpoint",)),
+    ("flask_request_cpu_seconds", "histogram", ("endpoint",), CPU_BUCKETS, 0.002, 1.0),
+    ("flask_work_time_seconds", "summary", (), 0.6, 0.4),
+    ("flask_cpu_usage_percent", "gauge", ()),
+    ("flask_memory_usage_mb", "gauge", ()),
+    ("flask_threads", "gauge", ()),
+    ("flask_open_fds", "gauge", ()),
+    ("flask_cpu_seconds_total", "counter", ()),
+    ("flask_gc_collections_total", "counter", ("generation",)),
+    ("flask_gc_pause_seconds_total", "counter", ()),
+]
+ENDPOINTS = ("/", "/work", "/error", "/metrics")
+LABEL_VALUES = {"status_class": ("2xx", "4xx", "5xx"), "generation": ("0", "1", "2")}
+# Target labels Prometheus adds, plus the external labels of mimir/config/prometheus.yaml
+JOB = "flask-app"
+EXTERNAL_LABELS = (("cluster", "demo"), ("namespace", "demo"))
+
+
+def _instance_series(metric):
+    kind = metric[1]
+    if kind == "histogram":
+        return len(metric[3]) + 3  # le buckets, +Inf, _sum, _count
+    if kind == "summary":
+        return 2
+    return 1
+
+
+def series_per_pod(endpoints):
+    total = 0
+    for metric in METRICS:
+        sets = 1
+        for label in metric[2]:
+            sets *= endpoints if label == "endpoint" else len(LABEL_VALUES[label])
+        total += sets * _instance_series(metric)
+    return total
+
+
+def endpoints_for(pods, series):
+    """Endpoint values per pod needed to reach `series` in total (at least the app's own)."""
+    endpoints = len(ENDPOINTS)
+    if series:
+        fixed = series_per_pod(0)
+        per_endpoint = series_per_pod(1) - fixed
+        endpoints = max(endpoints, math.ceil((series / pods - fixed) / per_endpoint))
+    return endpoints
+
+
+def family_specs(pods, endpoints):
+    """(pod, metric, label pairs) for every label set of every metric on every pod."""
+    routes = list(ENDPOINTS) + [f"/route-{i}" for i in range(endpoints - len(ENDPOINTS))]
+    for pod in range(pods):
+        for metric in METRICS:
+            choices = [
+                [(label, value) for value in (routes[:endpoints] if label == "endpoint" else LABEL_VALUES[label])]
+                for label in metric[2]
+            ]
+            for pairs in itertools.product(*choices):
+                yield pod, metric, pairs
+
+
+# --------------------------
+# Protobuf (prometheus.WriteRequest)
+# --------------------------
+# WriteRequest { repeated TimeSeries timeseries = 1; }
+# TimeSeries   { repeated Label labels = 1; repeated Sample samples = 2; }
+# Label        { string name = 1; string value = 2; }
+# Sample       { double value = 1; int64 timestamp = 2; }
+_pack_double = struct.Struct("<d").pack
+# Millisecond timestamps between 1971 and 2109 are 6-byte varints, so every
+# sample has the same size and the bytes before its value can be precomputed
+_TIMESTAMP_BYTES = 6
+_SAMPLE_SIZE = 1 + 8 + 1 + _TIMESTAMP_BYTES
+
+
+def _uvarint_bytes(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _uvarint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _field(key, payload):
+    return bytes([key]) + _uvarint_bytes(len(payload)) + payload
+
+
+def encode_labels(labels):
+    """Label messages of one series, sorted by name as remote write requires."""
+    return b"".join(
+        _field(0x0A, _field(0x0A, name.encode()) + _field(0x12, value.encode()))
+        for name, value in sorted(labels)
+    )
+
+
+def series_head(labels):
+    """Everything of a one-sample TimeSeries entry up to the sample's value."""
+    body = encode_labels(labels)
+    size = len(body) + 2 + _SAMPLE_SIZE
+    return b"\x0a" + _uvarint_bytes(size) + body + b"\x12" + bytes([_SAMPLE_SIZE]) + b"\x09"
+
+
+def timestamp_tail(timestamp_ms):
+    tail = b"\x10" + _uvarint_bytes(timestamp_ms)
+    if len(tail) != 1 + _TIMESTAMP_BYTES:
+        raise ValueError(f"timestamp out of range: {timestamp_ms}")
+    return tail
+
+
+def decode_write_request(data):
+    """-> (label blob per series, samples, oldest sample timestamp in ms)."""
+    series, samples, oldest = [], 0, None
+    pos, end = 0, len(data)
+    while pos < end:
+        key = data[pos]
+        size, pos = _uvarint(data, pos + 1)
+        if key != 0x0A:  # metadata (3) and anything newer
+            if key & 7 != 2:
+                raise ValueError(f"unexpected WriteRequest field {key >> 3} wire type {key & 7}")
+            pos += size
+            continue
+        stop, labels = pos + size, []
+        while pos < stop:
+            key = data[pos]
+            size, pos = _uvarint(data, pos + 1)
+            if key == 0x0A:
+                labels.append(data[pos : pos + size])
+            elif key == 0x12:
+                samples += 1
+                inner, inner_end = pos, pos + size
+                while inner < inner_end:
+                    tag = data[inner]
+                    if tag == 0x09:
+                        inner += 9
+                    elif tag == 0x10:
+                        timestamp, inner = _uvarint(data, inner + 1)
+                        if oldest is None or timestamp < oldest:
+                            oldest = timestamp
+                    else:
+                        raise ValueError(f"unexpected Sample tag {tag:#x}")
+            pos += size
+        series.append(b"".join(labels))
+    return series, samples, oldest
+
+
+# --------------------------
+# Snappy (block format, as remote write uses)
+# --------------------------
+def _literal_compress(data):
+    out = [_uvarint_bytes(len(data))]
+    for start in range(0, len(data), 65536):
+        chunk = data[start : start + 65536]
+        out.append(b"\xf4" + (len(chunk) - 1).to_bytes(2, "little") + chunk)  # tag 61: 2-byte length
+    return b"".join(out)
+
+
+def _pure_decompress(data):
+    length, pos = _uvarint(data, 0)
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[pos : pos + extra], "little")
+                pos += extra
+            size += 1
+            out += data[pos : pos + size]
+            pos += size
+            continue
+        if kind == 1:
+            size = ((tag >> 2) & 7) + 4
+            offset = ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        else:
+            width = 2 if kind == 2 else 4
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos : pos + width], "little")
+            pos += width
+        start = len(out) - offset
+        if offset <= 0 or start < 0:
+            raise ValueError("invalid snappy copy offset")
+        for i in range(size):  # copies may overlap their own output
+            out.append(out[start + i])
+    if len(out) != length:
+        raise ValueError(f"snappy length mismatch: {len(out)} != {length}")
+    return bytes(out)
+
+
+def snappy_codec():
+    """(compress, decompress, name) from python-snappy, cramjam or pure Python."""
+    try:
+        import snappy
+
+        return snappy.compress, snappy.decompress, "python-snappy"
+    except ImportError:
+        pass
+    try:
+        import cramjam
+
+        return (
+            lambda data: bytes(cramjam.snappy.compress_raw(data)),
+            lambda data: bytes(cramjam.snappy.decompress_raw(data)),
+            "cramjam",
+        )
+    except ImportError:
+        return _literal_compress, _pure_decompress, "pure-python (literals only)"
+
+
+# --------------------------
+# Generator
+# --------------------------
+def _normal_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+class _Family:
+    """One label set of one metric on one pod: its series heads and next values."""
+
+    def __init__(self, pod, metric, pairs, rng):
+        name, kind = metric[0], metric[1]
+        target = (("job", JOB), ("instance", f"flask-app-{pod}:5000"), ("pod", f"flask-app-{pod}"))
+        labels = EXTERNAL_LABELS + target + pairs
+        self.kind = kind
+        self.rng = rng
+        self.rate = rng.uniform(0.1, 5.0)  # events/sec behind counters and histograms
+        self.total = rng.uniform(0, 1000) * self.rate
+        if kind == "histogram":
+            buckets, median, sigma = metric[3], metric[4], metric[5]
+            self.cdf = [_normal_cdf(math.log(b / median) / sigma) for b in buckets]
+            self.mean = median * math.exp(sigma * sigma / 2)
+            bounds = [repr(float(b)) for b in buckets] + ["+Inf"]
+            self.heads = [series_head(labels + ((("__name__", f"{name}_bucket"), ("le", le)))) for le in bounds]
+            self.heads += [series_head(labels + (("__name__", f"{name}_{suffix}"),)) for suffix in ("sum", "count")]
+        elif kind == "summary":
+            median, sigma = metric[3], metric[4]
+            self.mean = median * math.exp(sigma * sigma / 2)
+            self.heads = [series_head(labels + (("__name__", f"{name}_{suffix}"),)) for suffix in ("sum", "count")]
+        else:
+            self.base = rng.uniform(1, 200)
+            self.heads = [series_head(labels + (("__name__", name),))]
+
+    def advance(self, seconds):
+        if self.kind == "gauge":
+            return [self.base * (0.8 + 0.4 * self.rng.random())]
+        self.total += self.rate * seconds * (0.5 + self.rng.random())
+        count = math.floor(self.total)
+        if self.kind == "counter":
+            return [float(count)]
+        if self.kind == "summary":
+            return [count * self.mean, float(count)]
+        return [float(math.floor(count * p)) for p in self.cdf] + [float(count), count * self.mean, float(count)]
+
+
+def _batches(families, batch_size):
+    batch, samples = [], 0
+    for family in families:
+        if batch and samples + len(family.heads) > batch_size:
+            yield batch
+            batch, samples = [], 0
+        batch.append(family)
+        samples += len(family.heads)
+    if batch:
+        yield batch
+
+
+def encode_batch(families, seconds, timestamp_ms):
+    """Uncompressed WriteRequest with one sample per series of `families`."""
+    tail = timestamp_tail(timestamp_ms)
+    parts = []
+    for family in families:
+        for head, value in zip(family.heads, family.advance(seconds)):
+            parts += (head, _pack_double(value), tail)
+    return b"".join(parts)
+
+
+class _Sender:
+    """`connections` threads POSTing encoded requests from a bounded queue."""
+
+    def __init__(self, url, connections, tenant=None, timeout=10.0):
+        parsed = urlparse(url)
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self.netloc, self.path, self.timeout = parsed.netloc, parsed.path or "/api/v1/push", timeout
+        self.headers = {
+            "Content-Encoding": "snappy",
+            "Content-Type": "application/x-protobuf",
+            "User-Agent": "bench-remotewrite",
+            "X-Prometheus-Remote-Write-Version": "0.1.0",
+        }
+        if tenant:
+            self.headers["X-Scope-OrgID"] = tenant
+        self.queue = queue.Queue(maxsize=connections * 2)
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.samples_ok = self.samples_failed = 0
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(connections)]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        connection = None
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            payload, samples = item
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = self.connection_class(self.netloc, timeout=self.timeout)
+                connection.request("POST", self.path, payload, self.headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                if connection is not None:
+                    connection.close()
+                connection, status = None, "error"
+            elapsed = time.perf_counter() - start
+            ok = status != "error" and 200 <= status < 300
+            with self.lock:
+                self.latencies.append(elapsed)
+                self.statuses[str(status)] += 1
+                if ok:
+                    self.samples_ok += samples
+                else:
+                    self.samples_failed += samples
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def _generate_shard(options, index):
+    """One worker process: encode and send its shard of the series at its share of the rate."""
+    compress, _, _ = snappy_codec()
+    shard = options["processes"]
+    families = [
+        _Family(pod, metric, pairs, random.Random(options["seed"] * 1_000_003 + i))
+        for i, (pod, metric, pairs) in enumerate(family_specs(options["pods"], options["endpoints"]))
+        if i % shard == index
+    ]
+    batches = list(_batches(families, options["batch_size"]))
+    last_sent = [None] * len(batches)
+    rate = options["rate"] / shard
+    sender = _Sender(options["url"], options["connections"], options["tenant"])
+
+    samples = requests = raw_bytes = compressed_bytes = 0
+    encode_seconds = max_lag = 0.0
+    start = time.time()
+    deadline = start + options["duration"]
+    while start + samples / rate < deadline and batches:
+        for i, batch in enumerate(batches):
+            now = time.time()
+            due = start + samples / rate
+            if due >= deadline:
+                break
+            if due > now:
+                time.sleep(due - now)
+            else:
+                max_lag = max(max_lag, now - due)
+            timestamp_ms = int(time.time() * 1000)
+            if last_sent[i] is not None:
+                # Each series' timestamps must strictly increase
+                timestamp_ms = max(timestamp_ms, last_sent[i] + 1)
+            seconds = (timestamp_ms - last_sent[i]) / 1000 if last_sent[i] else options["interval"]
+            last_sent[i] = timestamp_ms
+            cpu = time.process_time()
+            raw = encode_batch(batch, seconds, timestamp_ms)
+            payload = compress(raw)
+            encode_seconds += time.process_time() - cpu
+            batch_samples = sum(len(family.heads) for family in batch)
+            sender.queue.put((payload, batch_samples))
+            samples += batch_samples
+            requests += 1
+            raw_bytes += len(raw)
+            compressed_bytes += len(payload)
+    sender.close()
+    return {
+        "series": sum(len(family.heads) for family in families),
+        "samples": samples,
+        "samples_ok": sender.samples_ok,
+        "samples_failed": sender.samples_failed,
+        "requests": requests,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": compressed_bytes,
+        "encode_cpu_seconds": encode_seconds,
+        "max_lag_seconds": max_lag,
+        "statuses": dict(sender.statuses),
+        "latencies": sender.latencies,
+        "elapsed": min(time.time(), deadline) - start,
+    }
+
+
+def _merge(shards):
+    latencies = sorted(itertools.chain.from_iterable(shard.pop("latencies") for shard in shards))
+    statuses = collections.Counter()
+    for shard in shards:
+        statuses.update(shard.pop("statuses"))
+    elapsed = max(shard["elapsed"] for shard in shards)
+    total = lambda key: sum(shard[key] for shard in shards)
+    to_ms = lambda v: None if v is None else round(v * 1000, 3)
+    samples = total("samples")
+    return {
+        "series": total("series"),
+        "samples": samples,
+        "samples_ok": total("samples_ok"),
+        "samples_failed": total("samples_failed"),
+        "samples_per_second": round(samples / elapsed, 1) if elapsed else None,
+        "requests": total("requests"),
+        "bytes_per_sample": round(total("compressed_bytes") / samples, 2) if samples else None,
+        "compression_ratio": round(total("raw_bytes") / total("compressed_bytes"), 2) if samples else None,
+        "encode_us_per_sample": round(total("encode_cpu_seconds") / samples * 1e6, 3) if samples else None,
+        "max_lag_seconds": round(max(shard["max_lag_seconds"] for shard in shards), 3),
+        "statuses": dict(statuses),
+        "latency_p50_ms": to_ms(percentile(latencies, 50)),
+        "latency_p99_ms": to_ms(percentile(latencies, 99)),
+        "latency_max_ms": to_ms(latencies[-1] if latencies else None),
+    }
+
+
+class _LocalReceiver:
+    """The receiver in a child process, so decoding does not compete with encoding for the GIL."""
+
+    def __init__(self):
+        self.child = subprocess.Popen(
+            [sys.executable, "-m", "bench.remotewrite", "receive", "--port", "0", "--quiet"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.base = f"http://127.0.0.1:{json.loads(self.child.stdout.readline())['port']}"
+        self.url = f"{self.base}/api/v1/push"
+
+    def stats(self):
+        with urlopen(f"{self.base}/api/stats", timeout=10) as response:
+            return json.load(response)
+
+    def close(self):
+        self.child.terminate()
+        self.child.wait(timeout=10)
+
+
+# --------------------------
+# Receiver
+# --------------------------
+class _PushHandler(_QuietHandler):
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != "/api/v1/push":
+            return self._reply(404)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Encoding", "snappy") != "snappy":
+            return self._reply(415, b"remote write requires snappy")
+        try:
+            self.server.stub.receive(body, self.headers.get("X-Scope-OrgID"))
+        except Exception as exc:  # malformed payload
+            return self._reply(400, str(exc).encode())
+        self._reply(200)
+
+    def do_GET(self):
+        if self.path == "/api/stats":
+            body = json.dumps(self.server.stub.stats()).encode()
+            return self._reply(200, body, content_type="application/json")
+        self._reply(404)
+
+
+class RemoteWriteReceiver(StubServer):
+    """Decodes remote-write requests and keeps ingestion statistics."""
+
+    handler = _PushHandler
+
+    def __init__(self, port=0, host="127.0.0.1", max_latencies=200_000):
+        StubServer.__init__(self, port, host)
+        _, self.decompress, self.codec = snappy_codec()
+        self._lock = threading.Lock()
+        self.requests = self.samples = self.compressed_bytes = self.raw_bytes = 0
+        self.series = set()
+        self.tenants = collections.Counter()
+        self.per_second = collections.Counter()  # unix second -> samples
+        self.decode_seconds = collections.deque(maxlen=max_latencies)
+        self.sample_age_ms = collections.deque(maxlen=max_latencies)
+        self.first = self.last = None
+
+    def receive(self, body, tenant=None):
+        start = time.perf_counter()
+        raw = self.decompress(body)
+        labels, samples, oldest = decode_write_request(raw)
+        decoded = time.perf_counter() - start
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            self.samples += samples
+            self.compressed_bytes += len(body)
+            self.raw_bytes += len(raw)
+            self.series.update(map(hash, labels))
+            self.tenants[tenant or "anonymous"] += 1
+            self.per_second[int(now)] += samples
+            self.first = self.first or now
+            self.last = now
+            self.decode_seconds.append(decoded)
+            if oldest is not None:
+                self.sample_age_ms.append(now * 1000 - oldest)
+
+    def stats(self):
+        with self._lock:
+            decode = sorted(self.decode_seconds)
+            age = sorted(self.sample_age_ms)
+            # The current second is still filling up
+            seconds = [count for second, count in self.per_second.items() if second < int(time.time())]
+            elapsed = (self.last - self.first) if self.requests > 1 else 0
+            return {
+                "codec": self.codec,
+                "requests": self.requests,
+                "samples": self.samples,
+                "series": len(self.series),
+                "tenants": dict(self.tenants),
+                "compressed_bytes": self.compressed_bytes,
+                "raw_bytes": self.raw_bytes,
+                "samples_per_second": round(self.samples / elapsed, 1) if elapsed else None,
+                "peak_samples_per_second": max(seconds) if seconds else None,
+                "decode_p50_ms": None if not decode else round(percentile(decode, 50) * 1000, 3),
+                "decode_p99_ms": None if not decode else round(percentile(decode, 99) * 1000, 3),
+                "sample_age_p50_ms": None if not age else round(percentile(age, 50), 1),
+                "sample_age_p99_ms": None if not age else round(percentile(age, 99), 1),
+            }
+
+
+# --------------------------
+# CLI
+# --------------------------
+def receive(args):
+    receiver = RemoteWriteReceiver(args.port, host=args.host).start()
+    # First line is machine readable: the generator reads the port from it
+    print(json.dumps({"port": receiver.port}), flush=True)
+    if not args.quiet:
+        print(f"remote-write receiver on http://{args.host}:{receiver.port}/api/v1/push ({receiver.codec})", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(args.report_interval)
+            if not args.quiet:
+                print(json.dumps(receiver.stats()), file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+    return 0
+
+
+def generate(args):
+    endpoints = endpoints_for(args.pods, args.series)
+    series = args.pods * series_per_pod(endpoints)
+    rate = args.rate or series / args.interval
+    local = None if args.url else _LocalReceiver()
+    options = {
+        "url": args.url or local.url,
+        "tenant": args.tenant,
+        "pods": args.pods,
+        "endpoints": endpoints,
+        "processes": args.processes,
+        "connections": args.connections,
+        "batch_size": args.batch_size,
+        "rate": rate,
+        "interval": series / rate,
+        "duration": args.duration,
+        "seed": args.seed,
+    }
+    print(
+        f"{series} series ({args.pods} pods x {endpoints} endpoints), {rate:.0f} samples/s, "
+        f"codec {snappy_codec()[2]} -> {options['url']}",
+        file=sys.stderr,
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            shards = list(pool.map(_generate_shard, [options] * args.processes, range(args.processes)))
+        received = local.stats() if local else None
+    finally:
+        if local:
+            local.close()
+
+    report = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "codec": snappy_codec()[2],
+        "target": {key: options[key] for key in ("pods", "endpoints", "processes", "connections", "batch_size", "duration")},
+        "target_samples_per_second": round(rate, 1),
+        "sent": _merge(shards),
+        "received": received,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({"sent": report["sent"], "received": received}, indent=2))
+    return 0 if report["sent"]["samples_failed"] == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic Prometheus remote-write load and local receiver")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="send remote-write load")
+    gen.add_argument("--url", help="push endpoint (default: start the local receiver)")
+    gen.add_argument("--tenant", default="demo", help="X-Scope-OrgID header")
+    gen.add_argument("--pods", type=int, default=10, help="simulated flask-app pods")
+    gen.add_argument("--series", type=int, default=0, help="total series (default: the app's own per pod)")
+    gen.add_argument("--rate", type=float, default=0, help="samples/sec (default: every series once per --interval)")
+    gen.add_argument("--interval", type=float, default=5.0, help="scrape interval the default rate assumes")
+    gen.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    gen.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1), help="encoding processes")
+    gen.add_argument("--connections", type=int, default=4, help="concurrent requests per process")
+    gen.add_argument("--batch-size", type=int, default=2000, help="samples per request (Prometheus max_samples_per_send)")
+    gen.add_argument("--seed", type=int, default=1)
+    gen.add_argument("--report", default="bench-remotewrite.json", help="where to write the JSON report")
+
+    recv = commands.add_parser("receive", help="run the local receiver")
+    recv.add_argument("--host", default="127.0.0.1")
+    recv.add_argument("--port", type=int, default=9009)
+    recv.add_argument("--report-interval", type=float, default=10.0, help="seconds between stats lines on stderr")
+    recv.add_argument("--quiet", action="store_true", help="only print the port line")
+
+    args = parser.parse_args(argv)
+    return generate(args) if args.command == "generate" else receive(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
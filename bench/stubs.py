@@ -0,0 +1,236 @@
+# bench/stubs.py
+#
+# Local stand-ins used by the benchmarks: OTLP/HTTP and OTLP/gRPC sinks that
+# accept and count export requests, a TCP proxy that counts bytes on the
+# wire, and a service2 stub for service1 to call.
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer:
+    """ThreadingHTTPServer (on 127.0.0.1 by default) running in a daemon thread."""
+
+    handler = None
+
+    def __init__(self, port=0, host="127.0.0.1"):
+        self.httpd = ThreadingHTTPServer((host, port), self.handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _CollectorHandler(_QuietHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.stub.record(self.path, len(body), self.headers.get("Content-Encoding"))
+        # Empty Export*ServiceResponse is a valid protobuf message
+        self._reply(200, content_type="application/x-protobuf")
+
+
+class _ExportCounter:
+    """Requests and payload bytes per path (or gRPC service)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.bytes = {}
+        self.encodings = {}
+
+    def record(self, path, size, encoding):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bytes[path] = self.bytes.get(path, 0) + size
+            if encoding:
+                self.encodings[path] = encoding
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                path: {"requests": self.requests[path], "bytes": self.bytes[path]}
+                for path in self.requests
+            }
+
+
+class StubCollector(_ExportCounter, StubServer):
+    """OTLP/HTTP sink: counts requests and body bytes per path."""
+
+    handler = _CollectorHandler
+
+    def __init__(self, port=0):
+        _ExportCounter.__init__(self)
+        StubServer.__init__(self, port)
+
+
+def _otlp_servicer(base, response_class, counter, path):
+    class Servicer(base):
+        def Export(self, request, context):
+            # Size of the decoded request; wire bytes come from ByteCountingProxy
+            counter.record(path, request.ByteSize(), None)
+            return response_class()
+
+    return Servicer()
+
+
+class StubGrpcCollector(_ExportCounter):
+    """OTLP/gRPC sink for traces, metrics and logs (needs grpcio)."""
+
+    def __init__(self, port=0, workers=4):
+        super().__init__()
+        import grpc
+        from opentelemetry.proto.collector.logs.v1 import logs_service_pb2, logs_service_pb2_grpc
+        from opentelemetry.proto.collector.metrics.v1 import (
+            metrics_service_pb2,
+            metrics_service_pb2_grpc,
+        )
+        from opentelemetry.proto.collector.trace.v1 import trace_service_pb2, trace_service_pb2_grpc
+
+        self.server = grpc.server(ThreadPoolExecutor(max_workers=workers))
+        trace_service_pb2_grpc.add_TraceServiceServicer_to_server(
+            _otlp_servicer(
+                trace_service_pb2_grpc.TraceServiceServicer,
+                trace_service_pb2.ExportTraceServiceResponse,
+                self,
+                "traces",
+            ),
+            self.server,
+        )
+        metrics_service_pb2_grpc.add_MetricsServiceServicer_to_server(
+            _otlp_servicer(
+                metrics_service_pb2_grpc.MetricsServiceServicer,
+                metrics_service_pb2.ExportMetricsServiceResponse,
+                self,
+                "metrics",
+            ),
+            self.server,
+        )
+        logs_service_pb2_grpc.add_LogsServiceServicer_to_server(
+            _otlp_servicer(
+                logs_service_pb2_grpc.LogsServiceServicer,
+                logs_service_pb2.ExportLogsServiceResponse,
+                self,
+                "logs",
+            ),
+            self.server,
+        )
+        self.port = self.server.add_insecure_port(f"127.0.0.1:{port}")
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop(grace=None)
+
+
+class ByteCountingProxy:
+    """TCP proxy on 127.0.0.1 counting bytes sent to and received from a local port.
+
+    Counts what actually crosses the socket, so HTTP headers, gRPC/HTTP2
+    framing and compression are all reflected.
+    """
+
+    def __init__(self, target_port, port=0):
+        self.target = ("127.0.0.1", target_port)
+        self._listener = socket.create_server(("127.0.0.1", port))
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.received = 0
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+
+    @property
+    def port(self):
+        return self._listener.getsockname()[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._listener.close()
+
+    def snapshot(self):
+        with self._lock:
+            return {"sent": self.sent, "received": self.received}
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(self.target)
+            for src, dst, upstream_bound in ((client, upstream, True), (upstream, client, False)):
+                threading.Thread(
+                    target=self._pump, args=(src, dst, upstream_bound), daemon=True
+                ).start()
+
+    def _pump(self, src, dst, upstream_bound):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                with self._lock:
+                    if upstream_bound:
+                        self.sent += len(data)
+                    else:
+                        self.received += len(data)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+
+class _Service2Handler(_QuietHandler):
+    def do_GET(self):
+        # Propagated trace context is accepted and ignored
+        self._reply(200, b"Service 2 - Hello!")
+
+
+class StubService2(StubServer):
+    handler = _Service2Handler
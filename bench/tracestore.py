@@ -0,0 +1,300 @@
+# bench/tracestore.py
+#
+# In-memory, columnar span store behind bench/receiver.py.
+#
+# Spans are appended to the active block: one array per column (trace id
+# halves, span ids, start, duration, interned service and span-name ids,
+# kind, status) plus a tuple of attributes per row. Per block:
+#
+#   trace index     trace id -> rows (dict while active; sorted arrays searched
+#                   with bisect once the block is sealed)
+#   service index   service id -> rows
+#   name index      (service id, name id) -> rows
+#   duration index  rows sorted by duration (sealed blocks), for range queries
+#
+# A block is sealed when it reaches `block_spans` rows or `block_seconds`
+# of age. Whole blocks are evicted once they are older than `retention_seconds`
+# or the store holds more than `max_spans`, so memory stays bounded and
+# eviction costs nothing per span.
+import bisect
+import threading
+import time
+from array import array
+
+KINDS = ["UNSPECIFIED", "INTERNAL", "SERVER", "CLIENT", "PRODUCER", "CONSUMER"]
+STATUSES = ["UNSET", "OK", "ERROR"]
+
+
+def _split_trace_id(raw):
+    value = int.from_bytes(raw, "big")
+    return value >> 64, value & 0xFFFFFFFFFFFFFFFF
+
+
+def any_value(value):
+    """Python value of an OTLP AnyValue."""
+    kind = value.WhichOneof("value")
+    if kind is None:
+        return None
+    if kind == "array_value":
+        return [any_value(v) for v in value.array_value.values]
+    if kind == "kvlist_value":
+        return {kv.key: any_value(kv.value) for kv in value.kvlist_value.values}
+    if kind == "bytes_value":
+        return value.bytes_value.hex()
+    return getattr(value, kind)
+
+
+class _Interner:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def id(self, value):
+        interned = self.ids.get(value)
+        if interned is None:
+            interned = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return interned
+
+
+class _Block:
+    def __init__(self, now):
+        self.created = now
+        self.last_write = now
+        self.sealed = False
+        self.trace_hi = array("Q")
+        self.trace_lo = array("Q")
+        self.span_id = array("Q")
+        self.parent_id = array("Q")
+        self.start_ns = array("q")
+        self.duration_ns = array("q")
+        self.service = array("I")
+        self.name = array("I")
+        self.kind = array("b")
+        self.status = array("b")
+        self.attributes = []
+        self.min_start = None
+        self.max_end = None
+        self.by_trace = {}
+        self.by_service = {}
+        self.by_name = {}
+        # Built on seal
+        self.sorted_hi = self.sorted_lo = self.sorted_trace_rows = None
+        self.sorted_duration = self.duration_rows = None
+
+    def __len__(self):
+        return len(self.span_id)
+
+    def append(self, trace_hi, trace_lo, span_id, parent_id, start, duration, service, name, kind, status, attributes):
+        row = len(self.span_id)
+        self.trace_hi.append(trace_hi)
+        self.trace_lo.append(trace_lo)
+        self.span_id.append(span_id)
+        self.parent_id.append(parent_id)
+        self.start_ns.append(start)
+        self.duration_ns.append(duration)
+        self.service.append(service)
+        self.name.append(name)
+        self.kind.append(kind)
+        self.status.append(status)
+        self.attributes.append(attributes)
+        self.min_start = start if self.min_start is None else min(self.min_start, start)
+        self.max_end = start + duration if self.max_end is None else max(self.max_end, start + duration)
+        self.by_trace.setdefault((trace_hi, trace_lo), array("I")).append(row)
+        self.by_service.setdefault(service, array("I")).append(row)
+        self.by_name.setdefault((service, name), array("I")).append(row)
+
+    def seal(self):
+        order = sorted(range(len(self)), key=lambda r: (self.trace_hi[r], self.trace_lo[r]))
+        self.sorted_hi = array("Q", (self.trace_hi[r] for r in order))
+        self.sorted_lo = array("Q", (self.trace_lo[r] for r in order))
+        self.sorted_trace_rows = array("I", order)
+        order = sorted(range(len(self)), key=self.duration_ns.__getitem__)
+        self.sorted_duration = array("q", (self.duration_ns[r] for r in order))
+        self.duration_rows = array("I", order)
+        self.by_trace = None  # the sorted arrays replace the dict
+        self.sealed = True
+
+    def trace_rows(self, trace_hi, trace_lo):
+        if not self.sealed:
+            return self.by_trace.get((trace_hi, trace_lo), ())
+        rows = []
+        i = bisect.bisect_left(self.sorted_hi, trace_hi)
+        while i < len(self.sorted_hi) and self.sorted_hi[i] == trace_hi:
+            if self.sorted_lo[i] == trace_lo:
+                rows.append(self.sorted_trace_rows[i])
+            i += 1
+        return rows
+
+    def duration_range_rows(self, min_ns, max_ns):
+        lo = bisect.bisect_left(self.sorted_duration, min_ns) if min_ns else 0
+        hi = bisect.bisect_right(self.sorted_duration, max_ns) if max_ns else len(self.sorted_duration)
+        return self.duration_rows[lo:hi]
+
+
+class TraceStore:
+    """Bounded, indexed span store answering search and get-trace queries."""
+
+    def __init__(self, retention_seconds=900, max_spans=2_000_000, block_spans=65536, block_seconds=30):
+        self.retention_seconds = retention_seconds
+        self.max_spans = max_spans
+        self.block_spans = block_spans
+        self.block_seconds = block_seconds
+        self._services = _Interner()
+        self._names = _Interner()
+        self._attribute_keys = _Interner()
+        self._blocks = []
+        self._lock = threading.Lock()
+        self.spans = 0
+        self.evicted_spans = 0
+
+    # --------------------------
+    # Ingest
+    # --------------------------
+    def add_request(self, request):
+        """Store every span of an ExportTraceServiceRequest; returns the span count."""
+        added = 0
+        now = time.monotonic()
+        with self._lock:
+            block = self._writable_block(now)
+            for resource_spans in request.resource_spans:
+                service = "unknown_service"
+                for kv in resource_spans.resource.attributes:
+                    if kv.key == "service.name":
+                        service = kv.value.string_value
+                service_id = self._services.id(service)
+                for scope_spans in resource_spans.scope_spans:
+                    for span in scope_spans.spans:
+                        if len(block) >= self.block_spans:
+                            block = self._writable_block(now, force_new=True)
+                        trace_hi, trace_lo = _split_trace_id(span.trace_id)
+                        block.append(
+                            trace_hi,
+                            trace_lo,
+                            int.from_bytes(span.span_id, "big"),
+                            int.from_bytes(span.parent_span_id, "big") if span.parent_span_id else 0,
+                            span.start_time_unix_nano,
+                            span.end_time_unix_nano - span.start_time_unix_nano,
+                            service_id,
+                            self._names.id(span.name),
+                            span.kind,
+                            span.status.code,
+                            tuple(
+                                (self._attribute_keys.id(kv.key), any_value(kv.value))
+                                for kv in span.attributes
+                            ),
+                        )
+                        added += 1
+            block.last_write = now
+            self.spans += added
+            self._evict(now)
+        return added
+
+    def _writable_block(self, now, force_new=False):
+        block = self._blocks[-1] if self._blocks else None
+        if block is not None and not force_new and now - block.created < self.block_seconds:
+            return block
+        if block is not None and len(block):
+            block.seal()
+        elif block is not None:
+            self._blocks.pop()
+        block = _Block(now)
+        self._blocks.append(block)
+        return block
+
+    def _evict(self, now):
+        while len(self._blocks) > 1 and (
+            self.spans > self.max_spans or now - self._blocks[0].last_write > self.retention_seconds
+        ):
+            block = self._blocks.pop(0)
+            self.spans -= len(block)
+            self.evicted_spans += len(block)
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def _span(self, block, row):
+        keys = self._attribute_keys.values
+        return {
+            "trace_id": f"{(block.trace_hi[row] << 64) | block.trace_lo[row]:032x}",
+            "span_id": f"{block.span_id[row]:016x}",
+            "parent_span_id": f"{block.parent_id[row]:016x}" if block.parent_id[row] else None,
+            "service": self._services.values[block.service[row]],
+            "name": self._names.values[block.name[row]],
+            "kind": KINDS[block.kind[row]] if block.kind[row] < len(KINDS) else block.kind[row],
+            "status": STATUSES[block.status[row]] if block.status[row] < len(STATUSES) else block.status[row],
+            "start_unix_nano": block.start_ns[row],
+            "duration_nano": block.duration_ns[row],
+            "attributes": {keys[k]: v for k, v in block.attributes[row]},
+        }
+
+    def get_trace(self, trace_id):
+        """All stored spans of a trace (hex id), ordered by start time."""
+        trace_hi, trace_lo = _split_trace_id(bytes.fromhex(trace_id.rjust(32, "0")))
+        with self._lock:
+            spans = [
+                self._span(block, row)
+                for block in self._blocks
+                for row in block.trace_rows(trace_hi, trace_lo)
+            ]
+        spans.sort(key=lambda span: span["start_unix_nano"])
+        return spans
+
+    def search(self, service=None, name=None, min_duration_ns=0, max_duration_ns=0,
+               start_ns=0, end_ns=0, limit=20):
+        """Newest matching spans' traces: [{trace_id, service, name, start, duration}]."""
+        results = {}
+        with self._lock:
+            service_id = self._services.ids.get(service) if service else None
+            name_id = self._names.ids.get(name) if name else None
+            if (service and service_id is None) or (name and name_id is None):
+                return []
+            for block in reversed(self._blocks):
+                if not len(block):
+                    continue
+                if (start_ns and block.max_end < start_ns) or (end_ns and block.min_start > end_ns):
+                    continue
+                for row in reversed(self._candidates(block, service_id, name_id, min_duration_ns, max_duration_ns)):
+                    duration = block.duration_ns[row]
+                    if (min_duration_ns and duration < min_duration_ns) or (
+                        max_duration_ns and duration > max_duration_ns
+                    ):
+                        continue
+                    start = block.start_ns[row]
+                    if (start_ns and start < start_ns) or (end_ns and start > end_ns):
+                        continue
+                    key = (block.trace_hi[row] << 64) | block.trace_lo[row]
+                    if key not in results:
+                        results[key] = {
+                            "trace_id": f"{key:032x}",
+                            "service": self._services.values[block.service[row]],
+                            "name": self._names.values[block.name[row]],
+                            "start_unix_nano": start,
+                            "duration_nano": duration,
+                        }
+                        if len(results) >= limit:
+                            return list(results.values())
+        return list(results.values())
+
+    def _candidates(self, block, service_id, name_id, min_duration_ns, max_duration_ns):
+        # Most selective index first; the caller re-checks every condition
+        if service_id is not None and name_id is not None:
+            return block.by_name.get((service_id, name_id), ())
+        if name_id is not None:
+            return sorted(
+                row for (_, n), rows in block.by_name.items() if n == name_id for row in rows
+            )
+        if service_id is not None:
+            return block.by_service.get(service_id, ())
+        if block.sealed and (min_duration_ns or max_duration_ns):
+            return sorted(block.duration_range_rows(min_duration_ns, max_duration_ns))
+        return range(len(block))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "spans": self.spans,
+                "evicted_spans": self.evicted_spans,
+                "blocks": len(self._blocks),
+                "services": list(self._services.values),
+            }
@@ -0,0 +1,7 @@
+# common/__init__.py
+#
+# Helpers shared by the demo services (SA*, SB*, mimir/flask-app*).
+# Each service's Docker image copies this package next to its app.py, so
+# it is imported as a top-level package: `from common.downstream import ...`.
+# When running an app.py directly from a checkout, put the repo root on
+# PYTHONPATH (e.g. `PYTHONPATH=. python SA-OTEL/app.py`).
@@ -0,0 +1,96 @@
+# common/aggregation.py
+#
+# Histogram aggregation and temporality for the OTLP metric exporters.
+#
+# The SDK defaults are explicit-bucket histograms (16 fixed boundaries from
+# 0 to 10 000, meant for milliseconds, so a latency in seconds lands in the
+# first few buckets) and cumulative temporality. Each explicit histogram
+# becomes buckets + 2 series in Mimir per attribute set. The alternatives:
+#
+#   exponential   base-2 exponential histograms. The scale (resolution, 2**(2**-scale)
+#                 growth per bucket) adapts to the recorded range within
+#                 `max_size` buckets and `max_scale`; Mimir stores one
+#                 native-histogram series per attribute set
+#   buckets       per-instrument explicit boundaries, e.g. for seconds-based
+#                 latencies: "flask_request_latency_seconds=0.01,0.05,0.1,0.25,0.5,1"
+#   delta         counters and histograms report the change since the last
+#                 export instead of the running total, so the SDK drops
+#                 attribute sets that saw no measurements. Mimir and Prometheus
+#                 only ingest cumulative data: use it only when the collector
+#                 converts (deltatocumulative processor) or the backend
+#                 accepts delta (e.g. Dynatrace)
+#   lowmemory     delta for synchronous counters and histograms only
+#
+# Only OTLP exporters take these preferences; the Prometheus reader is
+# always cumulative with explicit buckets.
+#
+# Selected in common.telemetry:
+#   OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION
+#                                   explicit_bucket_histogram | base2_exponential_bucket_histogram
+#   OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE
+#                                   cumulative | delta | lowmemory
+#   OTEL_METRICS_EXPONENTIAL_MAX_SIZE    buckets per sign (default 160)
+#   OTEL_METRICS_EXPONENTIAL_MAX_SCALE   finest scale (default 20)
+#   OTEL_METRICS_HISTOGRAM_BUCKETS       "name=b1,b2,...;name2=..." explicit boundaries per instrument
+EXPLICIT = "explicit_bucket_histogram"
+EXPONENTIAL = "base2_exponential_bucket_histogram"
+HISTOGRAM_AGGREGATIONS = (EXPLICIT, EXPONENTIAL)
+TEMPORALITIES = ("cumulative", "delta", "lowmemory")
+
+
+def parse_histogram_buckets(value):
+    """"name=0.01,0.1,1;other=5,10" -> {"name": (0.01, 0.1, 1.0), "other": (5.0, 10.0)}"""
+    buckets = {}
+    for item in filter(None, (part.strip() for part in value.split(";"))):
+        name, _, boundaries = item.partition("=")
+        buckets[name.strip()] = tuple(sorted(float(b) for b in boundaries.split(",") if b.strip()))
+    return buckets
+
+
+def preferred_temporality(mode):
+    """Exporter `preferred_temporality` for cumulative | delta | lowmemory."""
+    from opentelemetry.sdk.metrics import (
+        Counter,
+        Histogram,
+        ObservableCounter,
+        ObservableGauge,
+        ObservableUpDownCounter,
+        UpDownCounter,
+    )
+    from opentelemetry.sdk.metrics.export import AggregationTemporality
+
+    if mode not in TEMPORALITIES:
+        raise ValueError(f"Unknown metrics temporality: {mode}")
+    cumulative, delta = AggregationTemporality.CUMULATIVE, AggregationTemporality.DELTA
+    synchronous = delta if mode in ("delta", "lowmemory") else cumulative
+    return {
+        Counter: synchronous,
+        Histogram: synchronous,
+        ObservableCounter: delta if mode == "delta" else cumulative,
+        # Up/down counters and gauges are not additive over time: always cumulative
+        UpDownCounter: cumulative,
+        ObservableUpDownCounter: cumulative,
+        ObservableGauge: cumulative,
+    }
+
+
+def preferred_aggregation(histogram_aggregation, max_size=160, max_scale=20):
+    """Exporter `preferred_aggregation`: which aggregation Histogram instruments default to."""
+    if histogram_aggregation not in HISTOGRAM_AGGREGATIONS:
+        raise ValueError(f"Unknown histogram aggregation: {histogram_aggregation}")
+    if histogram_aggregation == EXPLICIT:
+        return {}
+    from opentelemetry.sdk.metrics import Histogram
+    from opentelemetry.sdk.metrics.view import ExponentialBucketHistogramAggregation
+
+    return {Histogram: ExponentialBucketHistogramAggregation(max_size=max_size, max_scale=max_scale)}
+
+
+def histogram_views(buckets):
+    """One View per instrument with its own explicit bucket boundaries."""
+    from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+
+    return [
+        View(instrument_name=name, aggregation=ExplicitBucketHistogramAggregation(boundaries))
+        for name, boundaries in buckets.items()
+    ]
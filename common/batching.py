@@ -0,0 +1,244 @@
+# common/batching.py
+#
+# Adaptive batch processors for spans and log records, replacing the SDK's
+# BatchSpanProcessor / BatchLogRecordProcessor and their fixed queue size,
+# batch size and schedule delay.
+#
+# One worker thread per processor exports from a bounded queue. After every
+# export it adjusts its own schedule:
+#
+#   pressure  the queue still holds a full batch, is more than a quarter full,
+#             or the export took more than half the schedule delay
+#             -> batch size doubles (up to max_export_batch_size) and the
+#                delay halves (down to min_delay_millis), so fewer, larger
+#                exports keep up before the queue overflows
+#   idle      the timer fired with less than half a batch queued
+#             -> the delay grows by half (up to max_delay_millis), so off-peak
+#                traffic is sent in fewer, fuller requests, and a batch size
+#                grown during a burst halves back towards the starting size
+#                (never below it); a new burst still wakes the worker as soon
+#                as a full batch is queued
+#
+# Items arriving at a full queue are dropped and counted. observe(meter)
+# reports the processor's own state through the app's MeterProvider, with a
+# "signal" attribute (traces | logs):
+#
+#   otel_batch_queue_size                     items waiting
+#   otel_batch_queue_capacity                 max_queue_size
+#   otel_batch_target_size                    current batch size target
+#   otel_batch_schedule_delay_seconds         current schedule delay
+#   otel_batch_dropped_total                  items dropped at a full queue
+#   otel_batch_exported_total                 items handed to the exporter
+#   otel_batch_export_failures_total          exports that did not succeed
+#   otel_batch_size                           histogram of items per export
+#   otel_batch_export_duration_seconds        histogram of export duration
+#
+# Enabled by common.telemetry:
+#   OTEL_BATCH_ADAPTIVE                "true" to use these processors for traces and logs
+#   OTEL_BATCH_MAX_QUEUE_SIZE          queue bound per processor (default 8192)
+#   OTEL_BATCH_MAX_EXPORT_BATCH_SIZE   largest batch (default 2048)
+#   OTEL_BATCH_MAX_DELAY               longest schedule delay in ms (default 5000)
+import collections
+import logging
+import threading
+import time
+
+from opentelemetry.context import _SUPPRESS_INSTRUMENTATION_KEY, attach, set_value
+from opentelemetry.sdk._logs import LogRecordProcessor
+from opentelemetry.sdk.trace import SpanProcessor
+
+_log = logging.getLogger(__name__)
+
+
+class _AdaptiveBatcher:
+    def __init__(
+        self,
+        exporter,
+        signal,
+        max_queue_size=8192,
+        min_export_batch_size=64,
+        max_export_batch_size=2048,
+        min_delay_millis=100,
+        max_delay_millis=5000,
+    ):
+        self._exporter = exporter
+        self.signal = signal
+        self.max_queue_size = max_queue_size
+        self.min_batch_size = min_export_batch_size
+        self.max_batch_size = max(max_export_batch_size, min_export_batch_size)
+        self.min_delay = min_delay_millis / 1000
+        self.max_delay = max(max_delay_millis, min_delay_millis) / 1000
+        # Start at the SDK defaults (512 items / 5 s), within the bounds
+        self.batch_size = self.base_batch_size = min(max(512, self.min_batch_size), self.max_batch_size)
+        self.delay = min(max(5.0, self.min_delay), self.max_delay)
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._flush_events = []
+        self._stopped = False
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()  # add() runs on every producer thread
+        self.exported = 0
+        self.failures = 0
+        self._batch_sizes = None
+        self._export_durations = None
+        self._worker = threading.Thread(target=self._run, name=f"AdaptiveBatch-{signal}", daemon=True)
+        self._worker.start()
+
+    def add(self, item):
+        if self._stopped:
+            return
+        if len(self._queue) >= self.max_queue_size:
+            with self._dropped_lock:
+                self.dropped += 1
+            return
+        self._queue.append(item)
+        # >=: concurrent appends can step over the exact size
+        if len(self._queue) >= self.batch_size:
+            with self._condition:
+                self._condition.notify()
+
+    # --------------------------
+    # Worker
+    # --------------------------
+    def _run(self):
+        # The exporter's own HTTP/gRPC calls must not be traced
+        attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+        while True:
+            with self._condition:
+                if not (self._stopped or self._flush_events or len(self._queue) >= self.batch_size):
+                    self._condition.wait(self.delay)
+                flushing, self._flush_events = self._flush_events, []
+                stopping = self._stopped
+            if flushing or stopping:
+                while self._queue:
+                    self._export()
+                for event in flushing:
+                    event.set()
+                if stopping:
+                    return
+            else:
+                exported = self._export()
+                if exported is not None:
+                    self._adapt(*exported)
+
+    def _export(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        if not batch:
+            self._adapt_idle(0)
+            return None
+        start = time.perf_counter()
+        try:
+            ok = self._exporter.export(batch).name == "SUCCESS"
+        except Exception:  # an exporter bug must not kill the worker
+            _log.exception("%s export failed", self.signal)
+            ok = False
+        duration = time.perf_counter() - start
+        self.exported += len(batch)
+        if not ok:
+            self.failures += 1
+        attributes = {"signal": self.signal}
+        if self._batch_sizes is not None:
+            self._batch_sizes.record(len(batch), attributes)
+            self._export_durations.record(duration, attributes)
+        return len(batch), duration
+
+    def _adapt(self, exported, duration):
+        queued = len(self._queue)
+        if queued >= self.batch_size or queued > self.max_queue_size // 4 or duration > self.delay / 2:
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+            self.delay = max(self.delay / 2, self.min_delay)
+        else:
+            self._adapt_idle(exported)
+
+    def _adapt_idle(self, exported):
+        if exported < self.batch_size // 2:
+            self.delay = min(self.delay * 1.5, self.max_delay)
+            self.batch_size = max(self.batch_size // 2, self.base_batch_size)
+
+    # --------------------------
+    # Lifecycle
+    # --------------------------
+    def force_flush(self, timeout_millis=30000):
+        if self._stopped:
+            return True
+        event = threading.Event()
+        with self._condition:
+            self._flush_events.append(event)
+            self._condition.notify()
+        return event.wait(timeout_millis / 1000)
+
+    def shutdown(self):
+        if self._stopped:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._worker.join()
+        self._exporter.shutdown()
+
+    # --------------------------
+    # Self-telemetry
+    # --------------------------
+    def observe(self, meter):
+        """Report queue, drops and export stats through `meter`."""
+        from opentelemetry.metrics import Observation
+
+        attributes = {"signal": self.signal}
+
+        def observe(read):
+            return lambda options: [Observation(read(), attributes)]
+
+        meter.create_observable_gauge(
+            "otel_batch_queue_size", callbacks=[observe(lambda: len(self._queue))], description="Items waiting"
+        )
+        meter.create_observable_gauge(
+            "otel_batch_queue_capacity", callbacks=[observe(lambda: self.max_queue_size)]
+        )
+        meter.create_observable_gauge(
+            "otel_batch_target_size", callbacks=[observe(lambda: self.batch_size)], description="Current batch size"
+        )
+        meter.create_observable_gauge(
+            "otel_batch_schedule_delay_seconds", callbacks=[observe(lambda: self.delay)], unit="s"
+        )
+        meter.create_observable_counter(
+            "otel_batch_dropped_total", callbacks=[observe(lambda: self.dropped)], description="Dropped at a full queue"
+        )
+        meter.create_observable_counter("otel_batch_exported_total", callbacks=[observe(lambda: self.exported)])
+        meter.create_observable_counter(
+            "otel_batch_export_failures_total", callbacks=[observe(lambda: self.failures)]
+        )
+        self._export_durations = meter.create_histogram(
+            "otel_batch_export_duration_seconds", unit="s", description="Export call duration"
+        )
+        self._batch_sizes = meter.create_histogram("otel_batch_size", description="Items per export")
+
+
+class AdaptiveBatchSpanProcessor(_AdaptiveBatcher, SpanProcessor):
+    """Batches sampled spans with an adaptive size and schedule."""
+
+    def __init__(self, exporter, **kwargs):
+        _AdaptiveBatcher.__init__(self, exporter, "traces", **kwargs)
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span):
+        # Like BatchSpanProcessor: RECORD_ONLY spans are not exported
+        if span.context.trace_flags.sampled:
+            self.add(span)
+
+
+class AdaptiveBatchLogRecordProcessor(_AdaptiveBatcher, LogRecordProcessor):
+    """Batches log records with an adaptive size and schedule."""
+
+    def __init__(self, exporter, **kwargs):
+        _AdaptiveBatcher.__init__(self, exporter, "logs", **kwargs)
+
+    def emit(self, log_data):
+        self.add(log_data)
+
+    # Newer SDKs call on_emit
+    on_emit = emit
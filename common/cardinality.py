@@ -0,0 +1,197 @@
+# common/cardinality.py
+#
+# Per-instrument cardinality limits for metric attributes, so a path that
+# carries ids can't turn into thousands of series in Mimir (active series are
+# what the ingesters, and the mimir-tenants / mimir-top-tenants dashboards and
+# mimir-overrides limits, are sized on).
+#
+# A CardinalityLimiter admits the first `limit` distinct attribute keys of an
+# instrument; later keys are folded into OTHER by the caller. Every key is
+# also added to a HyperLogLog sketch (4096 one-byte registers, ~1.6% error),
+# so the number of distinct attribute sets the instrument *would* have had is
+# known without keeping them. The admitted set itself is bounded by `limit`.
+#
+# A CardinalityGuard holds the limiters of one process and reports them:
+#
+#   guard.observe(meter)    cardinality_overflow_total      measurements folded into OTHER
+#                           cardinality_estimated_series    HyperLogLog estimate of distinct sets
+#                           cardinality_limit               configured limit
+#                           (all with an "instrument" attribute)
+#   guard.prometheus()      cardinality_overflow_total{instrument} for prometheus_client
+#                           (incremented in place, so it works in multiprocess mode)
+#
+# Users: common/red.py (route attribute of the Flask RED metrics),
+# common/spanmetrics.py (endpoint attribute of span-derived metrics).
+# instrumentation_views() additionally drops the raw-path attributes
+# (http.target, url.path, ...) from FlaskInstrumentor's own metrics.
+#
+# Enabled by common.telemetry:
+#   OTEL_METRICS_CARDINALITY_LIMIT   distinct attribute sets per instrument; 0 = off (default)
+import math
+import threading
+
+OTHER = "other"
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value):
+    """splitmix64 finalizer: spreads Python's hash() over all 64 bits."""
+    x = value & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class HyperLogLog:
+    """Distinct-count sketch over hashable values."""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self._rest_bits = 64 - precision
+        self._rest_mask = (1 << self._rest_bits) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value):
+        x = _mix(hash(value))
+        index = x >> self._rest_bits
+        rank = self._rest_bits - (x & self._rest_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        registers = self.registers
+        estimate = self._alpha * self.size * self.size / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class CardinalityLimiter:
+    """Admits up to `limit` distinct attribute keys for one instrument."""
+
+    def __init__(self, instrument, limit, precision=12, on_overflow=None):
+        self.instrument = instrument
+        self.limit = limit
+        self.sketch = HyperLogLog(precision)
+        self.on_overflow = on_overflow
+        self.overflow = 0
+        self._admitted = set()
+        self._lock = threading.Lock()
+
+    def admit(self, key):
+        """True if `key` may be used as-is; False if it should become OTHER."""
+        if key in self._admitted:
+            return True
+        self.sketch.add(key)
+        with self._lock:
+            if key in self._admitted:
+                return True
+            if len(self._admitted) < self.limit:
+                self._admitted.add(key)
+                return True
+            self.overflow += 1
+        if self.on_overflow is not None:
+            self.on_overflow()
+        return False
+
+    def fold(self, key):
+        return key if self.admit(key) else OTHER
+
+    def estimate(self):
+        return max(self.sketch.count(), len(self._admitted))
+
+
+class CardinalityGuard:
+    """The process's limiters, one per instrument, and their metrics."""
+
+    def __init__(self, limit=1000, precision=12):
+        self.limit = limit
+        self.precision = precision
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._prometheus_overflow = None
+
+    def limiter(self, instrument, limit=None):
+        with self._lock:
+            limiter = self._limiters.get(instrument)
+            if limiter is None:
+                limiter = self._limiters[instrument] = CardinalityLimiter(
+                    instrument, limit or self.limit, self.precision
+                )
+                if self._prometheus_overflow is not None:
+                    limiter.on_overflow = self._prometheus_overflow.labels(instrument=instrument).inc
+            return limiter
+
+    def _observations(self, read):
+        from opentelemetry.metrics import Observation
+
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [Observation(read(limiter), {"instrument": limiter.instrument}) for limiter in limiters]
+
+    def observe(self, meter):
+        """Report overflow, estimated series and limit per instrument through `meter`."""
+        meter.create_observable_counter(
+            "cardinality_overflow_total",
+            callbacks=[lambda options: self._observations(lambda limiter: limiter.overflow)],
+            description="Measurements folded into the overflow attribute value",
+        )
+        meter.create_observable_gauge(
+            "cardinality_estimated_series",
+            callbacks=[lambda options: self._observations(CardinalityLimiter.estimate)],
+            description="Estimated distinct attribute sets per instrument (HyperLogLog)",
+        )
+        meter.create_observable_gauge(
+            "cardinality_limit",
+            callbacks=[lambda options: self._observations(lambda limiter: limiter.limit)],
+        )
+        return self
+
+    def prometheus(self):
+        """Count overflow in a prometheus_client Counter labelled by instrument."""
+        from prometheus_client import Counter
+
+        self._prometheus_overflow = Counter(
+            "cardinality_overflow", "Measurements folded into the overflow label value", ["instrument"]
+        )
+        with self._lock:
+            for name, limiter in self._limiters.items():
+                limiter.on_overflow = self._prometheus_overflow.labels(instrument=name).inc
+        return self
+
+
+# FlaskInstrumentor's server metrics keep only attributes with a bounded set
+# of values (old and new HTTP semantic conventions); http.target, url.path,
+# client addresses and user agents are dropped.
+_BOUNDED_SERVER_ATTRIBUTES = {
+    "http.method",
+    "http.scheme",
+    "http.flavor",
+    "http.status_code",
+    "http.server_name",
+    "http.host",
+    "net.host.name",
+    "net.host.port",
+    "http.route",
+    "http.request.method",
+    "http.response.status_code",
+    "url.scheme",
+    "network.protocol.version",
+    "server.address",
+    "server.port",
+    "error.type",
+}
+
+
+def instrumentation_views():
+    from opentelemetry.sdk.metrics.view import View
+
+    return [
+        View(instrument_name=name, attribute_keys=_BOUNDED_SERVER_ATTRIBUTES)
+        for name in ("http.server.duration", "http.server.request.duration", "http.server.active_requests")
+    ]
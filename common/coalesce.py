@@ -0,0 +1,247 @@
+# common/coalesce.py
+#
+# Request coalescing and a small response cache in front of DownstreamClient.
+#
+# Under a burst, many handlers issue the same GET to service2 at once and each
+# waits the full 0.1-0.5 s. CoalescingClient.get() keys calls on the URL:
+#
+#   miss       no call for the URL in flight: this request makes it (leader)
+#   coalesced  a call for the URL is already in flight: wait for it and share
+#              its response (or its exception) instead of sending another.
+#              A waiter gives up with DeadlineExceeded when its own deadline
+#              (common/resilience.py) runs out first
+#   hit        with a TTL set, a successful response younger than the TTL is
+#              returned without a call
+#   stale      older than the TTL but within the stale window: returned at
+#              once while one background call refreshes the entry
+#   bypass     calls with extra arguments (headers, params, ...) are passed
+#              through unchanged
+#
+# Responses are shared between callers, so they must not be streamed or
+# modified. Only 2xx/3xx responses are cached; errors and failed calls are
+# shared with the waiters of that one call, never stored.
+#
+# The outcome is set on the current span as downstream.cache.result (with
+# downstream.cache.age_ms for hit/stale and downstream.cache.leader_trace_id
+# for coalesced waits, whose HTTP client span lives in the leader's trace;
+# the leader gets downstream.cache.coalesced_waiters),
+# and counted per result in downstream_cache_requests_total when a meter is
+# passed, next to downstream_cache_entries and downstream_inflight_calls.
+#
+# Configuration (environment variables, read by from_env()):
+#   DOWNSTREAM_COALESCE            "false" to turn off single-flight (default true)
+#   DOWNSTREAM_CACHE_TTL           seconds a response is fresh; 0 disables the cache (default)
+#   DOWNSTREAM_CACHE_STALE         extra seconds a stale response may be served
+#                                  while it is revalidated (default 0)
+#   DOWNSTREAM_CACHE_MAX_ENTRIES   LRU bound on cached URLs (default 1024)
+import collections
+import contextvars
+import os
+import threading
+import time
+
+from common.downstream import _env_float, _env_int
+from common.resilience import DeadlineExceeded, remaining
+
+HIT, STALE, COALESCED, MISS, BYPASS = "hit", "stale", "coalesced", "miss", "bypass"
+
+
+def _current_span():
+    try:
+        from opentelemetry import trace
+    except ImportError:  # SA/SB run without the OTel API
+        return None
+    span = trace.get_current_span()
+    return span if span.is_recording() else None
+
+
+class _Call:
+    """One in-flight call; waiters block on `done` and share its outcome."""
+
+    def __init__(self, span):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+        self.waiters = 0
+        context = span.get_span_context() if span is not None else None
+        self.trace_id = format(context.trace_id, "032x") if context is not None else None
+
+
+class CoalescingClient:
+    """Single-flight GETs with an optional LRU/TTL cache and stale-while-revalidate."""
+
+    def __init__(self, client, coalesce=True, ttl=0.0, stale=0.0, max_entries=1024, meter=None):
+        self.client = client
+        self.coalesce = coalesce
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inflight = {}  # url -> _Call
+        self._cache = collections.OrderedDict()  # url -> (fetched at, response)
+        self._requests = None
+        if meter is not None:
+            self.observe(meter)
+
+    @classmethod
+    def from_env(cls, client, meter=None):
+        return cls(
+            client,
+            coalesce=os.getenv("DOWNSTREAM_COALESCE", "true").lower() == "true",
+            ttl=_env_float("DOWNSTREAM_CACHE_TTL", 0.0),
+            stale=_env_float("DOWNSTREAM_CACHE_STALE", 0.0),
+            max_entries=_env_int("DOWNSTREAM_CACHE_MAX_ENTRIES", 1024),
+            meter=meter,
+        )
+
+    # --------------------------
+    # Calls
+    # --------------------------
+    def get(self, url, **kwargs):
+        span = _current_span()
+        if kwargs.get("timeout") == self.client.timeout:
+            del kwargs["timeout"]
+        if kwargs:
+            self._record(span, BYPASS)
+            return self.client.get(url, **kwargs)
+
+        with self._lock:
+            cached = self._lookup(url)
+            if cached is not None:
+                age, response = cached
+                if age <= self.ttl:
+                    self._record(span, HIT, age=age)
+                    return response
+                # Stale: serve it, refresh in the background unless already underway
+                if url not in self._inflight:
+                    self._start_revalidation(url, span)
+                self._record(span, STALE, age=age)
+                return response
+            call = self._inflight.get(url) if self.coalesce else None
+            leader = call is None
+            if leader:
+                call = _Call(span)
+                if self.coalesce:
+                    self._inflight[url] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            budget = remaining()
+            finished = call.done.wait(timeout=None if budget is None else max(budget, 0))
+            self._record(span, COALESCED, leader_trace_id=call.trace_id)
+            if not finished:
+                raise DeadlineExceeded(f"shared call to {url} did not finish within the deadline")
+            if call.error is not None:
+                raise call.error
+            return call.response
+        self._record(span, MISS)
+        try:
+            return self._fetch(url, call)
+        finally:
+            if span is not None and call.waiters:
+                span.set_attribute("downstream.cache.coalesced_waiters", call.waiters)
+
+    def _fetch(self, url, call):
+        try:
+            call.response = self.client.get(url)
+        except Exception as exc:
+            call.error = exc
+        with self._lock:
+            if self._inflight.get(url) is call:
+                del self._inflight[url]
+            if call.error is None and call.response.status_code < 400:
+                self._store(url, call.response)
+        call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.response
+
+    def _start_revalidation(self, url, span):
+        call = _Call(span)
+        self._inflight[url] = call
+        # Copy the context so the refresh's client span joins the trace that triggered it
+        context = contextvars.copy_context()
+
+        def revalidate():
+            try:
+                self._fetch(url, call)
+            except Exception:  # the stale entry stays until it expires
+                pass
+
+        threading.Thread(target=context.run, args=(revalidate,), name="downstream-revalidate", daemon=True).start()
+
+    # --------------------------
+    # Cache (callers hold the lock)
+    # --------------------------
+    def _lookup(self, url):
+        if not self.ttl:
+            return None
+        entry = self._cache.get(url)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if age > self.ttl + self.stale:
+            del self._cache[url]
+            return None
+        self._cache.move_to_end(url)
+        return age, entry[1]
+
+    def _store(self, url, response):
+        if not self.ttl:
+            return
+        self._cache[url] = (time.monotonic(), response)
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(url, None)
+
+    # --------------------------
+    # Telemetry
+    # --------------------------
+    def _record(self, span, result, age=None, leader_trace_id=None):
+        if span is not None:
+            span.set_attribute("downstream.cache.result", result)
+            if age is not None:
+                span.set_attribute("downstream.cache.age_ms", round(age * 1000, 1))
+            if leader_trace_id is not None:
+                span.set_attribute("downstream.cache.leader_trace_id", leader_trace_id)
+        if self._requests is not None:
+            self._requests.add(1, {"result": result})
+
+    def observe(self, meter):
+        """Count results per request and report cache size and in-flight calls through `meter`."""
+        from opentelemetry.metrics import Observation
+
+        self._requests = meter.create_counter(
+            "downstream_cache_requests_total", description="Downstream GETs by cache/coalescing result"
+        )
+        meter.create_observable_gauge(
+            "downstream_cache_entries", callbacks=[lambda options: [Observation(len(self._cache))]]
+        )
+        meter.create_observable_gauge(
+            "downstream_inflight_calls", callbacks=[lambda options: [Observation(len(self._inflight))]]
+        )
+
+    # --------------------------
+    # Pass-through
+    # --------------------------
+    @property
+    def timeout(self):
+        return self.client.timeout
+
+    def fan_out(self, urls, return_exceptions=False, **kwargs):
+        # Different replicas per call: nothing to coalesce
+        return self.client.fan_out(urls, return_exceptions=return_exceptions, **kwargs)
+
+    async def afan_out(self, urls, return_exceptions=False, **kwargs):
+        return await self.client.afan_out(urls, return_exceptions=return_exceptions, **kwargs)
+
+    def close(self):
+        self.client.close()
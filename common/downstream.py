@@ -0,0 +1,201 @@
+# common/downstream.py
+#
+# Pooled HTTP client for service1 -> service2 calls.
+#
+# A single requests.Session is shared by every request handler, so TCP
+# connections to service2 are kept alive and reused instead of being opened
+# and torn down per call. RequestsInstrumentor patches Session.send, so calls
+# made through this client still produce the usual HTTP client spans.
+#
+# Configuration (environment variables):
+#   SERVICE2_URL                 default target (http://service2:5001/)
+#   SERVICE2_REPLICAS            comma-separated URLs used by fan_out()
+#   DOWNSTREAM_POOL_MAXSIZE      connections kept per host (default 20)
+#   DOWNSTREAM_HOST_POOL_SIZES   per-host overrides, e.g. "service2:5001=50,other:8080=5"
+#   DOWNSTREAM_POOL_BLOCK        "true" to wait for a free connection instead of
+#                                opening an extra, non-pooled one (default false)
+#   DOWNSTREAM_CONNECT_TIMEOUT   seconds (default 1.0)
+#   DOWNSTREAM_READ_TIMEOUT      seconds (default 5.0)
+#   DOWNSTREAM_FANOUT_WORKERS    threads used for concurrent fan-out (default 8)
+#   DOWNSTREAM_MAX_CONNECTIONS   AsyncDownstreamClient only: cap on open connections
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _parse_host_pool_sizes(spec):
+    """Parse "host:port=size,host2=size" into {"host:port": size}."""
+    sizes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, _, size = item.rpartition("=")
+        if not host:
+            raise ValueError(f"Invalid DOWNSTREAM_HOST_POOL_SIZES entry: {item!r}")
+        sizes[host] = int(size)
+    return sizes
+
+
+class DownstreamClient:
+    """Shared, connection-pooled client for calls to downstream services."""
+
+    def __init__(
+        self,
+        pool_maxsize=20,
+        host_pool_sizes=None,
+        pool_block=False,
+        connect_timeout=1.0,
+        read_timeout=5.0,
+        fanout_workers=8,
+    ):
+        # Imported here so services that only receive calls (service2) can
+        # use common.resilience's deadline hooks without requests installed
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+
+        # Default adapter for any host without an explicit pool size
+        default_adapter = HTTPAdapter(pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount("http://", default_adapter)
+        self.session.mount("https://", default_adapter)
+
+        # Per-host adapters; requests picks the longest matching mount prefix
+        for host, size in (host_pool_sizes or {}).items():
+            adapter = HTTPAdapter(pool_maxsize=size, pool_block=pool_block)
+            self.session.mount(f"http://{host}", adapter)
+            self.session.mount(f"https://{host}", adapter)
+
+        self._fanout_workers = fanout_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_maxsize=_env_int("DOWNSTREAM_POOL_MAXSIZE", 20),
+            host_pool_sizes=_parse_host_pool_sizes(os.getenv("DOWNSTREAM_HOST_POOL_SIZES", "")),
+            pool_block=os.getenv("DOWNSTREAM_POOL_BLOCK", "false").lower() == "true",
+            connect_timeout=_env_float("DOWNSTREAM_CONNECT_TIMEOUT", 1.0),
+            read_timeout=_env_float("DOWNSTREAM_READ_TIMEOUT", 5.0),
+            fanout_workers=_env_int("DOWNSTREAM_FANOUT_WORKERS", 8),
+        )
+
+    # --------------------------
+    # Single calls
+    # --------------------------
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    # --------------------------
+    # Concurrent fan-out
+    # --------------------------
+    @property
+    def executor(self):
+        # Created lazily so apps that never fan out don't start threads
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._fanout_workers, thread_name_prefix="downstream"
+                    )
+        return self._executor
+
+    def _submit(self, url, kwargs, get=None):
+        # Run each call in a copy of the caller's context so the active span
+        # is the parent of the client span created on the worker thread.
+        ctx = contextvars.copy_context()
+        return self.executor.submit(ctx.run, functools.partial(get or self.get, url, **kwargs))
+
+    def fan_out(self, urls, return_exceptions=False, get=None, **kwargs):
+        """GET every URL concurrently and return the responses in order.
+
+        With return_exceptions=True, failed calls are returned in place of
+        their response (like asyncio.gather) instead of being raised.
+        `get` replaces self.get for each call (ResilientClient passes its own).
+        """
+        futures = [self._submit(url, kwargs, get) for url in urls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
+
+    async def afan_out(self, urls, return_exceptions=False, get=None, **kwargs):
+        """Awaitable fan_out() for asyncio callers.
+
+        Calls still go through the pooled requests.Session on the fan-out
+        threads, so they keep their RequestsInstrumentor client spans.
+        """
+        futures = [asyncio.wrap_future(self._submit(url, kwargs, get)) for url in urls]
+        return await asyncio.gather(*futures, return_exceptions=return_exceptions)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class AsyncDownstreamClient:
+    """httpx.AsyncClient counterpart of DownstreamClient for the ASGI services.
+
+    Uses the same DOWNSTREAM_* settings. Calls run on the event loop, so
+    fan-out holds no threads, and the active span follows each task through
+    its awaits (asyncio copies the context into every task it creates).
+    HTTPXClientInstrumentor provides the client spans.
+    """
+
+    def __init__(self, pool_maxsize=20, connect_timeout=1.0, read_timeout=5.0, max_connections=None):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_keepalive_connections=pool_maxsize,
+                max_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_maxsize=_env_int("DOWNSTREAM_POOL_MAXSIZE", 20),
+            connect_timeout=_env_float("DOWNSTREAM_CONNECT_TIMEOUT", 1.0),
+            read_timeout=_env_float("DOWNSTREAM_READ_TIMEOUT", 5.0),
+            max_connections=_env_int("DOWNSTREAM_MAX_CONNECTIONS", 0) or None,
+        )
+
+    async def get(self, url, **kwargs):
+        return await self.client.get(url, **kwargs)
+
+    async def fan_out(self, urls, return_exceptions=False, **kwargs):
+        return await asyncio.gather(
+            *(self.get(url, **kwargs) for url in urls), return_exceptions=return_exceptions
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def service2_urls():
+    """Replica URLs for service2, falling back to the single SERVICE2_URL."""
+    default = os.getenv("SERVICE2_URL", "http://service2:5001/")
+    replicas = os.getenv("SERVICE2_REPLICAS", "")
+    return [url.strip() for url in replicas.split(",") if url.strip()] or [default]
@@ -0,0 +1,178 @@
+# common/exposition.py
+#
+# Cached, incremental /metrics for prometheus_client multiprocess mode.
+#
+# Building a fresh CollectorRegistry + MultiProcessCollector per scrape
+# re-reads every worker's .db file and JSON-decodes every sample key on every
+# request. MultiProcessExposition instead:
+#
+#   * keeps, per .db file, the decoded keys and the byte offset of each value.
+#     A file is re-walked only from where it was last parsed when it has
+#     grown (new label sets), and from the start when it was replaced (new
+#     inode) or shrank. Otherwise only the 16-byte value slots at the known
+#     offsets are re-read, so no JSON parsing happens on the steady-state
+#     path. (mtime alone can't be trusted here: values are written through
+#     mmap, and the kernel may update mtime only at writeback.)
+#   * caches the rendered exposition per output variant (text / OpenMetrics,
+#     plain / gzip) for `ttl` seconds, so several scrapers hitting /metrics
+#     inside the same window share one merge.
+#
+# Merging and accumulation reuse prometheus_client's own MultiProcessCollector
+# logic, so the output is identical to the uncached version.
+import gzip
+import json
+import os
+import struct
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.metrics_core import Metric
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.openmetrics.exposition import (
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+    generate_latest as generate_openmetrics,
+)
+
+from common.multiproc import directory_lock
+
+# On-disk layout of prometheus_client.mmap_dict:
+#   [u32 used][4 pad]{[u32 key_len][key, padded to 8][f64 value][f64 timestamp]}...
+_INT = struct.Struct("i")
+_TWO_DOUBLES = struct.Struct("dd")
+_FIRST_ENTRY = 8
+
+
+class _FileCache:
+    """Decoded keys + value offsets for one .db file."""
+
+    def __init__(self, path):
+        parts = os.path.basename(path).split("_")
+        self.typ = parts[0]
+        # gauge_<mode>_<pid>.db carries the aggregation mode and pid
+        self.gauge_mode = parts[1] if self.typ == "gauge" else None
+        self.gauge_pid = parts[2][:-3] if self.typ == "gauge" else None
+        self.identity = None
+        self.parsed_to = _FIRST_ENTRY
+        self.entries = []  # (metric_name, sample_name, labels_key, help_text, value_pos)
+
+    def refresh(self, path, key_cache):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        used = _INT.unpack_from(data, 0)[0] if len(data) >= 4 else 0
+
+        identity = (stat.st_ino, stat.st_dev)
+        if identity != self.identity or used < self.parsed_to:
+            # New or rewritten file: start over
+            self.identity = identity
+            self.parsed_to = _FIRST_ENTRY
+            self.entries = []
+
+        pos = self.parsed_to
+        while pos < used:
+            key_len = _INT.unpack_from(data, pos)[0]
+            if pos + key_len > used:
+                break  # writer is mid-append; pick it up next time
+            pos += 4
+            key = data[pos:pos + key_len].decode("utf-8")
+            pos += key_len + (8 - (key_len + 4) % 8)
+            parsed = key_cache.get(key)
+            if parsed is None:
+                metric_name, name, labels, help_text = json.loads(key)
+                parsed = key_cache[key] = (
+                    metric_name, name, tuple(sorted(labels.items())), help_text
+                )
+            self.entries.append(parsed + (pos,))
+            pos += _TWO_DOUBLES.size
+        self.parsed_to = pos
+        return data
+
+
+class MultiProcessExposition:
+    """Renders PROMETHEUS_MULTIPROC_DIR metrics with per-file and TTL caching."""
+
+    def __init__(self, path=None, ttl=1.0):
+        self.path = path or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        if not self.path:
+            raise ValueError("MultiProcessExposition needs a path or PROMETHEUS_MULTIPROC_DIR")
+        self.ttl = ttl
+        self._files = {}
+        self._key_cache = {}
+        self._metrics = None
+        self._rendered = {}
+        self._rendered_at = 0.0
+        self._lock = threading.Lock()
+
+    def _collect(self):
+        # Shared lock: dead-worker compaction can't swap files mid-read
+        with directory_lock(self.path, shared=True):
+            return self._collect_locked()
+
+    def _collect_locked(self):
+        names = [n for n in os.listdir(self.path) if n.endswith(".db")]
+        for gone in set(self._files) - set(names):
+            del self._files[gone]
+
+        metrics = {}
+        for name in sorted(names):
+            path = os.path.join(self.path, name)
+            cache = self._files.get(name)
+            if cache is None:
+                cache = self._files[name] = _FileCache(path)
+            try:
+                data = cache.refresh(path, self._key_cache)
+            except FileNotFoundError:
+                del self._files[name]
+                continue
+            for metric_name, sample_name, labels_key, help_text, value_pos in cache.entries:
+                value, timestamp = _TWO_DOUBLES.unpack_from(data, value_pos)
+                metric = metrics.get(metric_name)
+                if metric is None:
+                    metric = metrics[metric_name] = Metric(metric_name, help_text, cache.typ)
+                if cache.typ == "gauge":
+                    metric._multiprocess_mode = cache.gauge_mode
+                    metric.add_sample(
+                        sample_name, labels_key + (("pid", cache.gauge_pid),), value, timestamp
+                    )
+                else:
+                    # Duplicates and labels are fixed up by _accumulate_metrics
+                    metric.add_sample(sample_name, labels_key, value)
+        return MultiProcessCollector._accumulate_metrics(metrics, True)
+
+    def collect(self):
+        # Shared by every output variant rendered inside the same TTL window
+        if self._metrics is None:
+            self._metrics = self._collect()
+        return self._metrics
+
+    def render(self, openmetrics=False, use_gzip=False):
+        """(body, content_type, content_encoding) for the requested variant."""
+        variant = (openmetrics, use_gzip)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rendered_at > self.ttl:
+                self._metrics = None
+                self._rendered = {}
+                self._rendered_at = now
+            if variant not in self._rendered:
+                generate = generate_openmetrics if openmetrics else generate_latest
+                body = generate(self)
+                if use_gzip:
+                    body = gzip.compress(body, compresslevel=5)
+                self._rendered[variant] = body
+            body = self._rendered[variant]
+        content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else CONTENT_TYPE_LATEST
+        return body, content_type, "gzip" if use_gzip else None
+
+    def flask_response(self, request):
+        """Negotiate format/compression from a Flask request and build the Response."""
+        from flask import Response
+
+        openmetrics = "application/openmetrics-text" in request.headers.get("Accept", "")
+        use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+        body, content_type, encoding = self.render(openmetrics, use_gzip)
+        response = Response(body, content_type=content_type)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,294 @@
+# common/fanout.py
+#
+# Span export to several backends at once (e.g. Tempo plus a SaaS tenant
+# during a migration), selected with a comma-separated OTEL_BACKEND.
+#
+# Two BatchSpanProcessors would each run their exporter on the batch
+# worker: every span is encoded once per backend, and while one backend is
+# slow its processor's queue fills and drops spans, even if the other
+# backend is healthy. FanOutSpanExporter instead sits behind the one
+# batch processor and, per batch:
+#
+#   - encodes the spans to an OTLP ExportTraceServiceRequest once, and
+#     compresses that once per distinct compression, shared by all OTLP
+#     backends (non-OTLP backends such as Jaeger get the span batch)
+#   - puts the payload on each backend's own bounded queue and returns, so
+#     the batch worker never waits on the network
+#
+# Each backend has a worker thread that sends from its queue with its own
+# timeout and no retries; a failed batch is counted and dropped. When a
+# queue is full the backend's drop policy applies:
+#
+#   drop_oldest   evict the oldest queued batch (keep the most recent data)
+#   drop_newest   reject the new batch (keep what is queued)
+#
+# Configured by common.telemetry, per backend name from BACKEND_PRESETS:
+#   OTEL_BACKEND                        "tempo,dynatrace"
+#   OTEL_FANOUT_<NAME>_ENDPOINT         override the preset's endpoint
+#   OTEL_FANOUT_<NAME>_HEADERS          "key=value,key2=value2"
+#   OTEL_FANOUT_<NAME>_PROTOCOL         http/protobuf | grpc; with grpc and no ENDPOINT, the
+#                                       preset's :4318/v1/traces becomes :4317, any
+#                                       other preset endpoint is an error
+#   OTEL_FANOUT_<NAME>_COMPRESSION      none | gzip | deflate | zstd (zstd: HTTP only)
+#   OTEL_FANOUT_<NAME>_TIMEOUT          seconds per send (default 10)
+#   OTEL_FANOUT_<NAME>_QUEUE_SIZE       batches queued per backend (default 64)
+#   OTEL_FANOUT_<NAME>_DROP_POLICY      drop_oldest | drop_newest (default drop_oldest)
+#
+# observe(meter) reports, with a "backend" attribute:
+#   otel_fanout_queue_size               batches waiting
+#   otel_fanout_sent_total               spans delivered
+#   otel_fanout_dropped_total            spans dropped at a full queue
+#   otel_fanout_failed_total             spans in batches whose send failed
+#   otel_fanout_send_duration_seconds    histogram of send duration
+import collections
+import logging
+import threading
+import time
+
+from opentelemetry.context import _SUPPRESS_INSTRUMENTATION_KEY, attach, set_value
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+_log = logging.getLogger(__name__)
+
+DROP_POLICIES = ("drop_oldest", "drop_newest")
+_TRACE_EXPORT_METHOD = "/opentelemetry.proto.collector.trace.v1.TraceService/Export"
+
+
+class _Backend:
+    """Bounded queue of batches plus the worker thread that sends them."""
+
+    # True: items are encoded OTLP payloads; False: lists of spans
+    encoded = True
+    compression = "none"
+
+    def __init__(self, name, timeout=10.0, max_queue_size=64, drop_policy="drop_oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy for {name}: {drop_policy}")
+        self.name = name
+        self.timeout = timeout
+        self.max_queue_size = max_queue_size
+        self.drop_policy = drop_policy
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._stopped = False
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._durations = None
+        self._worker = threading.Thread(target=self._run, name=f"FanOut-{name}", daemon=True)
+        self._worker.start()
+
+    def put(self, item, spans):
+        with self._condition:
+            if self._stopped:
+                return
+            if len(self._queue) >= self.max_queue_size:
+                if self.drop_policy == "drop_newest":
+                    self.dropped += spans
+                    return
+                self.dropped += self._queue.popleft()[1]
+            self._queue.append((item, spans))
+            self._condition.notify()
+
+    def _send(self, item):
+        raise NotImplementedError
+
+    def _run(self):
+        # Our own HTTP/gRPC calls must not be traced
+        attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._busy = False
+                    self._condition.notify_all()
+                    self._condition.wait()
+                if not self._queue:
+                    self._busy = False
+                    self._condition.notify_all()
+                    return
+                item, spans = self._queue.popleft()
+                self._busy = True
+            start = time.perf_counter()
+            try:
+                ok = self._send(item)
+            except Exception:  # a backend bug must not kill the worker
+                _log.exception("fan-out send to %s failed", self.name)
+                ok = False
+            if self._durations is not None:
+                self._durations.record(time.perf_counter() - start, {"backend": self.name})
+            if ok:
+                self.sent += spans
+            else:
+                self.failed += spans
+
+    def queued(self):
+        return len(self._queue)
+
+    def wait_idle(self, deadline):
+        with self._condition:
+            while self._queue or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, deadline):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._worker.join(max(deadline - time.monotonic(), 0))
+        self._close()
+
+    def _close(self):
+        pass
+
+
+class OTLPHttpBackend(_Backend):
+    """POSTs the shared payload to an OTLP/HTTP traces endpoint."""
+
+    def __init__(self, name, endpoint, headers=None, compression="none", **kwargs):
+        import requests
+
+        from common.spill import _compressor
+
+        _compressor(compression)  # validates the name
+        self.endpoint = endpoint
+        self.compression = compression
+        self._requests = requests
+        self._session = requests.Session()
+        self._session.headers.update(headers or {})
+        self._session.headers["Content-Type"] = "application/x-protobuf"
+        if compression != "none":
+            self._session.headers["Content-Encoding"] = compression
+        _Backend.__init__(self, name, **kwargs)
+
+    def _send(self, payload):
+        try:
+            response = self._session.post(self.endpoint, data=payload, timeout=self.timeout)
+        except self._requests.RequestException as exc:
+            _log.warning("fan-out backend %s unavailable: %s", self.name, exc)
+            return False
+        if not response.ok:
+            _log.warning("fan-out backend %s rejected batch: %s", self.name, response.status_code)
+        return response.ok
+
+    def _close(self):
+        self._session.close()
+
+
+class OTLPGrpcBackend(_Backend):
+    """Calls TraceService/Export with the shared payload as the raw request bytes."""
+
+    def __init__(self, name, endpoint, headers=None, compression="none", **kwargs):
+        import grpc
+
+        if compression not in ("none", "gzip", "deflate"):
+            raise ValueError(f"{compression} compression is not supported over gRPC")
+        target = endpoint.split("://", 1)[-1].rstrip("/")
+        if endpoint.startswith("http://"):
+            self._channel = grpc.insecure_channel(target)
+        else:
+            self._channel = grpc.secure_channel(target, grpc.ssl_channel_credentials())
+        self._grpc = grpc
+        # No serializers: the payload goes on the wire as encoded
+        self._export = self._channel.unary_unary(_TRACE_EXPORT_METHOD)
+        self._metadata = tuple((key.lower(), value) for key, value in (headers or {}).items())
+        # gRPC compresses per message on its own; the payload stays uncompressed
+        self._call_compression = {
+            "none": grpc.Compression.NoCompression,
+            "gzip": grpc.Compression.Gzip,
+            "deflate": grpc.Compression.Deflate,
+        }[compression]
+        _Backend.__init__(self, name, **kwargs)
+
+    def _send(self, payload):
+        try:
+            self._export(
+                payload,
+                timeout=self.timeout,
+                metadata=self._metadata or None,
+                compression=self._call_compression,
+            )
+        except self._grpc.RpcError as exc:
+            _log.warning("fan-out backend %s failed: %s", self.name, exc.code())
+            return False
+        return True
+
+    def _close(self):
+        self._channel.close()
+
+
+class ExporterBackend(_Backend):
+    """Any SpanExporter (Jaeger thrift, console) on its own queue and thread."""
+
+    encoded = False
+
+    def __init__(self, name, exporter, **kwargs):
+        self.exporter = exporter
+        _Backend.__init__(self, name, **kwargs)
+
+    def _send(self, spans):
+        return self.exporter.export(spans) is SpanExportResult.SUCCESS
+
+    def _close(self):
+        self.exporter.shutdown()
+
+
+class FanOutSpanExporter(SpanExporter):
+    """Encodes each batch once and queues it for every backend."""
+
+    def __init__(self, backends):
+        from common.spill import _compressor
+
+        self.backends = list(backends)
+        self._compressors = {
+            backend.compression: _compressor(backend.compression)
+            for backend in self.backends
+            if backend.encoded
+        }
+
+    def export(self, spans):
+        spans = list(spans)
+        payloads = {}
+        if self._compressors:
+            raw = encode_spans(spans).SerializeToString()
+            payloads = {name: compress(raw) for name, compress in self._compressors.items()}
+        for backend in self.backends:
+            backend.put(payloads[backend.compression] if backend.encoded else spans, len(spans))
+        # Delivery is per backend and asynchronous; drops and failures are counted there
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=30000):
+        deadline = time.monotonic() + timeout_millis / 1000
+        return all([backend.wait_idle(deadline) for backend in self.backends])
+
+    def shutdown(self, timeout_millis=30000):
+        deadline = time.monotonic() + timeout_millis / 1000
+        for backend in self.backends:
+            backend.shutdown(deadline)
+
+    def observe(self, meter):
+        """Report per-backend queue, delivery and drops through `meter`."""
+        from opentelemetry.metrics import Observation
+
+        def observe(read):
+            return lambda options: [
+                Observation(read(backend), {"backend": backend.name}) for backend in self.backends
+            ]
+
+        meter.create_observable_gauge(
+            "otel_fanout_queue_size", callbacks=[observe(lambda b: b.queued())], description="Batches waiting"
+        )
+        meter.create_observable_counter("otel_fanout_sent_total", callbacks=[observe(lambda b: b.sent)])
+        meter.create_observable_counter(
+            "otel_fanout_dropped_total", callbacks=[observe(lambda b: b.dropped)], description="Dropped at a full queue"
+        )
+        meter.create_observable_counter("otel_fanout_failed_total", callbacks=[observe(lambda b: b.failed)])
+        durations = meter.create_histogram(
+            "otel_fanout_send_duration_seconds", unit="s", description="Send duration per backend"
+        )
+        for backend in self.backends:
+            backend._durations = durations
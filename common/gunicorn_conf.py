@@ -0,0 +1,65 @@
+# common/gunicorn_conf.py
+#
+# Multi-process serving for the Flask apps:
+#
+#   gunicorn -c common/gunicorn_conf.py app:app
+#
+# * The app (and with it setup_telemetry) is imported in each worker after
+#   the fork, never in the master (preload_app = False). Batch processors,
+#   metric readers and their threads therefore belong to the worker that uses
+#   them.
+# * Each worker gets its own service.instance.id / worker.id resource
+#   attributes, so per-worker series and spans can be told apart.
+# * worker_exit flushes and shuts down telemetry. Workers end with
+#   os._exit(), which skips the SDK's atexit hooks, so without this hook the
+#   spans still queued in a recycled worker would be lost.
+# * With PROMETHEUS_MULTIPROC_DIR set, stale .db files are cleared at start
+#   and each dead worker's files are compacted into the archive files
+#   (common/multiproc.py).
+#
+# Environment variables:
+#   PORT                       listen port (default 5000)
+#   WEB_CONCURRENCY            worker processes (default: one per CPU)
+#   GUNICORN_THREADS           threads per worker (default 4)
+#   PROMETHEUS_MULTIPROC_DIR   prometheus_client multiprocess directory
+import os
+import socket
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+graceful_timeout = 30
+preload_app = False
+
+
+def on_starting(server):
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        from common.multiproc import prepare_directory
+
+        prepare_directory(directory)
+
+
+def post_fork(server, worker):
+    # Runs in the worker before the app is imported, so Resource.create()
+    # in setup_telemetry picks these up
+    attributes = os.getenv("OTEL_RESOURCE_ATTRIBUTES", "")
+    worker_attributes = f"service.instance.id={socket.gethostname()}-{worker.pid},worker.id={worker.age}"
+    os.environ["OTEL_RESOURCE_ATTRIBUTES"] = (
+        f"{attributes},{worker_attributes}" if attributes else worker_attributes
+    )
+
+
+def worker_exit(server, worker):
+    from common.telemetry import shutdown_all
+
+    shutdown_all()
+
+
+def child_exit(server, worker):
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        from common.multiproc import compact_dead_worker
+
+        compact_dead_worker(directory, worker.pid)
@@ -0,0 +1,70 @@
+# common/logsampling.py
+#
+# Filter in front of the OTLP LoggingHandler, so records that would be dropped
+# are never formatted, converted or batched:
+#
+#   * trace-aware: DEBUG/INFO records logged inside a trace that was not
+#     sampled are dropped; records outside any trace are kept. WARNING and
+#     above are always kept and never rate-limited.
+#   * per-logger rate limit: a token bucket per logger name for DEBUG/INFO.
+#     Records over the budget are counted per call site (file and line), and
+#     the next record from that call site that gets through carries the count
+#     as a `repeated` attribute ("message repeated N times").
+#
+# The filter runs before the handler calls record.getMessage(), so apps that
+# log with %-style arguments (logger.info("... %s", value)) only pay for the
+# formatting of records that are exported.
+#
+# Wired up by common.telemetry from these environment variables:
+#   OTEL_LOGS_TRACE_AWARE   "false" to keep records of unsampled traces (default true)
+#   OTEL_LOGS_RATE_LIMIT    DEBUG/INFO records per second per logger (0 = unlimited)
+#   OTEL_LOGS_RATE_BURST    bucket size (default: one second's worth)
+import logging
+import threading
+
+from opentelemetry.trace import get_current_span
+
+from common.sampling import TokenBucket
+
+
+class TraceAwareLogFilter(logging.Filter):
+    """Drops DEBUG/INFO records of unsampled traces and over the rate limit."""
+
+    def __init__(self, trace_aware=True, rate_limit=0, burst=None):
+        super().__init__()
+        self.trace_aware = trace_aware
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._buckets = {}
+        self._suppressed = {}  # (logger name, call site) -> dropped count
+        self._lock = threading.Lock()
+
+    def _bucket(self, name):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(name, TokenBucket(self.rate_limit, self.burst))
+        return bucket
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if self.trace_aware:
+            span_context = get_current_span().get_span_context()
+            if span_context.is_valid and not span_context.trace_flags.sampled:
+                return False
+
+        if not self.rate_limit:
+            return True
+        key = (record.name, record.pathname, record.lineno)  # msg may be unhashable (a dict, ...)
+        if not self._bucket(record.name).take():
+            with self._lock:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        if self._suppressed:
+            with self._lock:
+                repeated = self._suppressed.pop(key, 0)
+            if repeated:
+                record.repeated = repeated
+        return True
@@ -0,0 +1,101 @@
+# common/multiproc.py
+#
+# Housekeeping for prometheus_client's PROMETHEUS_MULTIPROC_DIR.
+#
+# Every worker writes its own <type>_<pid>.db files. When a worker dies its
+# counter/histogram/summary files must stay, or the merged counters would go
+# backwards. Left alone, though, the directory grows with every worker
+# restart. compact_dead_worker() folds a dead worker's files into one
+# <type>_archive.db per type, so the file count stays bounded by the number of
+# live workers:
+#
+#   counter, histogram, summary, gauge_sum   summed into the archive
+#   gauge_max / gauge_min                    the larger / smaller value kept
+#   gauge_mostrecent                         the newer timestamp kept
+#   any other gauge file (all, live*, ...)   deleted: those modes report
+#                                            per live process only, or per
+#                                            pid, which a dead pid no longer has
+#
+# Compaction replaces the archive and deletes the dead file under an
+# exclusive flock on the directory. MultiProcessExposition takes the shared
+# side while it lists and reads files, so a scrape never sees the dead
+# worker's values twice or not at all.
+import contextlib
+import fcntl
+import glob
+import os
+
+from prometheus_client import multiprocess
+from prometheus_client.mmap_dict import MmapedDict
+
+_LOCK_FILE = ".compaction.lock"
+
+def _sum(old, new):
+    return old[0] + new[0], max(old[1], new[1])
+
+
+def _latest(old, new):
+    return new if new[1] >= old[1] else old
+
+
+# File prefix -> how a dead worker's (value, timestamp) merges into the archive
+_COMPACTED_TYPES = {
+    "counter": _sum,
+    "histogram": _sum,
+    "summary": _sum,
+    "gauge_sum": _sum,
+    "gauge_max": lambda old, new: (max(old[0], new[0]), max(old[1], new[1])),
+    "gauge_min": lambda old, new: (min(old[0], new[0]), max(old[1], new[1])),
+    "gauge_mostrecent": _latest,
+}
+
+
+@contextlib.contextmanager
+def directory_lock(directory, shared=True):
+    with open(os.path.join(directory, _LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def prepare_directory(directory):
+    """Create the directory and remove .db files left by a previous run."""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.unlink(path)
+
+
+def _read_values(path):
+    return {key: (value, timestamp) for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path)}
+
+
+def compact_dead_worker(directory, pid):
+    """Merge a dead worker's files into the archive files and delete the rest."""
+    multiprocess.mark_process_dead(pid, directory)
+    with directory_lock(directory, shared=False):
+        for typ, merge in _COMPACTED_TYPES.items():
+            dead_path = os.path.join(directory, f"{typ}_{pid}.db")
+            if not os.path.exists(dead_path):
+                continue
+            archive_path = os.path.join(directory, f"{typ}_archive.db")
+            merged = _read_values(archive_path) if os.path.exists(archive_path) else {}
+            for key, value in _read_values(dead_path).items():
+                merged[key] = merge(merged[key], value) if key in merged else value
+
+            # Write the new archive beside the old one and swap it in atomically
+            tmp_path = os.path.join(directory, f".{typ}_archive.tmp")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            archive = MmapedDict(tmp_path)
+            try:
+                for key, (value, timestamp) in merged.items():
+                    archive.write_value(key, value, timestamp)
+            finally:
+                archive.close()
+            os.replace(tmp_path, archive_path)
+            os.unlink(dead_path)
+        # Gauge modes without an archive (all, liveall, livesum, ...)
+        for path in glob.glob(os.path.join(directory, f"gauge_*_{pid}.db")):
+            os.unlink(path)
@@ -0,0 +1,185 @@
+# common/profiler.py
+#
+# In-process sampling profiler tied to the active spans.
+#
+# A daemon thread wakes `hz` times a second, reads every thread's current
+# frame (sys._current_frames(), so gthread/threaded workers are covered, not
+# only the main thread a signal-based sampler would see) and records the
+# stack of each thread that is inside a span. A SpanProcessor keeps the stack
+# of open spans per thread, so each sample is tagged with the innermost span
+# and trace id and with the Flask route of the thread's server span.
+#
+# Samples are aggregated into folded stacks ("route;outer;...;inner count",
+# the input format of flamegraph.pl / speedscope), and the most recent ones
+# are kept with their trace and span ids, so a slow span from Tempo can be
+# looked up directly:
+#
+#   GET /debug/profile                     folded stacks, all routes
+#   GET /debug/profile?trace_id=<hex>      only samples taken inside that trace
+#   GET /debug/profile?reset=1             return and clear the aggregate
+#
+# Enabled by common.telemetry when OTEL_PROFILER_HZ is set (e.g. 100).
+#   OTEL_PROFILER_HZ          sampling frequency; 0 = off (default)
+#   OTEL_PROFILER_FILE        folded stacks are written here on shutdown;
+#                             "{pid}" is replaced by the process id
+#   OTEL_PROFILER_ENDPOINT    debug route on the Flask app (default /debug/profile, "" = none)
+#
+# Cost per tick is one sys._current_frames() call plus a walk of the busy
+# threads' stacks, with frame labels cached per code object.
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+from opentelemetry.sdk.trace import SpanProcessor
+
+MAX_DEPTH = 64
+IDLE_ROUTE = "unknown"
+
+_log = logging.getLogger(__name__)
+
+
+class _ActiveSpans(SpanProcessor):
+    """Open spans per thread id, innermost last.
+
+    A span is filed under the thread that started it and removed from that
+    thread's list even when it ends on another one (a span handed to a
+    worker thread or an asyncio callback).
+    """
+
+    def __init__(self):
+        self.by_thread = {}
+        self._started_on = {}  # span id -> thread id
+
+    def on_start(self, span, parent_context=None):
+        thread_id = threading.get_ident()
+        self._started_on[span.context.span_id] = thread_id
+        self.by_thread.setdefault(thread_id, []).append(span)
+
+    def on_end(self, span):
+        thread_id = self._started_on.pop(span.context.span_id, None)
+        spans = self.by_thread.get(thread_id)
+        if not spans:
+            return
+        if spans[-1] is span:
+            spans.pop()
+        elif span in spans:
+            spans.remove(span)
+        if not spans:
+            self.by_thread.pop(thread_id, None)
+
+
+class SpanProfiler:
+    """Thread-based stack sampler; samples are tagged with the active span."""
+
+    def __init__(self, hz=100, recent_samples=10000):
+        self.interval = 1.0 / hz
+        self.active_spans = _ActiveSpans()
+        self._lock = threading.Lock()
+        self._folded = collections.Counter()  # (route, stack) -> samples
+        self._recent = collections.deque(maxlen=recent_samples)  # (trace_id, span_id, route, stack)
+        self._labels = {}  # code object -> frame label
+        self._stopped = threading.Event()
+        self._thread = None
+        self.samples = 0
+
+    # --------------------------
+    # Sampling
+    # --------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stopped.is_set():
+            try:
+                self._sample()
+            except Exception:  # keep sampling; one bad tick must not stop the profiler
+                _log.exception("Profiler sample failed")
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Fell behind (e.g. GIL contention): skip ticks instead of bursting
+                deadline = time.monotonic()
+                delay = 0
+            self._stopped.wait(delay)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None and len(labels) < MAX_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def _sample(self):
+        frames = sys._current_frames()
+        by_thread = self.active_spans.by_thread
+        taken = []
+        for thread_id, spans in list(by_thread.items()):
+            spans = list(spans)  # on_end pops from the live list on its own thread
+            frame = frames.get(thread_id)
+            if frame is None or not spans:
+                continue
+            innermost = spans[-1]
+            route = spans[0].attributes.get("http.route") or spans[0].name or IDLE_ROUTE
+            context = innermost.get_span_context()
+            taken.append((context.trace_id, context.span_id, route, self._stack(frame)))
+        if not taken:
+            return
+        with self._lock:
+            for trace_id, span_id, route, stack in taken:
+                self._folded[(route, stack)] += 1
+                self._recent.append((trace_id, span_id, route, stack))
+            self.samples += len(taken)
+
+    # --------------------------
+    # Output
+    # --------------------------
+    def folded(self, trace_id=None, reset=False):
+        """Folded stacks ("route;frame;...;frame count"), optionally for one trace."""
+        with self._lock:
+            if trace_id is None:
+                counts = collections.Counter(self._folded)
+            else:
+                counts = collections.Counter(
+                    (route, stack) for sample_trace, _, route, stack in self._recent if sample_trace == trace_id
+                )
+            if reset:
+                self._folded.clear()
+                self._recent.clear()
+        return "".join(
+            f"{route};{stack} {count}\n" for (route, stack), count in counts.most_common()
+        )
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write(self.folded())
+
+    def flask_view(self, request):
+        trace_id = request.args.get("trace_id")
+        if trace_id:
+            try:
+                trace_id = int(trace_id, 16)
+            except ValueError:
+                return "trace_id must be hex\n", 400, {"Content-Type": "text/plain; charset=utf-8"}
+        body = self.folded(trace_id=trace_id or None, reset=request.args.get("reset") == "1")
+        return body, 200, {"Content-Type": "text/plain; charset=utf-8"}
@@ -0,0 +1,243 @@
+# common/red.py
+#
+# Request-lifecycle (RED: rate, errors, duration) metrics for the Flask apps.
+#
+# Replaces the hand-written REQUEST_COUNT / IN_PROGRESS / REQUEST_LATENCY calls
+# in each route. The hooks run for every route, including ones that raise
+# (/error used to leave in-progress incremented and never record latency).
+# The route label comes from the Flask URL rule ("/user/<id>", not the raw
+# path), unmatched paths are reported as "unmatched", and requests carry a
+# status_class attribute ("2xx", "4xx", "5xx") so error rate is a simple
+# ratio. Optionally the CPU time of each request (time.thread_time() of the
+# handling thread) is recorded per route as well. With a cardinality_guard
+# (common/cardinality.py), routes beyond the guard's limit are reported as
+# "other".
+#
+# OTelRedMetrics keeps the hot path cheap:
+#   * counts and in-progress gauges are plain integers in per-thread cells,
+#     created once per (thread, route, status class) and merged by the
+#     observable-instrument callbacks at collection time: no lock, no
+#     attribute dict per request
+#   * durations go to a Histogram through attribute dicts built once per
+#     (route, status class) and reused
+#
+# PrometheusRedMetrics does the same for prometheus_client (mimir/flask-app),
+# caching the labelled child of each metric per route and status class. In
+# multiprocess mode the values have to live in the mmap files, so there is
+# no per-thread aggregation there.
+import threading
+import time
+
+from flask import g, request
+
+UNMATCHED = "unmatched"
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else UNMATCHED
+
+
+def _status_class(status):
+    return f"{status // 100}xx"
+
+
+class _FlaskHooks:
+    """Registers before/after/teardown hooks and calls _started/_finished."""
+
+    def __init__(self, app, limiter=None):
+        self._limiter = limiter
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _before(self):
+        route = _route()
+        if self._limiter is not None:
+            route = self._limiter.fold(route)
+        g._red_route = route
+        g._red_cpu_start = time.thread_time()
+        g._red_start = time.perf_counter()
+        self._started(route)
+
+    def _after(self, response):
+        g._red_status = response.status_code
+        return response
+
+    def _teardown(self, exc):
+        start = g.pop("_red_start", None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        cpu = time.thread_time() - g._red_cpu_start
+        status = g.pop("_red_status", 500 if exc is not None else 200)
+        self._finished(g._red_route, _status_class(status), duration, cpu)
+
+    def _started(self, route):
+        raise NotImplementedError
+
+    def _finished(self, route, status_class, duration, cpu):
+        raise NotImplementedError
+
+
+class _Cell:
+    __slots__ = ("count", "in_progress")
+
+    def __init__(self):
+        self.count = 0
+        self.in_progress = 0
+
+
+class OTelRedMetrics(_FlaskHooks):
+    """RED metrics through an OpenTelemetry meter with per-thread aggregation."""
+
+    def __init__(
+        self,
+        app,
+        meter,
+        requests_name="http_requests_total",
+        latency_name="http_request_duration_seconds",
+        inprogress_name="http_requests_in_progress",
+        requests_unit="",
+        latency_unit="s",
+        inprogress_unit="",
+        route_attribute="endpoint",
+        cpu_name=None,
+        cardinality_guard=None,
+    ):
+        from opentelemetry.metrics import Observation
+
+        self._observation = Observation
+        self._route_attribute = route_attribute
+        self._local = threading.local()
+        self._thread_cells = []  # one {(route, status_class): _Cell} per thread
+        self._register_lock = threading.Lock()
+        self._bound_attributes = {}
+
+        meter.create_observable_counter(
+            requests_name, callbacks=[self._observe_requests], unit=requests_unit,
+            description="Requests by route and status class",
+        )
+        meter.create_observable_up_down_counter(
+            inprogress_name, callbacks=[self._observe_in_progress], unit=inprogress_unit,
+            description="Requests in progress by route",
+        )
+        self._latency = meter.create_histogram(
+            latency_name, unit=latency_unit, description="Request duration by route and status class"
+        )
+        self._cpu = (
+            meter.create_histogram(cpu_name, unit="s", description="Request CPU time by route")
+            if cpu_name
+            else None
+        )
+        super().__init__(app, cardinality_guard.limiter(requests_name) if cardinality_guard else None)
+
+    def _cells(self):
+        cells = getattr(self._local, "cells", None)
+        if cells is None:
+            cells = self._local.cells = {}
+            with self._register_lock:
+                self._thread_cells.append(cells)
+        return cells
+
+    def _cell(self, key):
+        cells = self._cells()
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = _Cell()
+        return cell
+
+    def _attributes(self, route, status_class):
+        key = (route, status_class)
+        attributes = self._bound_attributes.get(key)
+        if attributes is None:
+            attributes = {self._route_attribute: route}
+            if status_class is not None:
+                attributes["status_class"] = status_class
+            self._bound_attributes[key] = attributes
+        return attributes
+
+    def _started(self, route):
+        self._cell((route, None)).in_progress += 1
+
+    def _finished(self, route, status_class, duration, cpu):
+        self._cell((route, None)).in_progress -= 1
+        self._cell((route, status_class)).count += 1
+        self._latency.record(duration, self._attributes(route, status_class))
+        if self._cpu is not None:
+            self._cpu.record(cpu, self._attributes(route, None))
+
+    # --------------------------
+    # Collection-time merge
+    # --------------------------
+    def _merged(self, field):
+        totals = {}
+        with self._register_lock:
+            thread_cells = list(self._thread_cells)
+        for cells in thread_cells:
+            for key, cell in list(cells.items()):
+                totals[key] = totals.get(key, 0) + getattr(cell, field)
+        return totals
+
+    def _observe_requests(self, options):
+        return [
+            self._observation(count, self._attributes(*key))
+            for key, count in self._merged("count").items()
+            if key[1] is not None
+        ]
+
+    def _observe_in_progress(self, options):
+        return [
+            self._observation(value, self._attributes(*key))
+            for key, value in self._merged("in_progress").items()
+            if key[1] is None
+        ]
+
+
+class PrometheusRedMetrics(_FlaskHooks):
+    """RED metrics through prometheus_client metrics with cached label children.
+
+    `request_count` and `request_latency` must be labelled
+    ["endpoint", "status_class"], `in_progress` and `request_cpu` ["endpoint"].
+    """
+
+    def __init__(
+        self, app, request_count, request_latency, in_progress, request_cpu=None, cardinality_guard=None
+    ):
+        self._request_count = request_count
+        self._request_latency = request_latency
+        self._in_progress = in_progress
+        self._request_cpu = request_cpu
+        self._children = {}
+        super().__init__(
+            app, cardinality_guard.limiter(request_count._name) if cardinality_guard else None
+        )
+
+    def _bound(self, route, status_class):
+        key = (route, status_class)
+        children = self._children.get(key)
+        if children is None:
+            if status_class is None:
+                children = (
+                    self._in_progress.labels(endpoint=route),
+                    self._request_cpu.labels(endpoint=route) if self._request_cpu else None,
+                )
+            else:
+                children = (
+                    self._request_count.labels(endpoint=route, status_class=status_class),
+                    self._request_latency.labels(endpoint=route, status_class=status_class),
+                )
+            self._children[key] = children
+        return children
+
+    def _started(self, route):
+        self._bound(route, None)[0].inc()
+
+    def _finished(self, route, status_class, duration, cpu):
+        in_progress, request_cpu = self._bound(route, None)
+        in_progress.dec()
+        if request_cpu is not None:
+            request_cpu.observe(cpu)
+        count, latency = self._bound(route, status_class)
+        count.inc()
+        latency.observe(duration)
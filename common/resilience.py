@@ -0,0 +1,669 @@
+# common/resilience.py
+#
+# Deadlines, hedged requests, circuit breaking and bounded concurrency for
+# the service1 -> service2 hop, wrapped around DownstreamClient (threads) and
+# AsyncDownstreamClient (asyncio).
+#
+#   deadline     every call has a budget: the caller's (`with deadline(2.0):`,
+#                or the X-Request-Deadline-Ms header of the incoming request
+#                via install_deadline / deadline_from_headers), else
+#                DOWNSTREAM_DEADLINE. Each attempt's timeout is what is left
+#                of it, and the remainder is sent on as X-Request-Deadline-Ms.
+#                service2 installs the same hooks: a request that arrives
+#                with no budget left is answered 504 at once, and its
+#                simulated work (common/workload.py) stops when the budget
+#                runs out. An exhausted budget raises DeadlineExceeded
+#                without calling.
+#   hedging      once an upstream has DOWNSTREAM_HEDGE_MIN_SAMPLES latencies,
+#                a call still running after their p95 (P² streaming estimate
+#                over the last DOWNSTREAM_HEDGE_WINDOW calls, at least
+#                DOWNSTREAM_HEDGE_MIN_DELAY) gets a second attempt, and the first
+#                good response wins. Hedges are capped at DOWNSTREAM_HEDGE_BUDGET
+#                of all calls, so a slow upstream sees at most that much more load.
+#   breaker      DOWNSTREAM_BREAKER_FAILURES consecutive failed calls (exception,
+#                5xx or no answer within the deadline) open the circuit: calls
+#                fail fast with CircuitOpen for DOWNSTREAM_BREAKER_RESET seconds,
+#                then one probe is let through (half-open); its success closes
+#                the circuit, a failure reopens it. A call that never reaches
+#                the upstream (bulkhead full, budget gone) gives its probe back,
+#                and a probe that does not report within the reset timeout
+#                reopens the circuit for a new probe window.
+#   bulkhead     at most DOWNSTREAM_MAX_CONCURRENCY attempts per upstream
+#                (host:port) in flight. A call waits for a slot until its
+#                deadline (ConcurrencyLimitExceeded), a hedge is only sent
+#                if a slot is free and the deadline has not passed.
+#
+# Every attempt is its own child span ("GET service2:5001 attempt", with
+# downstream.attempt, downstream.hedge and downstream.timeout_ms), so the HTTP
+# client spans of a hedged call sit side by side under the caller's span.
+# Losing attempts of the thread client run to their own timeout in the
+# background; the async client cancels them.
+#
+# Errors raised here subclass ResilienceError and carry the HTTP status a
+# handler should answer with (`exc.status`: 503, or 504 for deadlines).
+#
+# Configuration (environment variables, read by from_env()):
+#   DOWNSTREAM_DEADLINE            seconds per call without a caller deadline (default 2.0)
+#   DOWNSTREAM_HEDGE               "false" to turn hedging off (default true)
+#   DOWNSTREAM_HEDGE_QUANTILE      latency quantile that triggers a hedge (default 0.95)
+#   DOWNSTREAM_HEDGE_MIN_DELAY     shortest hedge delay in seconds (default 0.05)
+#   DOWNSTREAM_HEDGE_MIN_SAMPLES   latencies needed before hedging (default 20)
+#   DOWNSTREAM_HEDGE_WINDOW        calls per quantile window (default 1000)
+#   DOWNSTREAM_HEDGE_BUDGET        max hedges as a fraction of calls (default 0.1)
+#   DOWNSTREAM_MAX_CONCURRENCY     attempts in flight per upstream (default 32)
+#   DOWNSTREAM_BREAKER_FAILURES    consecutive failures that open the circuit (default 5)
+#   DOWNSTREAM_BREAKER_RESET       seconds before a half-open probe (default 10)
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from common.downstream import _env_float, _env_int
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class ResilienceError(Exception):
+    status = 503
+
+
+class DeadlineExceeded(ResilienceError):
+    status = 504
+
+
+class CircuitOpen(ResilienceError):
+    pass
+
+
+class ConcurrencyLimitExceeded(ResilienceError):
+    pass
+
+
+# --------------------------
+# Deadlines
+# --------------------------
+_deadline = contextvars.ContextVar("downstream_deadline", default=None)
+
+
+def remaining():
+    """Seconds left of the current deadline, or None without one."""
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound downstream calls in this block to `seconds` (None: no change; nested: the earlier wins)."""
+    if seconds is None:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_from_headers(headers, default=None):
+    """Budget in seconds from an incoming X-Request-Deadline-Ms header."""
+    value = headers.get(DEADLINE_HEADER)
+    try:
+        return max(float(value), 0.0) / 1000 if value else default
+    except ValueError:
+        return default
+
+
+def install_deadline(app, default=None):
+    """Flask hooks: each request works within the budget its caller sent.
+
+    A request whose budget is already spent is answered 504 without
+    running the handler, and a ResilienceError escaping a handler becomes
+    its status (503/504) instead of a 500.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _enter_deadline():
+        seconds = deadline_from_headers(request.headers, default)
+        if seconds is None:
+            return None
+        if seconds <= 0:
+            return "Deadline exceeded before the request was handled", DeadlineExceeded.status
+        g._deadline_token = _deadline.set(time.monotonic() + seconds)
+        return None
+
+    @app.teardown_request
+    def _exit_deadline(exc):
+        token = g.pop("_deadline_token", None)
+        if token is not None:
+            _deadline.reset(token)
+
+    @app.errorhandler(ResilienceError)
+    def _resilience_error(exc):
+        return str(exc), exc.status
+
+
+# --------------------------
+# Streaming quantile (P², Jain & Chlamtac 1985)
+# --------------------------
+class P2Quantile:
+    """Estimates one quantile in O(1) memory from five markers."""
+
+    def __init__(self, q):
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        h, n = self._heights, self._positions
+        if self.count <= 5:
+            h.append(x)
+            h.sort()
+            return
+        if x < h[0]:
+            h[0], k = x, 0
+        elif x >= h[4]:
+            h[4], k = x, 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        h, n = self._heights, self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if not self._heights:
+            return None
+        if self.count < 5:
+            return self._heights[min(int(self.q * self.count), self.count - 1)]
+        return self._heights[2]
+
+
+# --------------------------
+# Circuit breaker
+# --------------------------
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open probing."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Admit a call; every admitted call must end in record() or release()."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self.state, self._probes, self._half_opened_at = HALF_OPEN, 0, now
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    if now - self._half_opened_at >= self.reset_timeout:
+                        # The probes never reported back: start a new window later
+                        self.state, self._opened_at = OPEN, now
+                    return False
+                self._probes += 1
+            return True
+
+    def release(self):
+        """Give back the probe of an admitted call that never reached the upstream."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state, self.failures = CLOSED, 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self._opened_at = OPEN, time.monotonic()
+
+
+# --------------------------
+# Per-upstream state
+# --------------------------
+class _Upstream:
+    def __init__(self, name, policy, semaphore):
+        self.name = name
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        self.semaphore = semaphore
+        self._quantile = policy.hedge_quantile
+        self._window = policy.hedge_window
+        self._min_samples = policy.hedge_min_samples
+        self._current = P2Quantile(self._quantile)
+        self._previous = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._current.add(seconds)
+            if self._current.count >= self._window:
+                self._previous, self._current = self._current, P2Quantile(self._quantile)
+
+    def latency_quantile(self):
+        with self._lock:
+            if self._current.count >= self._min_samples:
+                return self._current.value()
+            return self._previous.value() if self._previous is not None else None
+
+
+class _Policy:
+    """Settings and bookkeeping shared by the thread and asyncio clients."""
+
+    def __init__(
+        self,
+        deadline=2.0,
+        hedge=True,
+        hedge_quantile=0.95,
+        hedge_min_delay=0.05,
+        hedge_min_samples=20,
+        hedge_window=1000,
+        hedge_budget=0.1,
+        max_concurrency=32,
+        failure_threshold=5,
+        reset_timeout=10.0,
+        meter=None,
+    ):
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_window = hedge_window
+        self.hedge_budget = hedge_budget
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._upstreams = {}
+        self._lock = threading.Lock()
+        self._attempts = None
+        self._tracer = None
+        if meter is not None:
+            self.observe(meter)
+
+    @classmethod
+    def _env_settings(cls):
+        return {
+            "deadline": _env_float("DOWNSTREAM_DEADLINE", 2.0),
+            "hedge": os.getenv("DOWNSTREAM_HEDGE", "true").lower() == "true",
+            "hedge_quantile": _env_float("DOWNSTREAM_HEDGE_QUANTILE", 0.95),
+            "hedge_min_delay": _env_float("DOWNSTREAM_HEDGE_MIN_DELAY", 0.05),
+            "hedge_min_samples": _env_int("DOWNSTREAM_HEDGE_MIN_SAMPLES", 20),
+            "hedge_window": _env_int("DOWNSTREAM_HEDGE_WINDOW", 1000),
+            "hedge_budget": _env_float("DOWNSTREAM_HEDGE_BUDGET", 0.1),
+            "max_concurrency": _env_int("DOWNSTREAM_MAX_CONCURRENCY", 32),
+            "failure_threshold": _env_int("DOWNSTREAM_BREAKER_FAILURES", 5),
+            "reset_timeout": _env_float("DOWNSTREAM_BREAKER_RESET", 10.0),
+        }
+
+    def _semaphore(self):
+        return threading.BoundedSemaphore(self.max_concurrency)
+
+    def _upstream(self, url):
+        name = urlsplit(url).netloc
+        upstream = self._upstreams.get(name)
+        if upstream is None:
+            with self._lock:
+                upstream = self._upstreams.setdefault(name, _Upstream(name, self, self._semaphore()))
+        return upstream
+
+    def _start(self, url):
+        """Upstream state and absolute deadline for a new call, or raise."""
+        upstream = self._upstream(url)
+        budget = remaining()
+        if budget is None:
+            budget = self.deadline
+        if budget <= 0:
+            self._count(upstream, "deadline_exceeded", False)
+            raise DeadlineExceeded(f"no time left to call {upstream.name}")
+        if not upstream.breaker.allow():
+            self._count(upstream, "circuit_open", False)
+            raise CircuitOpen(f"circuit to {upstream.name} is open")
+        with upstream._lock:
+            upstream.calls += 1
+        return upstream, time.monotonic() + budget
+
+    def _hedge_delay(self, upstream):
+        if not self.hedge or upstream.breaker.state != CLOSED:
+            return None
+        latency = upstream.latency_quantile()
+        return None if latency is None else max(latency, self.hedge_min_delay)
+
+    def _take_hedge(self, upstream):
+        with upstream._lock:
+            if upstream.hedges + 1 > self.hedge_budget * upstream.calls:
+                return False
+            upstream.hedges += 1
+            return True
+
+    def _prepare(self, upstream, kwargs, end):
+        """Per-attempt timeout and kwargs with the deadline header, or raise."""
+        timeout = end - time.monotonic()
+        if timeout <= 0:
+            raise DeadlineExceeded(f"deadline passed before calling {upstream.name}")
+        headers = dict(kwargs.get("headers") or {})
+        headers[DEADLINE_HEADER] = str(int(timeout * 1000))
+        return timeout, dict(kwargs, headers=headers)
+
+    def _settle(self, upstream, outcome):
+        """End a call admitted by _start: True/False to the breaker, None gives the probe back."""
+        if outcome is None:
+            upstream.breaker.release()
+        else:
+            upstream.breaker.record(outcome)
+
+    def _finished(self, upstream, hedge, started, response=None, error=None):
+        ok = error is None and response.status_code < 500
+        if error is None:
+            upstream.observe(time.monotonic() - started)
+        self._count(upstream, "ok" if ok else "error", hedge)
+        return ok
+
+    # --------------------------
+    # Telemetry
+    # --------------------------
+    def _span(self, upstream, number, hedge, timeout):
+        if self._tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError:  # SA runs without the OTel API
+                self._tracer = False
+            else:
+                self._tracer = trace.get_tracer("common.resilience")
+        if not self._tracer:
+            return contextlib.nullcontext()
+        return self._tracer.start_as_current_span(
+            f"GET {upstream.name} attempt",
+            attributes={
+                "downstream.attempt": number,
+                "downstream.hedge": hedge,
+                "downstream.timeout_ms": round(timeout * 1000, 1),
+            },
+        )
+
+    def _count(self, upstream, outcome, hedge):
+        if self._attempts is not None:
+            self._attempts.add(1, {"upstream": upstream.name, "outcome": outcome, "hedge": hedge})
+
+    def observe(self, meter):
+        """Report attempts, circuit state and hedge delay per upstream through `meter`."""
+        from opentelemetry.metrics import Observation
+
+        states = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+        self._attempts = meter.create_counter(
+            "downstream_attempts_total", description="Downstream attempts by outcome (ok, error, circuit_open, ...)"
+        )
+        meter.create_observable_gauge(
+            "downstream_circuit_state",
+            callbacks=[
+                lambda options: [
+                    Observation(states[u.breaker.state], {"upstream": u.name}) for u in list(self._upstreams.values())
+                ]
+            ],
+            description="0 closed, 1 half-open, 2 open",
+        )
+        meter.create_observable_gauge(
+            "downstream_hedge_delay_seconds",
+            callbacks=[
+                lambda options: [
+                    Observation(delay, {"upstream": u.name})
+                    for u in list(self._upstreams.values())
+                    for delay in [self._hedge_delay(u)]
+                    if delay is not None
+                ]
+            ],
+            unit="s",
+        )
+
+
+class ResilientClient(_Policy):
+    """DownstreamClient.get() with deadline, hedging, circuit breaker and bulkhead."""
+
+    def __init__(self, client, **kwargs):
+        _Policy.__init__(self, **kwargs)
+        self.client = client
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, client, meter=None):
+        return cls(client, meter=meter, **cls._env_settings())
+
+    @property
+    def timeout(self):
+        return self.client.timeout
+
+    @property
+    def executor(self):
+        # Attempts run here so the caller can wait for the first of two;
+        # a second attempt per slot leaves room for hedges
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency * 2, thread_name_prefix="downstream-attempt"
+                    )
+        return self._executor
+
+    def get(self, url, **kwargs):
+        upstream, end = self._start(url)
+        kwargs.pop("timeout", None)
+        outcome = None  # stays None if no attempt reached the upstream
+        try:
+            if not upstream.semaphore.acquire(timeout=max(end - time.monotonic(), 0)):
+                self._count(upstream, "concurrency_limited", False)
+                raise ConcurrencyLimitExceeded(f"{self.max_concurrency} calls to {upstream.name} in flight")
+            attempts = [self._submit(upstream, url, kwargs, end, 1, False)]
+            hedge_delay = self._hedge_delay(upstream)
+            response = error = None
+            while attempts:
+                left = end - time.monotonic()
+                wait_for = left if hedge_delay is None else min(hedge_delay, left)
+                done, pending = wait(attempts, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        response, ok = future.result()
+                    except DeadlineExceeded as exc:  # budget gone before the attempt was sent
+                        error = exc
+                        continue
+                    except Exception as exc:
+                        error, outcome = exc, False
+                        continue
+                    if ok:
+                        outcome = True
+                        return response
+                    outcome = False
+                attempts = list(pending)
+                if not done and time.monotonic() >= end:
+                    break
+                if hedge_delay is not None and not done:
+                    hedge_delay = None  # at most one hedge per call
+                    if upstream.semaphore.acquire(blocking=False):
+                        if self._take_hedge(upstream):
+                            attempts.append(self._submit(upstream, url, kwargs, end, 2, True))
+                        else:
+                            upstream.semaphore.release()
+            if attempts:
+                outcome = False
+                raise DeadlineExceeded(f"{upstream.name} did not answer within the deadline")
+            if response is not None:
+                return response  # the 5xx of the last attempt
+            raise error
+        finally:
+            self._settle(upstream, outcome)
+
+    def _submit(self, upstream, url, kwargs, end, number, hedge):
+        # The caller's context carries the active span and the deadline
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self._attempt, upstream, url, kwargs, end, number, hedge)
+
+    def _attempt(self, upstream, url, kwargs, end, number, hedge):
+        try:
+            timeout, kwargs = self._prepare(upstream, kwargs, end)
+            connect = self.client.timeout[0] if isinstance(self.client.timeout, tuple) else timeout
+            with self._span(upstream, number, hedge, timeout) as span:
+                started = time.monotonic()
+                try:
+                    response = self.client.get(url, timeout=(min(connect, timeout), timeout), **kwargs)
+                except Exception as exc:
+                    self._finished(upstream, hedge, started, error=exc)
+                    raise
+                ok = self._finished(upstream, hedge, started, response=response)
+                if span is not None:
+                    span.set_attribute("http.status_code", response.status_code)
+                return response, ok
+        finally:
+            upstream.semaphore.release()
+
+    def fan_out(self, urls, return_exceptions=False, **kwargs):
+        return self.client.fan_out(urls, return_exceptions=return_exceptions, get=self.get, **kwargs)
+
+    async def afan_out(self, urls, return_exceptions=False, **kwargs):
+        return await self.client.afan_out(urls, return_exceptions=return_exceptions, get=self.get, **kwargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.client.close()
+
+
+class AsyncResilientClient(_Policy):
+    """AsyncDownstreamClient.get() with deadline, hedging, circuit breaker and bulkhead."""
+
+    def __init__(self, client, **kwargs):
+        _Policy.__init__(self, **kwargs)
+        self.client = client
+
+    @classmethod
+    def from_env(cls, client, meter=None):
+        return cls(client, meter=meter, **cls._env_settings())
+
+    def _semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def get(self, url, **kwargs):
+        upstream, end = self._start(url)
+        kwargs.pop("timeout", None)
+        outcome = None  # stays None if no attempt reached the upstream (or we were cancelled)
+        attempts = set()
+        try:
+            try:
+                await asyncio.wait_for(upstream.semaphore.acquire(), max(end - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self._count(upstream, "concurrency_limited", False)
+                raise ConcurrencyLimitExceeded(f"{self.max_concurrency} calls to {upstream.name} in flight") from None
+            attempts.add(self._launch(upstream, url, kwargs, end, 1, False))
+            hedge_delay = self._hedge_delay(upstream)
+            response = error = None
+            while attempts:
+                left = end - time.monotonic()
+                wait_for = left if hedge_delay is None else min(hedge_delay, left)
+                done, attempts = await asyncio.wait(
+                    attempts, timeout=max(wait_for, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    try:
+                        response, ok = task.result()
+                    except DeadlineExceeded as exc:  # budget gone before the attempt was sent
+                        error = exc
+                        continue
+                    except Exception as exc:
+                        error, outcome = exc, False
+                        continue
+                    if ok:
+                        outcome = True
+                        return response
+                    outcome = False
+                if not done and time.monotonic() >= end:
+                    break
+                if hedge_delay is not None and not done:
+                    hedge_delay = None
+                    if not upstream.semaphore.locked() and self._take_hedge(upstream):
+                        await upstream.semaphore.acquire()
+                        attempts.add(self._launch(upstream, url, kwargs, end, 2, True))
+            if attempts:
+                outcome = False
+                raise DeadlineExceeded(f"{upstream.name} did not answer within the deadline")
+            if response is not None:
+                return response
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            self._settle(upstream, outcome)
+
+    def _launch(self, upstream, url, kwargs, end, number, hedge):
+        # Tasks copy the context: the active span and the deadline. The slot
+        # is freed when the task ends, even if it is cancelled before it starts.
+        task = asyncio.ensure_future(self._attempt(upstream, url, kwargs, end, number, hedge))
+        task.add_done_callback(lambda _: upstream.semaphore.release())
+        return task
+
+    async def _attempt(self, upstream, url, kwargs, end, number, hedge):
+        timeout, kwargs = self._prepare(upstream, kwargs, end)
+        with self._span(upstream, number, hedge, timeout) as span:
+            started = time.monotonic()
+            try:
+                response = await self.client.get(url, timeout=timeout, **kwargs)
+            except asyncio.CancelledError:
+                if span is not None:
+                    span.set_attribute("downstream.cancelled", True)
+                raise
+            except Exception as exc:
+                self._finished(upstream, hedge, started, error=exc)
+                raise
+            ok = self._finished(upstream, hedge, started, response=response)
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+            return response, ok
+
+    async def fan_out(self, urls, return_exceptions=False, **kwargs):
+        return await asyncio.gather(
+            *(self.get(url, **kwargs) for url in urls), return_exceptions=return_exceptions
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
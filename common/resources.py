@@ -0,0 +1,190 @@
+# common/resources.py
+#
+# Process resource metrics read from /proc, replacing the random CPU/memory
+# values the mimir apps used to report.
+#
+# ProcessSampler reads /proc/self/stat (CPU time, threads, RSS) and
+# /proc/self/fd once and caches the result for `ttl` seconds, so every gauge
+# callback of one collection shares a single read. CPU % is the CPU time used
+# since the previous snapshot over the wall time between them. GC
+# collections come from gc.get_stats(); GC pause time is summed by a
+# gc.callbacks hook installed once per process.
+#
+#   observe_process(meter)            OTel observable instruments (flask-app-otel/alloy)
+#   PrometheusProcessMetrics()        prometheus_client metrics refreshed by a
+#                                     background thread (mimir/flask-app)
+#
+# Per-request CPU time is recorded by the request hooks in common/red.py.
+import collections
+import gc
+import os
+import threading
+import time
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+ProcessSnapshot = collections.namedtuple(
+    "ProcessSnapshot",
+    "cpu_seconds cpu_percent rss_mb threads open_fds gc_collections gc_pause_seconds",
+)
+
+
+class _GcPauseTimer:
+    def __init__(self):
+        self.total_seconds = 0.0
+        self._started = None
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.total_seconds += time.perf_counter() - self._started
+            self._started = None
+
+
+_gc_timer = None
+_gc_timer_lock = threading.Lock()
+
+
+def _install_gc_timer():
+    global _gc_timer
+    with _gc_timer_lock:
+        if _gc_timer is None:
+            _gc_timer = _GcPauseTimer()
+            gc.callbacks.append(_gc_timer)
+    return _gc_timer
+
+
+def _read_stat():
+    with open("/proc/self/stat") as f:
+        # Split after the command name, which may itself contain spaces
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLK_TCK  # utime + stime
+    return cpu_seconds, int(fields[17]), int(fields[21]) * _PAGE_SIZE  # threads, rss
+
+
+class ProcessSampler:
+    """Cached snapshot of this process's CPU, memory, threads, fds and GC."""
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self._gc_timer = _install_gc_timer()
+        self._lock = threading.Lock()
+        self._last_cpu, _, _ = _read_stat()
+        self._last_time = time.monotonic()
+        self._snapshot = None
+        self._taken = 0.0
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is None or now - self._taken >= self.ttl:
+                self._snapshot = self._read(now)
+                self._taken = now
+            return self._snapshot
+
+    def _read(self, now):
+        cpu_seconds, threads, rss_bytes = _read_stat()
+        elapsed = now - self._last_time
+        cpu_percent = (cpu_seconds - self._last_cpu) / elapsed * 100 if elapsed > 0 else 0.0
+        self._last_cpu, self._last_time = cpu_seconds, now
+        return ProcessSnapshot(
+            cpu_seconds=cpu_seconds,
+            cpu_percent=cpu_percent,
+            rss_mb=rss_bytes / (1024 * 1024),
+            threads=threads,
+            open_fds=len(os.listdir("/proc/self/fd")),
+            gc_collections=tuple(stats["collections"] for stats in gc.get_stats()),
+            gc_pause_seconds=self._gc_timer.total_seconds,
+        )
+
+
+# --------------------------
+# OpenTelemetry
+# --------------------------
+def observe_process(meter, sampler=None, prefix="flask_"):
+    """Register observable instruments that all read one cached snapshot."""
+    from opentelemetry.metrics import Observation
+
+    sampler = sampler or ProcessSampler()
+
+    def observe(field):
+        return lambda options: [Observation(getattr(sampler.snapshot(), field))]
+
+    def gc_collections(options):
+        return [
+            Observation(count, {"generation": str(generation)})
+            for generation, count in enumerate(sampler.snapshot().gc_collections)
+        ]
+
+    meter.create_observable_gauge(
+        f"{prefix}cpu_usage_percent", callbacks=[observe("cpu_percent")], description="Process CPU %"
+    )
+    meter.create_observable_gauge(
+        f"{prefix}memory_usage_mb", callbacks=[observe("rss_mb")], description="Resident set size in MB"
+    )
+    meter.create_observable_gauge(f"{prefix}threads", callbacks=[observe("threads")])
+    meter.create_observable_gauge(f"{prefix}open_fds", callbacks=[observe("open_fds")])
+    meter.create_observable_counter(
+        f"{prefix}cpu_seconds_total", callbacks=[observe("cpu_seconds")], unit="s"
+    )
+    meter.create_observable_counter(f"{prefix}gc_collections_total", callbacks=[gc_collections])
+    meter.create_observable_counter(
+        f"{prefix}gc_pause_seconds_total", callbacks=[observe("gc_pause_seconds")], unit="s"
+    )
+    return sampler
+
+
+# --------------------------
+# prometheus_client
+# --------------------------
+class PrometheusProcessMetrics:
+    """prometheus_client metrics refreshed every `interval` seconds.
+
+    In multiprocess mode a scrape can't run callbacks in the other workers,
+    so each worker writes its own values to its .db files from a daemon
+    thread. Gauges are summed over live workers.
+    """
+
+    def __init__(self, prefix="flask_", interval=5.0, sampler=None):
+        from prometheus_client import Counter, Gauge
+
+        self.sampler = sampler or ProcessSampler(ttl=0)
+        self.interval = interval
+        self.cpu_percent = Gauge(f"{prefix}cpu_usage_percent", "Process CPU %", multiprocess_mode="livesum")
+        self.memory = Gauge(f"{prefix}memory_usage_mb", "Resident set size in MB", multiprocess_mode="livesum")
+        self.threads = Gauge(f"{prefix}threads", "OS threads", multiprocess_mode="livesum")
+        self.open_fds = Gauge(f"{prefix}open_fds", "Open file descriptors", multiprocess_mode="livesum")
+        self.cpu_seconds = Counter(f"{prefix}cpu_seconds", "Process CPU time")
+        self.gc_collections = Counter(f"{prefix}gc_collections", "GC collections", ["generation"])
+        self.gc_pause = Counter(f"{prefix}gc_pause_seconds", "Time spent in GC")
+        self._previous = None
+        self._thread = None
+
+    def update(self):
+        snapshot = self.sampler.snapshot()
+        self.cpu_percent.set(snapshot.cpu_percent)
+        self.memory.set(snapshot.rss_mb)
+        self.threads.set(snapshot.threads)
+        self.open_fds.set(snapshot.open_fds)
+        # Counters only move forward, so add what changed since the last update
+        previous = self._previous
+        self.cpu_seconds.inc(snapshot.cpu_seconds - (previous.cpu_seconds if previous else 0))
+        self.gc_pause.inc(snapshot.gc_pause_seconds - (previous.gc_pause_seconds if previous else 0))
+        for generation, count in enumerate(snapshot.gc_collections):
+            before = previous.gc_collections[generation] if previous else 0
+            self.gc_collections.labels(generation=str(generation)).inc(count - before)
+        self._previous = snapshot
+
+    def start(self):
+        """Start the refresh thread; call after the fork (in the worker)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="process-metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self.update()
+            time.sleep(self.interval)
@@ -0,0 +1,211 @@
+# common/sampling.py
+#
+# Head sampling for the OTel services.
+#
+#   * per-route budgets: a trace-id ratio per Flask route (or span name),
+#     e.g. "/" at 1% and "/call_service2" at 10%
+#   * a token bucket capping the number of sampled traces per second
+#   * errors are kept: dropped root spans are still recorded (not exported),
+#     and UnsampledErrorProcessor exports the ones that end with an error
+#
+# The route sampler only decides for root spans; it is wrapped in ParentBased,
+# so service2 follows the sampled flag it receives from service1 and both
+# services keep or drop the same trace. Root decisions are derived from the
+# trace id (like TraceIdRatioBased), so they are deterministic per trace.
+#
+# Wired up by common.telemetry from these environment variables:
+#   OTEL_SAMPLING_ROUTES                 "/=0.01,/call_service2=0.1,/error=1"
+#   OTEL_TRACES_SAMPLER_ARG              ratio for routes not listed (default 1.0)
+#   OTEL_SAMPLING_MAX_TRACES_PER_SECOND  token-bucket rate per process (0 = unlimited)
+#   OTEL_SAMPLING_KEEP_ERRORS            "false" to drop unsampled error spans
+import collections
+import threading
+import time
+
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.sampling import (
+    Decision,
+    ParentBased,
+    Sampler,
+    SamplingResult,
+)
+from opentelemetry.trace import StatusCode, get_current_span
+
+# Same bound computation as opentelemetry's TraceIdRatioBased
+TRACE_ID_LIMIT = (1 << 64) - 1
+
+
+def parse_route_ratios(spec):
+    """Parse "/=0.01,/call_service2=0.1" into {"/": 0.01, "/call_service2": 0.1}."""
+    ratios = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, ratio = item.rpartition("=")
+        if not route:
+            raise ValueError(f"Invalid OTEL_SAMPLING_ROUTES entry: {item!r}")
+        ratios[route] = float(ratio)
+    return ratios
+
+
+def _ratio_bound(ratio):
+    if not 0.0 <= ratio <= 1.0:
+        raise ValueError(f"Sampling ratio must be within [0, 1], got {ratio}")
+    return round(ratio * (TRACE_ID_LIMIT + 1))
+
+
+def _route_of(name, attributes):
+    """Best route key available before the span starts."""
+    if attributes:
+        route = attributes.get("http.route")
+        if route:
+            return route
+        target = attributes.get("http.target") or attributes.get("url.path")
+        if target:
+            return target.split("?", 1)[0]
+    # FlaskInstrumentor names server spans "GET /path"; manual spans use their name
+    method, _, path = name.partition(" ")
+    return path if path.startswith("/") else name
+
+
+class TokenBucket:
+    """Thread-safe token bucket; take() returns False once the rate is exceeded."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class RouteBudgetSampler(Sampler):
+    """Root sampler with per-route trace-id ratios and a traces/sec cap."""
+
+    def __init__(
+        self,
+        route_ratios=None,
+        default_ratio=1.0,
+        max_traces_per_second=0,
+        keep_errors=True,
+        record_unsampled=False,
+    ):
+        self._bounds = {route: _ratio_bound(r) for route, r in (route_ratios or {}).items()}
+        self._default_bound = _ratio_bound(default_ratio)
+        self._bucket = TokenBucket(max_traces_per_second) if max_traces_per_second else None
+        # RECORD_ONLY keeps the span alive locally so an error can still be
+        # exported, and span-derived metrics still see it
+        self._drop = Decision.RECORD_ONLY if keep_errors or record_unsampled else Decision.DROP
+        self._description = (
+            f"RouteBudgetSampler{{routes={route_ratios or {}}, default={default_ratio}, "
+            f"max_tps={max_traces_per_second}, keep_errors={keep_errors}}}"
+        )
+
+    def should_sample(
+        self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None
+    ):
+        bound = self._bounds.get(_route_of(name, attributes), self._default_bound)
+        sampled = (trace_id & TRACE_ID_LIMIT) < bound
+        if sampled and self._bucket is not None:
+            sampled = self._bucket.take()
+
+        parent_state = get_current_span(parent_context).get_span_context().trace_state
+        if sampled:
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, parent_state)
+        return SamplingResult(self._drop, attributes, parent_state)
+
+    def get_description(self):
+        return self._description
+
+
+class RecordOnlySampler(Sampler):
+    """Records spans for local processors without sampling (exporting) them."""
+
+    def should_sample(
+        self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None
+    ):
+        parent_state = get_current_span(parent_context).get_span_context().trace_state
+        return SamplingResult(Decision.RECORD_ONLY, attributes, parent_state)
+
+    def get_description(self):
+        return "RecordOnlySampler"
+
+
+def route_sampler(
+    route_ratios=None, default_ratio=1.0, max_traces_per_second=0, keep_errors=True, record_unsampled=False
+):
+    """ParentBased(RouteBudgetSampler) so downstream services follow the root's decision.
+
+    With record_unsampled, spans of unsampled traces (root or propagated)
+    are still recorded, so span processors such as SpanMetricsProcessor
+    see every request. keep_errors records them too, so errors in child
+    spans and in services behind an unsampled caller can still be exported.
+    """
+    root = RouteBudgetSampler(
+        route_ratios, default_ratio, max_traces_per_second, keep_errors, record_unsampled
+    )
+    if not (record_unsampled or keep_errors):
+        return ParentBased(root=root)
+    return ParentBased(
+        root=root,
+        remote_parent_not_sampled=RecordOnlySampler(),
+        local_parent_not_sampled=RecordOnlySampler(),
+    )
+
+
+class UnsampledErrorProcessor(SpanProcessor):
+    """Exports recorded-but-unsampled spans that ended with an error status.
+
+    BatchSpanProcessor ignores spans without the sampled flag, so errors in
+    traces that lost the head-sampling draw would otherwise never leave the
+    process. Spans are exported from a background thread; the queue is
+    bounded so an error storm can't grow memory.
+    """
+
+    def __init__(self, exporter, max_queue_size=512, schedule_delay_millis=1000):
+        self._exporter = exporter
+        self._queue = collections.deque(maxlen=max_queue_size)
+        self._delay = schedule_delay_millis / 1000
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._worker = threading.Thread(
+            target=self._run, name="UnsampledErrorProcessor", daemon=True
+        )
+        self._worker.start()
+
+    def on_end(self, span):
+        if span.context.trace_flags.sampled or span.status.status_code is not StatusCode.ERROR:
+            return
+        self._queue.append(span)
+        self._wakeup.set()
+
+    def _drain(self):
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        if batch:
+            self._exporter.export(batch)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self._delay)
+            self._wakeup.clear()
+            self._drain()
+
+    def force_flush(self, timeout_millis=30000):
+        self._drain()
+        return True
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._worker.join()
+        self._drain()
@@ -0,0 +1,109 @@
+# common/spanmetrics.py
+#
+# RED metrics derived from the spans the services already produce.
+#
+# SpanMetricsProcessor is a SpanProcessor on the TracerProvider. For every
+# finished span of the selected kinds (server spans by default) it records:
+#
+#   http_requests_total             count by service, endpoint, status_class
+#   http_request_errors_total       count of spans with ERROR status or a 5xx code
+#   http_request_duration_seconds   histogram of span duration
+#   http_requests_in_progress       server spans started but not ended
+#   http_request_cpu_seconds        handler thread CPU time between span start and end
+#
+# so a request is measured once, by FlaskInstrumentor's span, and the metrics
+# agree with the traces. Spans only reach processors when they are recorded;
+# common.telemetry therefore switches the sampler to RECORD_ONLY for
+# unsampled traces when span metrics are on, and unsampled requests are
+# counted too.
+#
+# The endpoint dimension is capped at `max_routes` distinct values per
+# process by a common/cardinality.py limiter; later routes are reported as
+# "other" so unbounded paths (e.g. a span named after a raw URL) can't
+# explode the series count, and the overflow is reported through the guard's
+# cardinality_* metrics.
+#
+# Enabled by common.telemetry:
+#   OTEL_SPAN_METRICS              "true" to derive RED metrics from spans
+#   OTEL_SPAN_METRICS_MAX_ROUTES   endpoint cardinality cap (default 100)
+import time
+
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.trace import SpanKind, StatusCode
+
+from common.cardinality import CardinalityGuard
+from common.sampling import _route_of
+
+
+def _status_class(span):
+    attributes = span.attributes or {}
+    code = attributes.get("http.status_code") or attributes.get("http.response.status_code")
+    if code:
+        return f"{int(code) // 100}xx"
+    return "5xx" if span.status.status_code is StatusCode.ERROR else "unknown"
+
+
+class SpanMetricsProcessor(SpanProcessor):
+    """Derives request count, errors, duration, in-progress and CPU from spans."""
+
+    def __init__(self, meter, kinds=(SpanKind.SERVER,), max_routes=100, prefix="http_", cardinality_guard=None):
+        self._kinds = frozenset(kinds)
+        if cardinality_guard is None:
+            cardinality_guard = CardinalityGuard(max_routes).observe(meter)
+        self._routes = cardinality_guard.limiter(f"{prefix}requests_total", max_routes)
+        self._bound_attributes = {}
+        self._started = {}  # id(span) -> (in-progress attributes, thread CPU at start)
+
+        self._requests = meter.create_counter(f"{prefix}requests_total", description="Requests derived from spans")
+        self._errors = meter.create_counter(
+            f"{prefix}request_errors_total", description="Failed requests derived from spans"
+        )
+        self._duration = meter.create_histogram(
+            f"{prefix}request_duration_seconds", unit="s", description="Span duration"
+        )
+        self._in_progress = meter.create_up_down_counter(
+            f"{prefix}requests_in_progress", description="Server spans in progress"
+        )
+        self._cpu = meter.create_histogram(
+            f"{prefix}request_cpu_seconds", unit="s", description="Handler thread CPU time per request"
+        )
+
+    def _route(self, span):
+        return self._routes.fold(_route_of(span.name, span.attributes))
+
+    def _attributes(self, service, route, status_class):
+        key = (service, route, status_class)
+        attributes = self._bound_attributes.get(key)
+        if attributes is None:
+            attributes = {"service": service, "endpoint": route}
+            if status_class is not None:
+                attributes["status_class"] = status_class
+            self._bound_attributes[key] = attributes
+        return attributes
+
+    @staticmethod
+    def _service(span):
+        return span.resource.attributes.get("service.name", "unknown_service")
+
+    def on_start(self, span, parent_context=None):
+        if span.kind not in self._kinds:
+            return
+        attributes = self._attributes(self._service(span), self._route(span), None)
+        self._in_progress.add(1, attributes)
+        self._started[id(span)] = (attributes, time.thread_time())
+
+    def on_end(self, span):
+        if span.kind not in self._kinds:
+            return
+        started = self._started.pop(id(span), None)
+        if started is not None:
+            self._in_progress.add(-1, started[0])
+            # Server spans start and end on the thread that handles the request
+            self._cpu.record(time.thread_time() - started[1], started[0])
+
+        status_class = _status_class(span)
+        attributes = self._attributes(self._service(span), self._route(span), status_class)
+        self._requests.add(1, attributes)
+        if status_class == "5xx" or span.status.status_code is StatusCode.ERROR:
+            self._errors.add(1, attributes)
+        self._duration.record((span.end_time - span.start_time) / 1e9, attributes)
@@ -0,0 +1,359 @@
+# common/spill.py
+#
+# Disk spill for OTLP/HTTP span and log export.
+#
+# The batch processors keep a bounded in-memory queue. When the collector is
+# down, the OTLP exporter sits in its retry loop, that queue fills and new
+# spans are dropped, which loses exactly the traces of the incident.
+# The exporters here serialise each batch to OTLP protobuf once and POST it
+# with a short timeout and no retries. If the POST fails, the encoded
+# request is appended to an on-disk SpillQueue and the exporter switches to
+# "spill" mode. A replay thread then re-sends the queue, oldest first, until
+# the collector accepts it again. The batch processor's worker never blocks
+# on a dead endpoint, so memory stays flat.
+#
+# SpillQueue is a directory of fixed-size, memory-mapped segment files:
+#
+#   [u64 read offset][u32 len][u32 crc32][payload][u32 len][u32 crc32][payload]...
+#
+# Records are only appended. The payload is written before its header, and a
+# record counts only if its CRC matches. A crash mid-write therefore leaves a
+# torn record that is ignored on restart. Total disk use is capped at
+# max_bytes; when a new segment is needed past the cap, the oldest segment
+# is deleted and its unreplayed records are counted in `evicted_records`.
+#
+# Enabled by common.telemetry when OTEL_SPILL_DIR is set (OTLP/HTTP only):
+#   OTEL_SPILL_DIR            directory for segment files (traces/ and logs/ under it)
+#   OTEL_SPILL_MAX_BYTES      disk budget per signal (default 256 MiB)
+#   OTEL_SPILL_SEGMENT_BYTES  segment file size (default 8 MiB)
+#
+# Spilled records are stored uncompressed; the configured Content-Encoding
+# (gzip, deflate or zstd, the last one needing the zstandard package) is
+# applied on every POST, so a restart with a different setting can still
+# replay what is on disk.
+#
+# Under a pre-fork server several workers share OTEL_SPILL_DIR. Each process
+# claims its own numbered slot directory (traces/0, traces/1, ...) with a
+# non-blocking flock. A replacement worker takes over the first free slot,
+# including one left behind by a dead worker, and replays what is in it.
+import collections
+import fcntl
+import functools
+import glob
+import itertools
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+import requests
+from opentelemetry.context import _SUPPRESS_INSTRUMENTATION_KEY, attach, set_value
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+_log = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<Q")  # read offset
+_RECORD = struct.Struct("<II")  # payload length, crc32 of payload
+
+
+class _Segment:
+    """One memory-mapped, append-only segment file."""
+
+    def __init__(self, path, size=None):
+        self.path = path
+        if size is not None:
+            with open(path, "wb") as f:
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self.size = len(self._mm)
+        self.read_offset = _HEADER.unpack_from(self._mm, 0)[0] or _HEADER.size
+        self.pending = 0
+        self.write_offset = self._scan()
+
+    def _scan(self):
+        """Find the end of the valid records (and count them) after a restart."""
+        mm, offset = self._mm, self.read_offset
+        while offset + _RECORD.size <= self.size:
+            length, crc = _RECORD.unpack_from(mm, offset)
+            start = offset + _RECORD.size
+            if length == 0 or start + length > self.size:
+                break
+            if zlib.crc32(mm[start:start + length]) != crc:
+                break
+            offset = start + length
+            self.pending += 1
+        return offset
+
+    def append(self, payload):
+        start = self.write_offset + _RECORD.size
+        end = start + len(payload)
+        if end > self.size:
+            return False
+        self._mm[start:end] = payload
+        _RECORD.pack_into(self._mm, self.write_offset, len(payload), zlib.crc32(payload))
+        self.write_offset = end
+        self.pending += 1
+        return True
+
+    def peek(self):
+        if self.read_offset >= self.write_offset:
+            return None
+        length, _ = _RECORD.unpack_from(self._mm, self.read_offset)
+        start = self.read_offset + _RECORD.size
+        return bytes(self._mm[start:start + length])
+
+    def advance(self):
+        length, _ = _RECORD.unpack_from(self._mm, self.read_offset)
+        self.read_offset += _RECORD.size + length
+        _HEADER.pack_into(self._mm, 0, self.read_offset)
+        self.pending -= 1
+
+    @property
+    def exhausted(self):
+        return self.read_offset >= self.write_offset
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self, delete=False):
+        self._mm.close()
+        self._file.close()
+        if delete:
+            os.unlink(self.path)
+
+
+def _claim_slot(base_directory):
+    """First numbered subdirectory no other live process holds; (path, lock file)."""
+    for slot in itertools.count():
+        directory = os.path.join(base_directory, str(slot))
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, ".lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        return directory, lock
+
+
+class SpillQueue:
+    """Bounded FIFO of byte records backed by memory-mapped segment files."""
+
+    def __init__(self, base_directory, max_bytes=256 << 20, segment_bytes=8 << 20):
+        # The lock is held (file kept open) for the life of the queue
+        directory, self._slot_lock = _claim_slot(base_directory)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.evicted_records = 0
+        self.dropped_records = 0
+        self._lock = threading.Lock()
+        self._segments = collections.deque(
+            _Segment(path) for path in sorted(glob.glob(os.path.join(directory, "*.seg")))
+        )
+        self._next_seq = (
+            int(os.path.basename(self._segments[-1].path).split(".")[0]) + 1
+            if self._segments
+            else 0
+        )
+
+    def __len__(self):
+        with self._lock:
+            return sum(segment.pending for segment in self._segments)
+
+    def _roll(self):
+        while len(self._segments) >= self.max_segments:
+            oldest = self._segments.popleft()
+            self.evicted_records += oldest.pending
+            oldest.close(delete=True)
+        path = os.path.join(self.directory, f"{self._next_seq:012d}.seg")
+        self._next_seq += 1
+        self._segments.append(_Segment(path, self.segment_bytes))
+
+    def append(self, payload):
+        if _HEADER.size + _RECORD.size + len(payload) > self.segment_bytes:
+            self.dropped_records += 1
+            return False
+        with self._lock:
+            if not self._segments or not self._segments[-1].append(payload):
+                self._roll()
+                self._segments[-1].append(payload)
+        return True
+
+    def peek(self):
+        """Oldest record as (token, payload), or None when empty."""
+        with self._lock:
+            while self._segments:
+                head = self._segments[0]
+                payload = head.peek()
+                if payload is not None:
+                    return head, payload
+                if len(self._segments) == 1:
+                    return None
+                self._segments.popleft().close(delete=True)
+            return None
+
+    def commit(self, token):
+        """Drop the record returned by peek(), unless it was evicted meanwhile."""
+        with self._lock:
+            if self._segments and self._segments[0] is token:
+                token.advance()
+                if token.exhausted and len(self._segments) > 1:
+                    self._segments.popleft().close(delete=True)
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.flush()
+                segment.close()
+            self._segments.clear()
+        self._slot_lock.close()
+
+
+# --------------------------
+# Exporters
+# --------------------------
+_SENT, _RETRY, _REJECTED = "sent", "retry", "rejected"
+
+
+def _compressor(compression):
+    if compression == "none":
+        return lambda payload: payload
+    if compression == "gzip":
+        import gzip
+
+        return functools.partial(gzip.compress, compresslevel=6)
+    if compression == "deflate":
+        return zlib.compress
+    if compression == "zstd":
+        import zstandard
+
+        # Compressor objects aren't thread-safe; export and replay run concurrently
+        return lambda payload: zstandard.ZstdCompressor().compress(payload)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+class _SpillingOTLPExporter:
+    """OTLP/HTTP POST with no retries; failed batches go to a SpillQueue."""
+
+    def __init__(
+        self,
+        endpoint,
+        spill,
+        headers=None,
+        compression="none",
+        timeout=5.0,
+        replay_interval=1.0,
+        max_backoff=30.0,
+    ):
+        self.endpoint = endpoint
+        self.spill = spill
+        self._compress = _compressor(compression)
+        self._timeout = timeout
+        self._replay_interval = replay_interval
+        self._max_backoff = max_backoff
+        self._session = requests.Session()
+        self._session.headers.update(headers or {})
+        self._session.headers["Content-Type"] = "application/x-protobuf"
+        if compression != "none":
+            self._session.headers["Content-Encoding"] = compression
+        self._spilling = len(spill) > 0
+        self._stopped = False
+        self._wakeup = threading.Event()
+        self._replayer = threading.Thread(
+            target=self._replay, name=f"{type(self).__name__}-replay", daemon=True
+        )
+        self._replayer.start()
+
+    def _encode(self, batch):
+        raise NotImplementedError
+
+    def _post(self, payload):
+        try:
+            response = self._session.post(
+                self.endpoint, data=self._compress(payload), timeout=self._timeout
+            )
+        except requests.RequestException:
+            return _RETRY
+        if response.ok:
+            return _SENT
+        # 4xx other than 429 will never succeed; don't keep it on disk
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            _log.warning("OTLP endpoint %s rejected batch: %s", self.endpoint, response.status_code)
+            return _REJECTED
+        return _RETRY
+
+    def _send(self, batch):
+        payload = self._encode(batch)
+        started_spilling = False
+        if not self._spilling:
+            outcome = self._post(payload)
+            if outcome != _RETRY:
+                return outcome == _SENT
+            self._spilling = started_spilling = True
+            _log.warning("OTLP endpoint %s unavailable, spilling to %s", self.endpoint, self.spill.directory)
+        stored = self.spill.append(payload)
+        # Wake the replayer only when the outage starts; while it lasts the
+        # replayer keeps to its backoff instead of retrying on every export
+        if started_spilling:
+            self._wakeup.set()
+        return stored
+
+    def _replay(self):
+        # Our own POSTs must not be traced by RequestsInstrumentor
+        attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+        backoff = self._replay_interval
+        while not self._stopped:
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            while not self._stopped:
+                item = self.spill.peek()
+                if item is None:
+                    if self._spilling:
+                        _log.info("OTLP endpoint %s recovered, spill replayed", self.endpoint)
+                    self._spilling = False
+                    backoff = self._replay_interval
+                    break
+                token, payload = item
+                if self._post(payload) == _RETRY:
+                    backoff = min(backoff * 2, self._max_backoff)
+                    break
+                self.spill.commit(token)
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        # An in-flight replay POST can take up to the timeout; give it that long
+        self._replayer.join(self._timeout + 1.0)
+        if self._replayer.is_alive():
+            # Unmapping the segments under a running replayer would break its
+            # commit/peek; the data is already in the files, so leave them mapped
+            _log.warning("Spill replay for %s still running at shutdown; segments left open", self.endpoint)
+        else:
+            self.spill.close()
+        self._session.close()
+
+
+class SpillingSpanExporter(_SpillingOTLPExporter, SpanExporter):
+    def _encode(self, batch):
+        return encode_spans(batch).SerializeToString()
+
+    def export(self, spans):
+        return SpanExportResult.SUCCESS if self._send(spans) else SpanExportResult.FAILURE
+
+
+class SpillingLogExporter(_SpillingOTLPExporter, LogExporter):
+    def _encode(self, batch):
+        return encode_logs(batch).SerializeToString()
+
+    def export(self, batch):
+        return LogExportResult.SUCCESS if self._send(batch) else LogExportResult.FAILURE
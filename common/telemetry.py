@@ -0,0 +1,801 @@
+# common/telemetry.py
+#
+# One telemetry bootstrap for every demo service.
+#
+#   telemetry = setup_telemetry("service1", app=app, logs_exporter="otlp")
+#   tracer = telemetry.tracer(__name__)
+#   meter = telemetry.meter("service1-metrics")
+#   logger = telemetry.get_logger("service1-logs")
+#
+# Keyword arguments are the app's defaults; the standard OTEL_* environment
+# variables override them, so one image can be pointed at a different backend
+# without code changes.
+#
+# Importing this module is cheap: the OpenTelemetry SDK, the instrumentations
+# and the exporters are only imported for the signals that are enabled, and
+# only the exporter that is actually selected is imported (SA-MULTIPLE no
+# longer pays for the Jaeger thrift stack when it sends OTLP to Tempo).
+#
+# Environment variables:
+#   OTEL_SERVICE_NAME                       service.name resource attribute
+#   OTEL_BACKEND                            preset: tempo | jaeger | dynatrace, or a
+#                                           comma-separated list to fan out, see common/fanout.py
+#   OTEL_FANOUT_<BACKEND>_*                 per-backend endpoint, timeout, queue, drop policy
+#   OTEL_TRACES_EXPORTER                    otlp | jaeger | console | none
+#   OTEL_METRICS_EXPORTER                   otlp | prometheus | console | none
+#   OTEL_LOGS_EXPORTER                      otlp | console | none
+#   OTEL_EXPORTER_OTLP_PROTOCOL             http/protobuf | grpc (all signals)
+#   OTEL_EXPORTER_OTLP_<SIGNAL>_PROTOCOL    per-signal protocol override
+#   OTEL_EXPORTER_OTLP_ENDPOINT             base endpoint (HTTP appends /v1/<signal>)
+#   OTEL_EXPORTER_OTLP_<SIGNAL>_ENDPOINT    full endpoint URL per signal
+#   OTEL_EXPORTER_OTLP_<SIGNAL>_HEADERS     "key=value,key2=value2"
+#   OTEL_EXPORTER_OTLP_COMPRESSION          none | gzip | deflate | zstd (all signals)
+#   OTEL_EXPORTER_OTLP_<SIGNAL>_COMPRESSION per-signal override; zstd needs
+#                                           OTLP/HTTP with OTEL_SPILL_DIR
+#   OTEL_BSP_MAX_EXPORT_BATCH_SIZE, OTEL_BLRP_MAX_EXPORT_BATCH_SIZE
+#                                           span/log batch size (read by the SDK)
+#   OTEL_BATCH_ADAPTIVE, OTEL_BATCH_*       adaptive span/log batching, see common/batching.py
+#   OTEL_EXPORTER_JAEGER_AGENT_HOST/PORT    Jaeger agent (thrift over UDP)
+#   OTEL_METRIC_EXPORT_INTERVAL             milliseconds between OTLP metric exports
+#   OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE, OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION,
+#   OTEL_METRICS_EXPONENTIAL_*, OTEL_METRICS_HISTOGRAM_BUCKETS
+#                                           histogram/temporality mode, see common/aggregation.py
+#   OTEL_EXPORTER_PROMETHEUS_PORT           start a /metrics server for the prometheus reader
+#   OTEL_SAMPLING_*, OTEL_TRACES_SAMPLER_ARG  head sampling, see common/sampling.py
+#   OTEL_SPILL_DIR, OTEL_SPILL_*            disk spill for OTLP/HTTP, see common/spill.py
+#   OTEL_LOGS_TRACE_AWARE, OTEL_LOGS_RATE_*  log filtering, see common/logsampling.py
+#   OTEL_PROFILER_HZ, OTEL_PROFILER_*       span-tagged stack sampling, see common/profiler.py
+#   OTEL_SPAN_METRICS, OTEL_SPAN_METRICS_*  RED metrics from spans, see common/spanmetrics.py
+#   OTEL_METRICS_CARDINALITY_LIMIT          attribute sets per instrument, see common/cardinality.py
+import logging
+import os
+import time
+from dataclasses import dataclass, field, replace
+
+_log = logging.getLogger(__name__)
+
+
+def _report_startup(message, *args):
+    # Most services never configure logging, and an INFO record without a
+    # handler is dropped; WARNING still reaches the last-resort stderr handler
+    _log.log(logging.INFO if _log.hasHandlers() else logging.WARNING, message, *args)
+
+# Every Telemetry built in this process, for shutdown_all()
+_active = []
+
+# Backend presets, previously an if/elif in SA-MULTIPLE/SB-MULTIPLE. Several
+# at once ("tempo,dynatrace") go through one FanOutSpanExporter.
+BACKEND_PRESETS = {
+    "tempo": {
+        "traces_exporter": "otlp",
+        "traces_protocol": "http/protobuf",
+        "traces_endpoint": "http://tempo:4318/v1/traces",
+    },
+    "jaeger": {
+        "traces_exporter": "jaeger",
+        "jaeger_agent_host": "jaeger",
+        "jaeger_agent_port": 6831,
+    },
+    "dynatrace": {
+        "traces_exporter": "otlp",
+        "traces_protocol": "http/protobuf",
+        "traces_endpoint": "https://<YOUR_DYNATRACE_TENANT>/api/v2/otlp/v1/traces",
+        "traces_headers": {"Authorization": "Api-Token <YOUR_TOKEN>"},
+    },
+}
+
+
+def _parse_headers(value):
+    headers = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, val = item.partition("=")
+        headers[key.strip()] = val.strip()
+    return headers
+
+
+def _grpc_endpoint(name, http_endpoint):
+    """gRPC target for a preset's OTLP/HTTP traces URL (collector ports: 4318 HTTP, 4317 gRPC)."""
+    from urllib.parse import urlsplit
+
+    url = urlsplit(http_endpoint)
+    if url.port != 4318:
+        raise ValueError(
+            f"OTEL_FANOUT_{name.upper()}_PROTOCOL=grpc needs OTEL_FANOUT_{name.upper()}_ENDPOINT: "
+            f"no gRPC endpoint can be derived from {http_endpoint}"
+        )
+    return f"{url.scheme}://{url.hostname}:4317"
+
+
+def _fanout_backend(name, env):
+    """One fan-out backend's settings: its preset plus OTEL_FANOUT_<NAME>_* overrides."""
+    preset = BACKEND_PRESETS[name]
+    prefix = f"OTEL_FANOUT_{name.upper()}_"
+    protocol = env.get(f"{prefix}PROTOCOL", preset.get("traces_protocol", "http/protobuf"))
+    endpoint = env.get(f"{prefix}ENDPOINT")
+    if endpoint is None:
+        endpoint = preset.get("traces_endpoint")
+        if endpoint and protocol == "grpc" and preset.get("traces_protocol") != "grpc":
+            endpoint = _grpc_endpoint(name, endpoint)
+    settings = {
+        "exporter": preset["traces_exporter"],
+        "protocol": protocol,
+        "endpoint": endpoint,
+        "headers": dict(preset.get("traces_headers", {})),
+        "compression": env.get(f"{prefix}COMPRESSION", "none"),
+        "jaeger_agent_host": preset.get("jaeger_agent_host", "jaeger"),
+        "jaeger_agent_port": preset.get("jaeger_agent_port", 6831),
+        "timeout": float(env.get(f"{prefix}TIMEOUT", "10")),
+        "max_queue_size": int(env.get(f"{prefix}QUEUE_SIZE", "64")),
+        "drop_policy": env.get(f"{prefix}DROP_POLICY", "drop_oldest"),
+    }
+    if f"{prefix}HEADERS" in env:
+        settings["headers"] = _parse_headers(env[f"{prefix}HEADERS"])
+    return settings
+
+
+@dataclass
+class TelemetryConfig:
+    service_name: str
+    traces_exporter: str = "otlp"
+    traces_protocol: str = "http/protobuf"
+    traces_endpoint: str = "http://otel-collector:4318/v1/traces"
+    traces_headers: dict = field(default_factory=dict)
+    traces_compression: str = "none"
+    jaeger_agent_host: str = "jaeger"
+    jaeger_agent_port: int = 6831
+    metrics_exporter: str = "none"
+    metrics_protocol: str = "grpc"
+    metrics_endpoint: str = "http://otel-collector:4317"
+    metrics_headers: dict = field(default_factory=dict)
+    metrics_compression: str = "none"
+    metric_export_interval_millis: int = 5000
+    metrics_cardinality_limit: int = 0
+    metrics_temporality: str = "cumulative"
+    metrics_histogram_aggregation: str = "explicit_bucket_histogram"
+    metrics_exponential_max_size: int = 160
+    metrics_exponential_max_scale: int = 20
+    metrics_histogram_buckets: dict = field(default_factory=dict)
+    prometheus_port: int = 0
+    logs_exporter: str = "none"
+    logs_protocol: str = "http/protobuf"
+    logs_endpoint: str = "http://otel-collector:4318/v1/logs"
+    logs_headers: dict = field(default_factory=dict)
+    logs_compression: str = "none"
+    logs_trace_aware: bool = True
+    logs_rate_limit: float = 0
+    logs_rate_burst: float = 0
+    instrument_requests: bool = False
+    instrument_httpx: bool = False
+    sampling_routes: dict = field(default_factory=dict)
+    sampling_default_ratio: float = 1.0
+    sampling_max_traces_per_second: float = 0
+    sampling_keep_errors: bool = True
+    fanout_backends: dict = field(default_factory=dict)
+    spill_dir: str = ""
+    spill_max_bytes: int = 256 << 20
+    spill_segment_bytes: int = 8 << 20
+    batch_adaptive: bool = False
+    batch_max_queue_size: int = 8192
+    batch_max_export_batch_size: int = 2048
+    batch_max_delay_millis: int = 5000
+    span_metrics: bool = False
+    span_metrics_max_routes: int = 100
+    profiler_hz: float = 0
+    profiler_file: str = ""
+    profiler_endpoint: str = "/debug/profile"
+
+    @property
+    def custom_sampling(self):
+        return bool(
+            self.sampling_routes
+            or self.sampling_default_ratio < 1.0
+            or self.sampling_max_traces_per_second
+        )
+
+    @classmethod
+    def from_env(cls, service_name, **defaults):
+        """Build a config from the app's defaults, then apply OTEL_* overrides."""
+        config = cls(service_name=service_name, **defaults)
+
+        env = os.environ
+        backends = [name.strip() for name in env.get("OTEL_BACKEND", "").split(",") if name.strip()]
+        for backend in backends:
+            if backend not in BACKEND_PRESETS:
+                raise ValueError(f"Unknown OTEL_BACKEND: {backend}")
+        if len(backends) == 1:
+            config = replace(config, **BACKEND_PRESETS[backends[0]])
+        elif backends:
+            config = replace(
+                config,
+                traces_exporter="fanout",
+                fanout_backends={backend: _fanout_backend(backend, env) for backend in backends},
+            )
+
+        overrides = {}
+        if "OTEL_SERVICE_NAME" in env:
+            overrides["service_name"] = env["OTEL_SERVICE_NAME"]
+        for signal in ("traces", "metrics", "logs"):
+            upper = signal.upper()
+            if f"OTEL_{upper}_EXPORTER" in env:
+                overrides[f"{signal}_exporter"] = env[f"OTEL_{upper}_EXPORTER"]
+            protocol = env.get(f"OTEL_EXPORTER_OTLP_{upper}_PROTOCOL") or env.get(
+                "OTEL_EXPORTER_OTLP_PROTOCOL"
+            )
+            if protocol:
+                overrides[f"{signal}_protocol"] = protocol
+            if f"OTEL_EXPORTER_OTLP_{upper}_ENDPOINT" in env:
+                overrides[f"{signal}_endpoint"] = env[f"OTEL_EXPORTER_OTLP_{upper}_ENDPOINT"]
+            elif "OTEL_EXPORTER_OTLP_ENDPOINT" in env:
+                # Base endpoint: gRPC uses it as-is, HTTP appends the signal path
+                base = env["OTEL_EXPORTER_OTLP_ENDPOINT"].rstrip("/")
+                if (protocol or getattr(config, f"{signal}_protocol")) == "grpc":
+                    overrides[f"{signal}_endpoint"] = base
+                else:
+                    overrides[f"{signal}_endpoint"] = f"{base}/v1/{signal}"
+            compression = env.get(f"OTEL_EXPORTER_OTLP_{upper}_COMPRESSION") or env.get(
+                "OTEL_EXPORTER_OTLP_COMPRESSION"
+            )
+            if compression:
+                overrides[f"{signal}_compression"] = compression
+            if f"OTEL_EXPORTER_OTLP_{upper}_HEADERS" in env:
+                overrides[f"{signal}_headers"] = _parse_headers(
+                    env[f"OTEL_EXPORTER_OTLP_{upper}_HEADERS"]
+                )
+        if "OTEL_EXPORTER_JAEGER_AGENT_HOST" in env:
+            overrides["jaeger_agent_host"] = env["OTEL_EXPORTER_JAEGER_AGENT_HOST"]
+        if "OTEL_EXPORTER_JAEGER_AGENT_PORT" in env:
+            overrides["jaeger_agent_port"] = int(env["OTEL_EXPORTER_JAEGER_AGENT_PORT"])
+        if "OTEL_METRIC_EXPORT_INTERVAL" in env:
+            overrides["metric_export_interval_millis"] = int(env["OTEL_METRIC_EXPORT_INTERVAL"])
+        if "OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE" in env:
+            overrides["metrics_temporality"] = env["OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE"].lower()
+        if "OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION" in env:
+            overrides["metrics_histogram_aggregation"] = env[
+                "OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION"
+            ].lower()
+        if "OTEL_METRICS_EXPONENTIAL_MAX_SIZE" in env:
+            overrides["metrics_exponential_max_size"] = int(env["OTEL_METRICS_EXPONENTIAL_MAX_SIZE"])
+        if "OTEL_METRICS_EXPONENTIAL_MAX_SCALE" in env:
+            overrides["metrics_exponential_max_scale"] = int(env["OTEL_METRICS_EXPONENTIAL_MAX_SCALE"])
+        if "OTEL_METRICS_HISTOGRAM_BUCKETS" in env:
+            from common.aggregation import parse_histogram_buckets
+
+            overrides["metrics_histogram_buckets"] = parse_histogram_buckets(
+                env["OTEL_METRICS_HISTOGRAM_BUCKETS"]
+            )
+        if "OTEL_METRICS_CARDINALITY_LIMIT" in env:
+            overrides["metrics_cardinality_limit"] = int(env["OTEL_METRICS_CARDINALITY_LIMIT"])
+        if "OTEL_EXPORTER_PROMETHEUS_PORT" in env:
+            overrides["prometheus_port"] = int(env["OTEL_EXPORTER_PROMETHEUS_PORT"])
+        if "OTEL_LOGS_TRACE_AWARE" in env:
+            overrides["logs_trace_aware"] = env["OTEL_LOGS_TRACE_AWARE"].lower() == "true"
+        if "OTEL_LOGS_RATE_LIMIT" in env:
+            overrides["logs_rate_limit"] = float(env["OTEL_LOGS_RATE_LIMIT"])
+        if "OTEL_LOGS_RATE_BURST" in env:
+            overrides["logs_rate_burst"] = float(env["OTEL_LOGS_RATE_BURST"])
+        if "OTEL_SAMPLING_ROUTES" in env:
+            from common.sampling import parse_route_ratios
+
+            overrides["sampling_routes"] = parse_route_ratios(env["OTEL_SAMPLING_ROUTES"])
+        if "OTEL_TRACES_SAMPLER_ARG" in env:
+            overrides["sampling_default_ratio"] = float(env["OTEL_TRACES_SAMPLER_ARG"])
+        if "OTEL_SAMPLING_MAX_TRACES_PER_SECOND" in env:
+            overrides["sampling_max_traces_per_second"] = float(
+                env["OTEL_SAMPLING_MAX_TRACES_PER_SECOND"]
+            )
+        if "OTEL_SAMPLING_KEEP_ERRORS" in env:
+            overrides["sampling_keep_errors"] = env["OTEL_SAMPLING_KEEP_ERRORS"].lower() == "true"
+        if "OTEL_BATCH_ADAPTIVE" in env:
+            overrides["batch_adaptive"] = env["OTEL_BATCH_ADAPTIVE"].lower() == "true"
+        if "OTEL_BATCH_MAX_QUEUE_SIZE" in env:
+            overrides["batch_max_queue_size"] = int(env["OTEL_BATCH_MAX_QUEUE_SIZE"])
+        if "OTEL_BATCH_MAX_EXPORT_BATCH_SIZE" in env:
+            overrides["batch_max_export_batch_size"] = int(env["OTEL_BATCH_MAX_EXPORT_BATCH_SIZE"])
+        if "OTEL_BATCH_MAX_DELAY" in env:
+            overrides["batch_max_delay_millis"] = int(env["OTEL_BATCH_MAX_DELAY"])
+        if "OTEL_SPAN_METRICS" in env:
+            overrides["span_metrics"] = env["OTEL_SPAN_METRICS"].lower() == "true"
+        if "OTEL_SPAN_METRICS_MAX_ROUTES" in env:
+            overrides["span_metrics_max_routes"] = int(env["OTEL_SPAN_METRICS_MAX_ROUTES"])
+        if "OTEL_PROFILER_HZ" in env:
+            overrides["profiler_hz"] = float(env["OTEL_PROFILER_HZ"])
+        if "OTEL_PROFILER_FILE" in env:
+            overrides["profiler_file"] = env["OTEL_PROFILER_FILE"]
+        if "OTEL_PROFILER_ENDPOINT" in env:
+            overrides["profiler_endpoint"] = env["OTEL_PROFILER_ENDPOINT"]
+        if "OTEL_SPILL_DIR" in env:
+            overrides["spill_dir"] = env["OTEL_SPILL_DIR"]
+        if "OTEL_SPILL_MAX_BYTES" in env:
+            overrides["spill_max_bytes"] = int(env["OTEL_SPILL_MAX_BYTES"])
+        if "OTEL_SPILL_SEGMENT_BYTES" in env:
+            overrides["spill_segment_bytes"] = int(env["OTEL_SPILL_SEGMENT_BYTES"])
+        return replace(config, **overrides)
+
+
+# --------------------------
+# Exporter factories (imports stay inside so only the selected one is loaded)
+# --------------------------
+def _spill_queue(config, signal):
+    from common.spill import SpillQueue
+
+    return SpillQueue(
+        os.path.join(config.spill_dir, signal),
+        max_bytes=config.spill_max_bytes,
+        segment_bytes=config.spill_segment_bytes,
+    )
+
+
+# (signal, "grpc" | "http") -> (module, exporter class)
+_OTLP_EXPORTERS = {
+    ("traces", "grpc"): ("opentelemetry.exporter.otlp.proto.grpc.trace_exporter", "OTLPSpanExporter"),
+    ("traces", "http"): ("opentelemetry.exporter.otlp.proto.http.trace_exporter", "OTLPSpanExporter"),
+    ("metrics", "grpc"): ("opentelemetry.exporter.otlp.proto.grpc.metric_exporter", "OTLPMetricExporter"),
+    ("metrics", "http"): ("opentelemetry.exporter.otlp.proto.http.metric_exporter", "OTLPMetricExporter"),
+    ("logs", "grpc"): ("opentelemetry.exporter.otlp.proto.grpc._log_exporter", "OTLPLogExporter"),
+    ("logs", "http"): ("opentelemetry.exporter.otlp.proto.http._log_exporter", "OTLPLogExporter"),
+}
+COMPRESSIONS = ("none", "gzip", "deflate", "zstd")
+
+
+def _sdk_compression(transport, compression):
+    if transport == "grpc":
+        from grpc import Compression
+    else:
+        from opentelemetry.exporter.otlp.proto.http import Compression
+    return {
+        "none": Compression.NoCompression,
+        "gzip": Compression.Gzip,
+        "deflate": Compression.Deflate,
+    }[compression]
+
+
+def _otlp_exporter(config, signal):
+    """OTLP exporter for one signal, honouring protocol, compression and spill."""
+    protocol = getattr(config, f"{signal}_protocol")
+    endpoint = getattr(config, f"{signal}_endpoint")
+    headers = getattr(config, f"{signal}_headers")
+    compression = getattr(config, f"{signal}_compression")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown {signal} compression: {compression}")
+    transport = "grpc" if protocol == "grpc" else "http"
+
+    if transport == "http" and config.spill_dir and signal in ("traces", "logs"):
+        from common.spill import SpillingLogExporter, SpillingSpanExporter
+
+        exporter_class = SpillingSpanExporter if signal == "traces" else SpillingLogExporter
+        return exporter_class(
+            endpoint, _spill_queue(config, signal), headers=headers, compression=compression
+        )
+    if compression == "zstd":
+        # The SDK exporters only do gzip/deflate; zstd needs our own POST path
+        raise ValueError("zstd compression needs OTLP/HTTP with OTEL_SPILL_DIR set")
+
+    import importlib
+
+    module, name = _OTLP_EXPORTERS[(signal, transport)]
+    exporter_class = getattr(importlib.import_module(module), name)
+    kwargs = {
+        "endpoint": endpoint,
+        "headers": headers or None,
+        "compression": _sdk_compression(transport, compression),
+    }
+    if transport == "grpc":
+        # One channel per exporter, kept open for the life of the process
+        kwargs["insecure"] = endpoint.startswith("http://")
+    if signal == "metrics":
+        kwargs.update(_metric_preferences(config))
+    return exporter_class(**kwargs)
+
+
+def _span_exporter(config):
+    kind = config.traces_exporter
+    if kind == "otlp":
+        return _otlp_exporter(config, "traces")
+    if kind == "jaeger":
+        from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+
+        return JaegerExporter(
+            agent_host_name=config.jaeger_agent_host, agent_port=config.jaeger_agent_port
+        )
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    if kind == "fanout":
+        return _fanout_exporter(config)
+    raise ValueError(f"Unknown traces exporter: {kind}")
+
+
+def _fanout_exporter(config):
+    from common.fanout import ExporterBackend, FanOutSpanExporter, OTLPGrpcBackend, OTLPHttpBackend
+
+    backends = []
+    for name, settings in config.fanout_backends.items():
+        options = {
+            "timeout": settings["timeout"],
+            "max_queue_size": settings["max_queue_size"],
+            "drop_policy": settings["drop_policy"],
+        }
+        if settings["exporter"] == "jaeger":
+            from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+
+            exporter = JaegerExporter(
+                agent_host_name=settings["jaeger_agent_host"], agent_port=settings["jaeger_agent_port"]
+            )
+            backends.append(ExporterBackend(name, exporter, **options))
+            continue
+        backend_class = OTLPGrpcBackend if settings["protocol"] == "grpc" else OTLPHttpBackend
+        backends.append(
+            backend_class(
+                name,
+                settings["endpoint"],
+                headers=settings["headers"],
+                compression=settings["compression"],
+                **options,
+            )
+        )
+    return FanOutSpanExporter(backends)
+
+
+def _metric_preferences(config):
+    from common.aggregation import preferred_aggregation, preferred_temporality
+
+    return {
+        "preferred_temporality": preferred_temporality(config.metrics_temporality),
+        "preferred_aggregation": preferred_aggregation(
+            config.metrics_histogram_aggregation,
+            config.metrics_exponential_max_size,
+            config.metrics_exponential_max_scale,
+        ),
+    }
+
+
+def _metric_exporter(config):
+    kind = config.metrics_exporter
+    if kind == "otlp":
+        return _otlp_exporter(config, "metrics")
+    if kind == "console":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+
+        return ConsoleMetricExporter(**_metric_preferences(config))
+    raise ValueError(f"Unknown metrics exporter: {kind}")
+
+
+def _metric_reader(config):
+    if config.metrics_exporter == "prometheus":
+        from opentelemetry.exporter.prometheus import PrometheusMetricReader
+
+        if config.prometheus_port:
+            from prometheus_client import start_http_server
+
+            start_http_server(config.prometheus_port)
+        return PrometheusMetricReader()
+
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    return PeriodicExportingMetricReader(
+        _metric_exporter(config), export_interval_millis=config.metric_export_interval_millis
+    )
+
+
+def _log_exporter(config):
+    kind = config.logs_exporter
+    if kind == "otlp":
+        return _otlp_exporter(config, "logs")
+    if kind == "console":
+        from opentelemetry.sdk._logs.export import ConsoleLogExporter
+
+        return ConsoleLogExporter()
+    raise ValueError(f"Unknown logs exporter: {kind}")
+
+
+# --------------------------
+# Bootstrap
+# --------------------------
+class Telemetry:
+    """Handles to the providers built by setup_telemetry()."""
+
+    def __init__(self, config):
+        self.config = config
+        self.resource = None
+        self.tracer_provider = None
+        self.meter_provider = None
+        self.logger_provider = None
+        self.profiler = None
+        self.batch_processors = []
+        self.fanout = None
+        self.cardinality = None
+        self.startup_timings = {}
+
+    @property
+    def startup_seconds(self):
+        return sum(self.startup_timings.values())
+
+    def _timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - start
+
+    def _setup_resource(self):
+        from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+
+        self.resource = Resource.create({SERVICE_NAME: self.config.service_name})
+
+    def _batch_processor(self, exporter, signal):
+        config = self.config
+        if not config.batch_adaptive:
+            if signal == "traces":
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+                return BatchSpanProcessor(exporter)
+            from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+
+            return BatchLogRecordProcessor(exporter)
+        from common.batching import AdaptiveBatchLogRecordProcessor, AdaptiveBatchSpanProcessor
+
+        processor_class = AdaptiveBatchSpanProcessor if signal == "traces" else AdaptiveBatchLogRecordProcessor
+        processor = processor_class(
+            exporter,
+            max_queue_size=config.batch_max_queue_size,
+            max_export_batch_size=config.batch_max_export_batch_size,
+            max_delay_millis=config.batch_max_delay_millis,
+        )
+        self.batch_processors.append(processor)
+        return processor
+
+    def _setup_traces(self):
+        from opentelemetry import trace
+        from opentelemetry.sdk.trace import TracerProvider
+
+        config = self.config
+        exporter = _span_exporter(config)
+        if config.traces_exporter == "fanout":
+            self.fanout = exporter
+        if config.custom_sampling or config.span_metrics:
+            from common.sampling import UnsampledErrorProcessor, route_sampler
+
+            self.tracer_provider = TracerProvider(
+                resource=self.resource,
+                sampler=route_sampler(
+                    config.sampling_routes,
+                    config.sampling_default_ratio,
+                    config.sampling_max_traces_per_second,
+                    config.sampling_keep_errors,
+                    record_unsampled=config.span_metrics,
+                ),
+            )
+            if config.sampling_keep_errors:
+                self.tracer_provider.add_span_processor(UnsampledErrorProcessor(exporter))
+        else:
+            # SDK default sampler (ParentBased(AlwaysOn), or OTEL_TRACES_SAMPLER)
+            self.tracer_provider = TracerProvider(resource=self.resource)
+        self.tracer_provider.add_span_processor(self._batch_processor(exporter, "traces"))
+        if config.profiler_hz:
+            from common.profiler import SpanProfiler
+
+            self.profiler = SpanProfiler(config.profiler_hz)
+            self.tracer_provider.add_span_processor(self.profiler.active_spans)
+            self.profiler.start()
+        trace.set_tracer_provider(self.tracer_provider)
+
+    def _setup_metrics(self):
+        from opentelemetry import metrics
+        from opentelemetry.sdk.metrics import MeterProvider
+
+        views = []
+        if self.config.metrics_histogram_buckets:
+            from common.aggregation import histogram_views
+
+            views += histogram_views(self.config.metrics_histogram_buckets)
+        if self.config.metrics_cardinality_limit:
+            from common.cardinality import CardinalityGuard, instrumentation_views
+
+            views += instrumentation_views()
+            self.cardinality = CardinalityGuard(self.config.metrics_cardinality_limit)
+        self.meter_provider = MeterProvider(
+            metric_readers=[_metric_reader(self.config)], resource=self.resource, views=views
+        )
+        if self.cardinality is not None:
+            self.cardinality.observe(self.meter_provider.get_meter("common.cardinality"))
+        metrics.set_meter_provider(self.meter_provider)
+
+    def _setup_span_metrics(self):
+        from common.spanmetrics import SpanMetricsProcessor
+
+        self.tracer_provider.add_span_processor(
+            SpanMetricsProcessor(
+                self.meter_provider.get_meter("common.spanmetrics"),
+                max_routes=self.config.span_metrics_max_routes,
+                cardinality_guard=self.cardinality,
+            )
+        )
+
+    def _observe_batching(self):
+        meter = self.meter_provider.get_meter("common.batching")
+        for processor in self.batch_processors:
+            processor.observe(meter)
+
+    def _observe_fanout(self):
+        self.fanout.observe(self.meter_provider.get_meter("common.fanout"))
+
+    def _observe_startup(self):
+        from opentelemetry.metrics import Observation
+
+        self.meter_provider.get_meter("common.telemetry").create_observable_gauge(
+            "otel_startup_duration_seconds",
+            callbacks=[
+                lambda options: [
+                    Observation(seconds, {"phase": phase}) for phase, seconds in self.startup_timings.items()
+                ]
+            ],
+            unit="s",
+            description="Time spent in each setup_telemetry phase",
+        )
+
+    def _setup_logs(self):
+        from opentelemetry._logs import set_logger_provider
+        from opentelemetry.sdk._logs import LoggerProvider
+
+        self.logger_provider = LoggerProvider(resource=self.resource)
+        self.logger_provider.add_log_record_processor(
+            self._batch_processor(_log_exporter(self.config), "logs")
+        )
+        set_logger_provider(self.logger_provider)
+
+    def _instrument(self, app):
+        if app is not None and type(app).__module__.startswith("starlette"):
+            from opentelemetry.instrumentation.starlette import StarletteInstrumentor
+
+            StarletteInstrumentor.instrument_app(app)
+        elif app is not None:
+            from opentelemetry.instrumentation.flask import FlaskInstrumentor
+
+            FlaskInstrumentor().instrument_app(app)
+            if self.profiler is not None and self.config.profiler_endpoint:
+                from flask import request
+
+                app.add_url_rule(
+                    self.config.profiler_endpoint,
+                    "span_profile",
+                    lambda: self.profiler.flask_view(request),
+                )
+        if self.config.instrument_requests:
+            from opentelemetry.instrumentation.requests import RequestsInstrumentor
+
+            RequestsInstrumentor().instrument()
+        if self.config.instrument_httpx:
+            from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+
+            HTTPXClientInstrumentor().instrument()
+
+    # --------------------------
+    # Accessors used by the apps
+    # --------------------------
+    def tracer(self, name):
+        from opentelemetry import trace
+
+        return trace.get_tracer(name)
+
+    def meter(self, name):
+        from opentelemetry import metrics
+
+        return metrics.get_meter(name)
+
+    def get_logger(self, name, level=logging.INFO):
+        """stdlib logger whose records are also exported through the LoggerProvider."""
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        if self.logger_provider is not None and not any(
+            getattr(h, "_otel_bootstrap", False) for h in logger.handlers
+        ):
+            from opentelemetry.sdk._logs import LoggingHandler
+
+            handler = LoggingHandler(logger_provider=self.logger_provider)
+            handler._otel_bootstrap = True
+            config = self.config
+            if config.logs_trace_aware or config.logs_rate_limit:
+                from common.logsampling import TraceAwareLogFilter
+
+                handler.addFilter(
+                    TraceAwareLogFilter(
+                        trace_aware=config.logs_trace_aware,
+                        rate_limit=config.logs_rate_limit,
+                        burst=config.logs_rate_burst or None,
+                    )
+                )
+            logger.addHandler(handler)
+        return logger
+
+    def force_flush(self, timeout_millis=10000):
+        for provider in (self.tracer_provider, self.meter_provider, self.logger_provider):
+            if provider is not None:
+                provider.force_flush(timeout_millis)
+
+    def shutdown(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+            if self.config.profiler_file:
+                # "{pid}" in the path keeps gunicorn workers from overwriting each other
+                self.profiler.write(self.config.profiler_file.format(pid=os.getpid()))
+        for provider in (self.tracer_provider, self.meter_provider, self.logger_provider):
+            if provider is not None:
+                provider.shutdown()
+        if self in _active:
+            _active.remove(self)
+
+
+def setup_telemetry(service_name, app=None, **defaults):
+    """Configure traces, metrics and logs for one service and instrument `app`."""
+    config = TelemetryConfig.from_env(service_name, **defaults)
+    telemetry = Telemetry(config)
+    _active.append(telemetry)
+    telemetry._timed("resource", telemetry._setup_resource)
+    if config.traces_exporter != "none":
+        telemetry._timed("traces", telemetry._setup_traces)
+    if config.metrics_exporter != "none":
+        telemetry._timed("metrics", telemetry._setup_metrics)
+    if config.logs_exporter != "none":
+        telemetry._timed("logs", telemetry._setup_logs)
+    if config.span_metrics and telemetry.tracer_provider and telemetry.meter_provider:
+        telemetry._timed("span_metrics", telemetry._setup_span_metrics)
+    if telemetry.batch_processors and telemetry.meter_provider:
+        telemetry._timed("batch_metrics", telemetry._observe_batching)
+    if telemetry.fanout is not None and telemetry.meter_provider:
+        telemetry._timed("fanout_metrics", telemetry._observe_fanout)
+    telemetry._timed("instrumentation", telemetry._instrument, app)
+    if telemetry.meter_provider:
+        telemetry._observe_startup()
+
+    _report_startup(
+        "telemetry bootstrap for %s took %.1f ms (traces=%s metrics=%s logs=%s) %s",
+        config.service_name,
+        telemetry.startup_seconds * 1000,
+        config.traces_exporter,
+        config.metrics_exporter,
+        config.logs_exporter,
+        {phase: round(secs * 1000, 1) for phase, secs in telemetry.startup_timings.items()},
+    )
+    return telemetry
+
+
+def shutdown_all():
+    """Flush and shut down every Telemetry in this process.
+
+    Pre-fork servers end workers with os._exit(), which skips the SDK's
+    atexit hooks; common/gunicorn_conf.py calls this from worker_exit.
+    """
+    for telemetry in list(_active):
+        telemetry.shutdown()
+
+
+def _jaeger_sampler_from_env():
+    """jaeger_client sampler config from JAEGER_SAMPLER_TYPE/JAEGER_SAMPLER_PARAM.
+
+    Types are jaeger_client's own: const, probabilistic, ratelimiting
+    (traces per second) or remote. Defaults to const/1 (trace everything).
+    """
+    return {
+        "type": os.getenv("JAEGER_SAMPLER_TYPE", "const"),
+        "param": float(os.getenv("JAEGER_SAMPLER_PARAM", "1")),
+    }
+
+
+def init_jaeger_tracer(service_name, sampler=None):
+    """jaeger_client (OpenTracing) tracer for the SA/SB services."""
+    start = time.perf_counter()
+    from jaeger_client import Config
+
+    config = Config(
+        config={"sampler": sampler or _jaeger_sampler_from_env(), "logging": True},
+        service_name=service_name,
+    )
+    tracer = config.initialize_tracer()
+    _report_startup(
+        "jaeger tracer bootstrap for %s took %.1f ms",
+        service_name,
+        (time.perf_counter() - start) * 1000,
+    )
+    return tracer
+
@@ -0,0 +1,64 @@
+# HyperLogLog accuracy and CardinalityLimiter admission/overflow accounting.
+import threading
+
+import pytest
+
+from common.cardinality import OTHER, CardinalityGuard, CardinalityLimiter, HyperLogLog
+
+
+@pytest.mark.parametrize("n", [100, 10000, 100000])
+def test_hyperloglog_estimate_is_close(n):
+    # Integers hash the same in every run; str hashes are salted per process
+    sketch = HyperLogLog()
+    for i in range(n):
+        sketch.add(i)
+    assert sketch.count() == pytest.approx(n, rel=0.05)
+
+
+def test_hyperloglog_ignores_repeats():
+    sketch = HyperLogLog()
+    for _ in range(50):
+        for i in range(1000):
+            sketch.add(i)
+    assert sketch.count() == pytest.approx(1000, rel=0.05)
+
+
+def test_limiter_admits_up_to_the_limit_then_folds():
+    limiter = CardinalityLimiter("requests", limit=3)
+    assert [limiter.fold(f"/r{i}") for i in range(5)] == ["/r0", "/r1", "/r2", OTHER, OTHER]
+    # Admitted keys stay admitted
+    assert limiter.fold("/r1") == "/r1"
+    assert limiter.overflow == 2
+    assert limiter.estimate() == 5
+
+
+def test_estimate_is_never_below_the_admitted_count():
+    limiter = CardinalityLimiter("requests", limit=10, precision=4)
+    for i in range(10):
+        limiter.admit(i)
+    assert limiter.estimate() >= 10
+
+
+def test_overflow_is_counted_exactly_under_concurrency():
+    calls = []
+    limiter = CardinalityLimiter("requests", limit=10, on_overflow=lambda: calls.append(1))
+
+    def admit(worker):
+        for i in range(1000):
+            limiter.admit(f"/w{worker}/{i}")
+
+    threads = [threading.Thread(target=admit, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(limiter._admitted) == 10
+    assert limiter.overflow == 8000 - 10
+    assert len(calls) == limiter.overflow
+
+
+def test_guard_keeps_one_limiter_per_instrument():
+    guard = CardinalityGuard(limit=2)
+    assert guard.limiter("a") is guard.limiter("a")
+    assert guard.limiter("b", limit=5).limit == 5
+    assert guard.limiter("a").limit == 2
@@ -0,0 +1,156 @@
+# CoalescingClient: single-flight, shared errors, TTL and stale-while-revalidate,
+# follower deadlines and pass-through, against a stub downstream client.
+import threading
+import time
+
+import pytest
+
+from common.coalesce import CoalescingClient
+from common.resilience import DeadlineExceeded, deadline
+
+URL = "http://service2:5001/"
+
+
+class Response:
+    def __init__(self, status_code=200, body="ok"):
+        self.status_code = status_code
+        self.text = body
+
+
+class StubClient:
+    timeout = (1.0, 5.0)
+
+    def __init__(self, delay=0.0, status_code=200, error=None):
+        self.delay = delay
+        self.status_code = status_code
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.calls.append((url, kwargs))
+            n = len(self.calls)
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return Response(self.status_code, body=f"response {n}")
+
+    def close(self):
+        pass
+
+
+def concurrently(fn, n):
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(fn())
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_identical_gets_make_one_call():
+    stub = StubClient(delay=0.1)
+    client = CoalescingClient(stub)
+    results, errors = concurrently(lambda: client.get(URL), 10)
+    assert not errors
+    assert len(stub.calls) == 1
+    assert {response.text for response in results} == {"response 1"}
+    # Nothing cached without a TTL: the next call goes out again
+    client.get(URL)
+    assert len(stub.calls) == 2
+
+
+def test_errors_are_shared_but_not_cached():
+    stub = StubClient(delay=0.1, error=IOError("service2 down"))
+    client = CoalescingClient(stub, ttl=60)
+    results, errors = concurrently(lambda: client.get(URL), 5)
+    assert not results
+    assert len(errors) == 5 and all(isinstance(exc, IOError) for exc in errors)
+    assert len(stub.calls) == 1
+    stub.error = None
+    assert client.get(URL).status_code == 200
+    assert len(stub.calls) == 2
+
+
+def test_error_statuses_are_not_cached():
+    stub = StubClient(status_code=503)
+    client = CoalescingClient(stub, ttl=60)
+    client.get(URL)
+    client.get(URL)
+    assert len(stub.calls) == 2
+
+
+def test_fresh_response_is_served_from_the_cache():
+    stub = StubClient()
+    client = CoalescingClient(stub, ttl=60)
+    first = client.get(URL)
+    assert client.get(URL) is first
+    assert len(stub.calls) == 1
+    client.invalidate(URL)
+    assert client.get(URL) is not first
+
+
+def test_stale_response_is_served_while_it_is_revalidated():
+    stub = StubClient(delay=0.05)
+    client = CoalescingClient(stub, ttl=0.05, stale=10)
+    first = client.get(URL)
+    time.sleep(0.06)
+    # Stale: returned at once, one background refresh however many callers
+    assert client.get(URL) is first
+    assert client.get(URL) is first
+    time.sleep(0.1)
+    assert len(stub.calls) == 2
+    assert client.get(URL).text == "response 2"
+
+
+def test_lru_bound():
+    stub = StubClient()
+    client = CoalescingClient(stub, ttl=60, max_entries=2)
+    for path in ("a", "b", "c"):
+        client.get(URL + path)
+    client.get(URL + "a")
+    assert len(stub.calls) == 4
+
+
+def test_waiter_gives_up_at_its_own_deadline():
+    stub = StubClient(delay=0.5)
+    client = CoalescingClient(stub)
+    leader = threading.Thread(target=client.get, args=(URL,))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with deadline(0.1):
+            client.get(URL)
+    assert time.monotonic() - started < 0.3
+    leader.join()
+    assert len(stub.calls) == 1
+
+
+def test_calls_with_extra_arguments_bypass_the_layer():
+    stub = StubClient()
+    client = CoalescingClient(stub, ttl=60)
+    client.get(URL, headers={"X-Request-Deadline-Ms": "100"})
+    client.get(URL, headers={"X-Request-Deadline-Ms": "100"})
+    assert len(stub.calls) == 2
+    # The client's own timeout is not an extra argument
+    client.get(URL, timeout=stub.timeout)
+    client.get(URL, timeout=stub.timeout)
+    assert len(stub.calls) == 3
+    assert stub.calls[2] == (URL, {})
+
+
+def test_coalescing_can_be_turned_off():
+    stub = StubClient(delay=0.05)
+    client = CoalescingClient(stub, coalesce=False)
+    concurrently(lambda: client.get(URL), 4)
+    assert len(stub.calls) == 4
@@ -0,0 +1,79 @@
+# compact_dead_worker: dead workers' PROMETHEUS_MULTIPROC_DIR files merge into
+# per-type archives and the merged exposition is unchanged.
+import os
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+
+from common.multiproc import compact_dead_worker
+
+
+def write(directory, typ, pid, name, value, timestamp=0.0, route="/"):
+    db = MmapedDict(os.path.join(directory, f"{typ}_{pid}.db"))
+    try:
+        db.write_value(mmap_key(name, name, ["route"], [route], "help"), value, timestamp)
+    finally:
+        db.close()
+
+
+def values(directory, typ):
+    path = os.path.join(directory, f"{typ}_archive.db")
+    return {key: value for key, value, _, _ in MmapedDict.read_all_values_from_file(path)}
+
+
+def key(name, route="/"):
+    return mmap_key(name, name, ["route"], [route], "help")
+
+
+def scrape(directory):
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(directory))
+    return generate_latest(registry)
+
+
+def test_counters_of_dead_workers_are_summed_into_the_archive(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "counter", 101, "requests_total", 3)
+    write(directory, "counter", 102, "requests_total", 4)
+    write(directory, "counter", 102, "requests_total", 1, route="/error")
+    write(directory, "counter", 103, "requests_total", 5)  # still alive
+    before = scrape(directory)
+
+    compact_dead_worker(directory, 101)
+    compact_dead_worker(directory, 102)
+
+    assert sorted(os.listdir(directory)) == [".compaction.lock", "counter_103.db", "counter_archive.db"]
+    assert values(directory, "counter") == {key("requests_total"): 7, key("requests_total", "/error"): 1}
+    assert scrape(directory) == before
+
+
+def test_max_min_and_mostrecent_gauges_merge(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "gauge_max", 101, "peak", 9)
+    write(directory, "gauge_max", 102, "peak", 4)
+    write(directory, "gauge_min", 101, "low", 9)
+    write(directory, "gauge_min", 102, "low", 4)
+    write(directory, "gauge_mostrecent", 101, "last", 1, timestamp=20.0)
+    write(directory, "gauge_mostrecent", 102, "last", 2, timestamp=10.0)
+
+    compact_dead_worker(directory, 101)
+    compact_dead_worker(directory, 102)
+
+    assert values(directory, "gauge_max") == {key("peak"): 9}
+    assert values(directory, "gauge_min") == {key("low"): 4}
+    assert values(directory, "gauge_mostrecent") == {key("last"): 1}
+
+
+def test_per_process_gauge_files_are_deleted(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "gauge_all", 101, "threads", 8)
+    write(directory, "gauge_liveall", 101, "threads_live", 8)
+    write(directory, "gauge_all", 102, "threads", 6)
+
+    compact_dead_worker(directory, 101)
+
+    assert sorted(name for name in os.listdir(directory) if name.endswith(".db")) == ["gauge_all_102.db"]
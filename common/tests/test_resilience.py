@@ -0,0 +1,305 @@
+# P2Quantile, CircuitBreaker, deadlines and ResilientClient's breaker,
+# bulkhead and hedge bookkeeping, against stub downstream clients.
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from common.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AsyncResilientClient,
+    CircuitBreaker,
+    CircuitOpen,
+    ConcurrencyLimitExceeded,
+    DeadlineExceeded,
+    P2Quantile,
+    ResilientClient,
+    deadline,
+    deadline_from_headers,
+    remaining,
+)
+
+URL = "http://service2:5001/"
+
+
+class Response:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.text = "ok"
+
+
+class StubClient:
+    timeout = (1.0, 5.0)
+
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise IOError("service2 down")
+        return Response()
+
+    def close(self):
+        pass
+
+
+# --------------------------
+# P2Quantile
+# --------------------------
+@pytest.mark.parametrize("q", [0.5, 0.95, 0.99])
+def test_p2_quantile_tracks_the_exact_quantile(q):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 0.5) for _ in range(20000)]
+    estimate = P2Quantile(q)
+    for value in values:
+        estimate.add(value)
+    exact = sorted(values)[int(q * len(values))]
+    assert estimate.value() == pytest.approx(exact, rel=0.05)
+
+
+def test_p2_quantile_with_few_samples():
+    estimate = P2Quantile(0.5)
+    assert estimate.value() is None
+    for value in (3.0, 1.0, 2.0):
+        estimate.add(value)
+    assert estimate.value() == 2.0
+
+
+# --------------------------
+# CircuitBreaker
+# --------------------------
+def open_breaker(reset_timeout=0.05, probes=1):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout, half_open_probes=probes)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_admits_one_probe_and_its_result_decides():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+
+def test_released_probe_can_be_taken_again():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_unreported_probe_reopens_after_the_reset_timeout():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()  # probe taken, never recorded
+    time.sleep(0.06)
+    assert not breaker.allow()
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_concurrent_callers_take_at_most_the_probe_budget():
+    breaker = open_breaker(probes=2)
+    time.sleep(0.06)
+    admitted = []
+    threads = [threading.Thread(target=lambda: admitted.append(breaker.allow())) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert admitted.count(True) == 2
+
+
+# --------------------------
+# Deadlines
+# --------------------------
+def test_nested_deadlines_keep_the_earlier_one():
+    assert remaining() is None
+    with deadline(1.0):
+        with deadline(5.0):
+            assert remaining() <= 1.0
+        with deadline(0.1):
+            assert remaining() <= 0.1
+    assert remaining() is None
+
+
+def test_deadline_from_headers():
+    assert deadline_from_headers({"X-Request-Deadline-Ms": "250"}) == 0.25
+    assert deadline_from_headers({"X-Request-Deadline-Ms": "-5"}) == 0.0
+    assert deadline_from_headers({"X-Request-Deadline-Ms": "soon"}, default=2.0) == 2.0
+    assert deadline_from_headers({}) is None
+
+
+def test_install_deadline_short_circuits_and_maps_errors():
+    flask = pytest.importorskip("flask")
+    from common.resilience import install_deadline
+
+    app = flask.Flask(__name__)
+    install_deadline(app)
+
+    @app.route("/")
+    def index():
+        if remaining() is not None and remaining() < 0.5:
+            raise DeadlineExceeded("budget spent")
+        return "ok"
+
+    client = app.test_client()
+    assert client.get("/").status_code == 200
+    assert client.get("/", headers={"X-Request-Deadline-Ms": "0"}).status_code == 504
+    assert client.get("/", headers={"X-Request-Deadline-Ms": "100"}).status_code == 504
+    assert client.get("/", headers={"X-Request-Deadline-Ms": "5000"}).status_code == 200
+
+
+# --------------------------
+# ResilientClient
+# --------------------------
+def test_client_opens_the_circuit_and_fails_fast():
+    stub = StubClient(fail=True)
+    client = ResilientClient(stub, failure_threshold=2, reset_timeout=10, hedge=False)
+    for _ in range(2):
+        with pytest.raises(IOError):
+            client.get(URL)
+    with pytest.raises(CircuitOpen):
+        client.get(URL)
+    assert stub.calls == 2
+    client.close()
+
+
+def test_bulkhead_rejection_gives_the_half_open_probe_back():
+    stub = StubClient(fail=True)
+    client = ResilientClient(stub, failure_threshold=1, reset_timeout=0.05, max_concurrency=1, hedge=False, deadline=0.1)
+    with pytest.raises(IOError):
+        client.get(URL)
+    time.sleep(0.06)
+    upstream = client._upstream(URL)
+    upstream.semaphore.acquire()  # bulkhead full
+    with pytest.raises(ConcurrencyLimitExceeded):
+        client.get(URL)
+    upstream.semaphore.release()
+    stub.fail = False
+    assert client.get(URL).status_code == 200
+    assert upstream.breaker.state == CLOSED
+    client.close()
+
+
+def test_no_answer_within_the_deadline_counts_as_failure():
+    stub = StubClient(delay=0.3)
+    client = ResilientClient(stub, failure_threshold=1, hedge=False, deadline=0.05)
+    with pytest.raises(DeadlineExceeded):
+        client.get(URL)
+    assert client._upstream(URL).breaker.state == OPEN
+    client.close()
+
+
+def test_no_hedge_is_sent_after_the_deadline():
+    stub = StubClient(delay=0.3)
+    client = ResilientClient(stub, hedge_min_samples=1, hedge_min_delay=0.01, hedge_budget=1.0, deadline=0.1)
+    upstream = client._upstream(URL)
+    for _ in range(5):
+        upstream.observe(0.5)  # hedge delay beyond the deadline
+    with pytest.raises(DeadlineExceeded):
+        client.get(URL)
+    assert upstream.hedges == 0
+    assert stub.calls == 1
+    client.close()
+
+
+def test_slow_call_is_hedged_and_the_first_answer_wins():
+    stub = StubClient(delay=0.2)
+    client = ResilientClient(stub, hedge_min_samples=1, hedge_min_delay=0.01, hedge_budget=1.0, deadline=1.0)
+    upstream = client._upstream(URL)
+    for _ in range(5):
+        upstream.observe(0.02)
+    started = time.monotonic()
+    assert client.get(URL).status_code == 200
+    assert upstream.hedges == 1
+    assert stub.calls == 2
+    assert time.monotonic() - started < 0.4
+    client.close()
+
+
+def test_hedge_budget_holds_under_concurrency():
+    client = ResilientClient(StubClient(), hedge_budget=0.1)
+    upstream = client._upstream(URL)
+    upstream.calls = 100
+
+    def take():
+        for _ in range(100):
+            client._take_hedge(upstream)
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream.hedges == 10
+
+
+# --------------------------
+# AsyncResilientClient
+# --------------------------
+class AsyncStubClient:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def get(self, url, **kwargs):
+        await asyncio.sleep(self.delay)
+        return Response()
+
+
+def test_cancelled_async_call_frees_its_probe_and_slot():
+    async def scenario():
+        stub = AsyncStubClient(delay=10)
+        client = AsyncResilientClient(stub, failure_threshold=1, reset_timeout=0.05, hedge=False, deadline=1)
+        upstream = client._upstream(URL)
+        upstream.breaker.record(False)
+        await asyncio.sleep(0.06)
+        task = asyncio.ensure_future(client.get(URL))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        stub.delay = 0
+        response = await client.get(URL)
+        return response, upstream
+
+    response, upstream = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert upstream.breaker.state == CLOSED
+    assert upstream.semaphore._value == 32
@@ -0,0 +1,124 @@
+# SpillQueue: FIFO order, restart recovery, torn records, eviction, slots.
+# common.spill imports the OTLP exporter stack at module level.
+import os
+import struct
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("opentelemetry.exporter.otlp.proto.common.trace_encoder")
+
+from common.spill import SpillQueue  # noqa: E402
+
+SEGMENT = 4096
+
+
+def drain(queue):
+    payloads = []
+    while True:
+        item = queue.peek()
+        if item is None:
+            return payloads
+        token, payload = item
+        payloads.append(payload)
+        queue.commit(token)
+
+
+def test_fifo_across_segments(tmp_path):
+    queue = SpillQueue(str(tmp_path), max_bytes=64 * SEGMENT, segment_bytes=SEGMENT)
+    records = [bytes([i]) * 1200 for i in range(10)]  # 3 per segment
+    for record in records:
+        assert queue.append(record)
+    assert len(queue) == 10
+    assert drain(queue) == records
+    assert len(queue) == 0
+    queue.close()
+
+
+def test_pending_records_survive_a_restart(tmp_path):
+    queue = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    for i in range(5):
+        queue.append(b"record-%d" % i)
+    token, _ = queue.peek()
+    queue.commit(token)
+    queue.close()
+
+    reopened = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    assert reopened.directory == queue.directory
+    assert drain(reopened) == [b"record-%d" % i for i in range(1, 5)]
+    reopened.close()
+
+
+def test_torn_record_is_ignored_on_restart(tmp_path):
+    queue = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    queue.append(b"complete")
+    queue.append(b"torn-by-a-crash")
+    segment_path = queue._segments[-1].path
+    queue.close()
+
+    # Flip the last payload byte: its CRC no longer matches
+    offset = 8 + 8 + len(b"complete") + 8 + len(b"torn-by-a-crash") - 1
+    with open(segment_path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    reopened = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    assert drain(reopened) == [b"complete"]
+    # New records go after the last valid one, over the torn bytes
+    reopened.append(b"after")
+    assert drain(reopened) == [b"after"]
+    reopened.close()
+
+
+def test_zero_length_header_ends_the_scan(tmp_path):
+    queue = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    queue.append(b"only")
+    segment_path = queue._segments[-1].path
+    queue.close()
+    with open(segment_path, "rb") as f:
+        f.seek(8 + 8 + len(b"only"))
+        assert struct.unpack("<II", f.read(8)) == (0, 0)
+    reopened = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    assert len(reopened) == 1
+    reopened.close()
+
+
+def test_oldest_segment_is_evicted_at_the_disk_budget(tmp_path):
+    queue = SpillQueue(str(tmp_path), max_bytes=2 * SEGMENT, segment_bytes=SEGMENT)
+    for i in range(9):  # 3 records per segment, 3 segments' worth
+        queue.append(bytes([i]) * 1200)
+    assert queue.evicted_records == 3
+    assert len(os.listdir(queue.directory)) - 1 == 2  # segments + .lock
+    assert drain(queue) == [bytes([i]) * 1200 for i in range(3, 9)]
+    queue.close()
+
+
+def test_oversized_record_is_dropped(tmp_path):
+    queue = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    assert not queue.append(b"x" * SEGMENT)
+    assert queue.dropped_records == 1
+    assert queue.peek() is None
+    queue.close()
+
+
+def test_commit_of_an_evicted_token_is_ignored(tmp_path):
+    queue = SpillQueue(str(tmp_path), max_bytes=2 * SEGMENT, segment_bytes=SEGMENT)
+    queue.append(b"a" * 1000)
+    token, _ = queue.peek()
+    for _ in range(8):  # evicts the segment `token` points into
+        queue.append(b"b" * 1000)
+    queue.commit(token)
+    assert drain(queue)[0] == b"b" * 1000
+    queue.close()
+
+
+def test_each_open_queue_claims_its_own_slot(tmp_path):
+    first = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    second = SpillQueue(str(tmp_path), segment_bytes=SEGMENT)
+    assert first.directory != second.directory
+    first.append(b"first")
+    assert second.peek() is None
+    second.close()
+    first.close()
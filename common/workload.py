@@ -0,0 +1,265 @@
+# common/workload.py
+#
+# Configurable simulated work for the demo handlers, replacing the
+# `time.sleep(random.uniform(a, b))` stubs so load tests exercise CPU, the
+# GIL, the allocator/GC and the disk, not only sleeping threads.
+#
+#   WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)"})
+#   elapsed = WORKLOAD.run("/")          # or: await WORKLOAD.arun("/")
+#
+# The app's defaults keep its old behaviour; WORKLOAD_ROUTES replaces the
+# steps of any route. A route is a list of steps joined by "+", each
+# `kind:distribution[option=value,...]`:
+#
+#   WORKLOAD_ROUTES="/=cpu:lognormal(0.2,0.6);/work=alloc:pareto(0.1,1.5)[mb=64,max=3]+io:fixed(0.02)"
+#
+# Kinds (the drawn value is seconds unless noted):
+#   sleep    time.sleep / asyncio.sleep
+#   cpu      pure Python busy loop for that much thread CPU time, so it holds
+#            the GIL; [offload=process] runs it in a shared process pool
+#            (WORKLOAD_PROCESSES workers) and the handler only waits
+#   alloc    churns short-lived containers for that long (young-generation
+#            GC pressure) while holding [mb=16] megabytes of buffers
+#   io       writes and reads back [kb=64] KB blocks of a temp file for that
+#            long, with [fsync=true] to force each write to disk
+#   fanout   the drawn value, rounded, is the number of concurrent GETs to
+#            the app's downstream URLs (only where a downstream client is
+#            passed to from_env)
+#
+# Distributions:
+#   fixed(x)  uniform(a,b)  exponential(mean)  lognormal(median,sigma)
+#   pareto(scale,alpha)     heavy tail; alpha <= 2 has infinite variance
+# Every step takes [max=seconds] to cap the draw.
+#
+# Under a request deadline (common/resilience.py: install_deadline, or
+# `with deadline(...)`) each step is cut short at the deadline and the next
+# one raises DeadlineExceeded, so a caller that has given up stops the work.
+#
+# WORKLOAD_FILE points to a JSON file instead, each route a "step+step" string
+# or a list of steps: {"/": "cpu:lognormal(0.2,0.6)", "/work": ["sleep:fixed(0.1)"]}.
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common.resilience import DeadlineExceeded, remaining
+
+KINDS = ("sleep", "cpu", "alloc", "io", "fanout")
+
+_DISTRIBUTIONS = {
+    "fixed": (1, lambda rng, x: x),
+    "uniform": (2, lambda rng, a, b: rng.uniform(a, b)),
+    "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean)),
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)),
+    "pareto": (2, lambda rng, scale, alpha: scale * rng.paretovariate(alpha)),
+}
+_STEP = re.compile(r"^\s*(\w+)\s*:\s*(\w+)\s*\(([^)]*)\)\s*(?:\[([^\]]*)\])?\s*$")
+
+
+# --------------------------
+# The work itself (module level so the process pool can pickle _burn)
+# --------------------------
+def _burn(seconds):
+    """Spin in pure Python until this thread has used `seconds` of CPU."""
+    end = time.thread_time() + seconds
+    x = 0
+    while time.thread_time() < end:
+        for i in range(1000):
+            x = (x * 31 + i) % 1_000_003
+    return x
+
+
+def _churn(seconds, megabytes):
+    held = [bytearray(1 << 20) for _ in range(megabytes)]
+    for buffer in held:
+        buffer[::4096] = b"\x01" * len(buffer[::4096])  # touch every page
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        garbage = [{"id": i, "tags": [str(i)] * 4} for i in range(2000)]
+        del garbage
+    return len(held)
+
+
+def _file_io(seconds, kilobytes, fsync):
+    block = os.urandom(kilobytes << 10)
+    end = time.perf_counter() + seconds
+    with tempfile.TemporaryFile() as f:
+        while True:
+            f.write(block)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            f.seek(-len(block), os.SEEK_CUR)
+            f.read(len(block))
+            if time.perf_counter() >= end:
+                break
+
+
+# --------------------------
+# Steps
+# --------------------------
+class WorkloadStep:
+    """One `kind:distribution[options]` item of a route."""
+
+    def __init__(self, kind, distribution, args, options=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown workload kind: {kind}")
+        if distribution not in _DISTRIBUTIONS:
+            raise ValueError(f"Unknown workload distribution: {distribution}")
+        arity, self._draw = _DISTRIBUTIONS[distribution]
+        if len(args) != arity:
+            raise ValueError(f"{distribution} takes {arity} argument(s), got {len(args)}")
+        self.kind = kind
+        self.distribution = distribution
+        self.args = tuple(args)
+        self.options = dict(options or {})
+        self.cap = float(self.options.get("max", "inf"))
+
+    @classmethod
+    def parse(cls, text):
+        match = _STEP.match(text)
+        if match is None:
+            raise ValueError(f"Invalid workload step: {text!r}")
+        kind, distribution, args, option_text = match.groups()
+        values = [float(arg) for arg in args.split(",") if arg.strip()]
+        options = {}
+        for item in filter(None, (part.strip() for part in (option_text or "").split(","))):
+            key, _, value = item.partition("=")
+            options[key.strip()] = value.strip()
+        return cls(kind, distribution, values, options)
+
+    def draw(self, rng):
+        return min(max(self._draw(rng, *self.args), 0.0), self.cap)
+
+    def __repr__(self):
+        options = ",".join(f"{key}={value}" for key, value in self.options.items())
+        args = ",".join(f"{arg:g}" for arg in self.args)
+        return f"{self.kind}:{self.distribution}({args})" + (f"[{options}]" if options else "")
+
+
+def parse_routes(spec):
+    """"/=cpu:fixed(0.1);/work=sleep:uniform(0.2,1)+io:fixed(0.01)" -> {route: [WorkloadStep, ...]}"""
+    routes = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        route, _, steps = item.partition("=")
+        routes[route.strip()] = [WorkloadStep.parse(step) for step in steps.split("+")]
+    return routes
+
+
+# --------------------------
+# Engine
+# --------------------------
+class WorkloadEngine:
+    """Runs each route's steps; run() returns the wall-clock seconds spent."""
+
+    def __init__(self, routes, downstream=None, urls=None, processes=None, seed=None):
+        self.routes = {
+            route: [step if isinstance(step, WorkloadStep) else WorkloadStep.parse(step) for step in steps]
+            for route, steps in routes.items()
+        }
+        self.downstream = downstream
+        self.urls = list(urls or [])
+        self.processes = processes
+        self._rng = random.Random(seed)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        for steps in self.routes.values():
+            if any(step.kind == "fanout" for step in steps) and (downstream is None or not self.urls):
+                raise ValueError("fanout workload needs a downstream client and URLs")
+
+    @classmethod
+    def from_env(cls, defaults, downstream=None, urls=None):
+        """`defaults` ({route: "step+step"}) overridden by WORKLOAD_FILE, then WORKLOAD_ROUTES."""
+        routes = {route: spec.split("+") for route, spec in defaults.items()}
+        if os.getenv("WORKLOAD_FILE"):
+            with open(os.environ["WORKLOAD_FILE"]) as f:
+                for route, steps in json.load(f).items():
+                    # "step+step" like the defaults and WORKLOAD_ROUTES, or a list of steps
+                    if isinstance(steps, str):
+                        steps = steps.split("+")
+                    elif not isinstance(steps, list):
+                        raise ValueError(f"WORKLOAD_FILE route {route}: expected a step string or list")
+                    routes[route] = steps
+        if os.getenv("WORKLOAD_ROUTES"):
+            routes.update(parse_routes(os.environ["WORKLOAD_ROUTES"]))
+        processes = int(os.getenv("WORKLOAD_PROCESSES", "0")) or None
+        return cls(routes, downstream=downstream, urls=urls, processes=processes)
+
+    @property
+    def pool(self):
+        # One pool per server process, started on first offloaded step
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        return self._pool
+
+    def _steps(self, route):
+        if route not in self.routes:
+            raise KeyError(f"No workload configured for route {route}")
+        return self.routes[route]
+
+    def _draw(self, step):
+        value = step.draw(self._rng)
+        left = remaining()
+        if left is None:
+            return value
+        if left <= 0:
+            raise DeadlineExceeded("deadline passed during simulated work")
+        return value if step.kind == "fanout" else min(value, left)
+
+    def run(self, route):
+        start = time.perf_counter()
+        for step in self._steps(route):
+            value = self._draw(step)
+            if step.kind == "sleep":
+                time.sleep(value)
+            elif step.kind == "cpu":
+                if step.options.get("offload") == "process":
+                    self.pool.submit(_burn, value).result()
+                else:
+                    _burn(value)
+            elif step.kind == "alloc":
+                _churn(value, int(step.options.get("mb", 16)))
+            elif step.kind == "io":
+                _file_io(value, int(step.options.get("kb", 64)), step.options.get("fsync") == "true")
+            else:
+                self.downstream.fan_out(self._fanout_urls(value), return_exceptions=True)
+        return time.perf_counter() - start
+
+    async def arun(self, route):
+        """run() for asyncio handlers: sleep, io and fan-out await; cpu and alloc block the loop unless offloaded."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for step in self._steps(route):
+            value = self._draw(step)
+            if step.kind == "sleep":
+                await asyncio.sleep(value)
+            elif step.kind == "cpu":
+                if step.options.get("offload") == "process":
+                    await loop.run_in_executor(self.pool, _burn, value)
+                else:
+                    _burn(value)
+            elif step.kind == "alloc":
+                _churn(value, int(step.options.get("mb", 16)))
+            elif step.kind == "io":
+                await loop.run_in_executor(
+                    None, _file_io, value, int(step.options.get("kb", 64)), step.options.get("fsync") == "true"
+                )
+            else:
+                await self.downstream.fan_out(self._fanout_urls(value), return_exceptions=True)
+        return time.perf_counter() - start
+
+    def _fanout_urls(self, value):
+        count = max(1, round(value))
+        return [self.urls[i % len(self.urls)] for i in range(count)]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -1,63 +1,66 @@
-import time
-import random
 import logging
 from flask import Flask, Response
-from opentelemetry import metrics
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
+
+from common.red import OTelRedMetrics
+from common.resources import observe_process
+from common.telemetry import setup_telemetry
+from common.workload import WorkloadEngine
 
 # ----------------
 # Flask Setup
 # ----------------
 app = Flask(__name__)
-FlaskInstrumentor().instrument_app(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("flask-app")
 
 # ----------------
 # OpenTelemetry Metrics (Alloy)
 # ----------------
-resource = Resource(attributes={"service.name": "flask-app"})
 # OTLP exporter directly pointing to Alloy
-otlp_exporter = OTLPMetricExporter(endpoint="http://alloy:4317", insecure=True)
-reader = PeriodicExportingMetricReader(otlp_exporter, export_interval_millis=5000)
-provider = MeterProvider(metric_readers=[reader], resource=resource)
-metrics.set_meter_provider(provider)
-meter = metrics.get_meter(__name__)
-
-# Counter for total requests
-REQUEST_COUNT = meter.create_counter("flask_request_count_total", "Total requests")
-# Histogram for request latency
-REQUEST_LATENCY = meter.create_histogram("flask_request_latency_seconds", "Request latency")
-# UpDownCounter for in-progress requests
-IN_PROGRESS = meter.create_up_down_counter("flask_inprogress_requests", "Requests in progress")
+telemetry = setup_telemetry(
+    "flask-app",
+    app=app,
+    traces_exporter="none",
+    metrics_exporter="otlp",
+    metrics_protocol="grpc",
+    metrics_endpoint="http://alloy:4317",
+    metric_export_interval_millis=5000,
+    # At most this many endpoint values per instrument; the rest become "other"
+    metrics_cardinality_limit=100,
+)
+meter = telemetry.meter(__name__)
 
-# Observable gauges
-def cpu_cb(obs):
-    obs.observe(random.uniform(5, 95))
-CPU_USAGE = meter.create_observable_gauge("flask_cpu_usage_percent", callbacks=[cpu_cb])
+# Request count, latency and in-progress for every route, recorded by request
+# hooks. Names and units are unchanged so the exported series still match the
+# flask-app dashboards.
+RED_METRICS = OTelRedMetrics(
+    app,
+    meter,
+    requests_name="flask_request_count_total",
+    latency_name="flask_request_latency_seconds",
+    inprogress_name="flask_inprogress_requests",
+    requests_unit="Total requests",
+    latency_unit="Request latency",
+    inprogress_unit="Requests in progress",
+    cpu_name="flask_request_cpu_seconds",
+    cardinality_guard=telemetry.cardinality,
+)
 
-def mem_cb(obs):
-    obs.observe(random.uniform(50, 500))
-MEMORY_USAGE = meter.create_observable_gauge("flask_memory_usage_mb", callbacks=[mem_cb])
+# Process CPU %, RSS, threads, fds and GC from /proc; one cached read per
+# collection is shared by all the callbacks
+PROCESS_SAMPLER = observe_process(meter)
 
 WORK_SUMMARY = meter.create_histogram("flask_work_time_seconds", "Work endpoint duration")
 
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)", "/work": "sleep:uniform(0.2,1.0)"})
+
 # ----------------
 # Routes
 # ----------------
 @app.route("/")
 def home():
-    endpoint = "/"
-    REQUEST_COUNT.add(1, {"endpoint": endpoint})
-    IN_PROGRESS.add(1, {"endpoint": endpoint})
-    duration = random.uniform(0.1, 0.5)
-    time.sleep(duration)
-    REQUEST_LATENCY.record(duration, {"endpoint": endpoint})
-    IN_PROGRESS.add(-1, {"endpoint": endpoint})
+    WORKLOAD.run("/")
 
     html = """
     <h1>Hello from Flask Metrics Demo (Alloy)</h1>
@@ -70,19 +73,12 @@ def home():
 
 @app.route("/work")
 def work():
-    endpoint = "/work"
-    REQUEST_COUNT.add(1, {"endpoint": endpoint})
-    IN_PROGRESS.add(1, {"endpoint": endpoint})
-    sleep_time = random.uniform(0.2, 1.0)
-    time.sleep(sleep_time)
-    WORK_SUMMARY.record(sleep_time, {"endpoint": endpoint})
-    REQUEST_LATENCY.record(sleep_time, {"endpoint": endpoint})
-    IN_PROGRESS.add(-1, {"endpoint": endpoint})
-    return f"Work completed in {sleep_time:.2f} seconds"
+    elapsed = WORKLOAD.run("/work")
+    WORK_SUMMARY.record(elapsed, {"endpoint": "/work"})
+    return f"Work completed in {elapsed:.2f} seconds"
 
 @app.route("/error")
 def error():
-    REQUEST_COUNT.add(1, {"endpoint": "/error"})
     raise Exception("Simulated failure")
 
 # ----------------
@@ -1,19 +1,21 @@
 import time
-import random
 import logging
+import os
 import sys
-from flask import Flask, Response
+from flask import Flask, Response, request
 from prometheus_client import (
     Counter,
     Histogram,
     Gauge,
     Summary,
-    generate_latest,
-    CONTENT_TYPE_LATEST,
-    CollectorRegistry,
-    multiprocess,
 )
 
+from common.cardinality import CardinalityGuard
+from common.exposition import MultiProcessExposition
+from common.red import PrometheusRedMetrics
+from common.resources import PrometheusProcessMetrics
+from common.workload import WorkloadEngine
+
 # ----------------
 # Flask Setup
 # ----------------
@@ -24,15 +26,42 @@ logger = logging.getLogger("flask-app")
 # ----------------
 # Prometheus Metrics
 # ----------------
-REQUEST_COUNT = Counter("flask_request_count", "Total requests", ["endpoint"])
+REQUEST_COUNT = Counter("flask_request_count", "Total requests", ["endpoint", "status_class"])
 REQUEST_LATENCY = Histogram(
-    "flask_request_latency_seconds", "Request latency", ["endpoint"]
+    "flask_request_latency_seconds", "Request latency", ["endpoint", "status_class"]
+)
+IN_PROGRESS = Gauge(
+    "flask_inprogress_requests", "Requests in progress", ["endpoint"], multiprocess_mode="livesum"
+)
+REQUEST_CPU = Histogram(
+    "flask_request_cpu_seconds", "CPU time per request", ["endpoint"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
 )
-IN_PROGRESS = Gauge("flask_inprogress_requests", "Requests in progress", ["endpoint"])
-CPU_USAGE = Gauge("flask_cpu_usage_percent", "Fake CPU usage %")
-MEMORY_USAGE = Gauge("flask_memory_usage_mb", "Fake memory usage in MB")
 WORK_SUMMARY = Summary("flask_work_time_seconds", "Time taken for /work endpoint")
 
+# Simulated work per route (WORKLOAD_ROUTES overrides, see common/workload.py)
+WORKLOAD = WorkloadEngine.from_env({"/": "sleep:uniform(0.1,0.5)", "/work": "sleep:uniform(0.2,1.0)"})
+
+# At most METRICS_CARDINALITY_LIMIT endpoint values per metric; the rest are
+# reported as "other" and counted in cardinality_overflow_total
+CARDINALITY_GUARD = CardinalityGuard(int(os.getenv("METRICS_CARDINALITY_LIMIT", "100"))).prometheus()
+
+# Count, latency and in-progress for every route (including /error) are
+# recorded by request hooks instead of in each handler
+PrometheusRedMetrics(
+    app, REQUEST_COUNT, REQUEST_LATENCY, IN_PROGRESS, REQUEST_CPU, cardinality_guard=CARDINALITY_GUARD
+)
+
+# Real CPU %, RSS, threads, fds and GC of this worker, read from /proc every
+# PROCESS_METRICS_INTERVAL seconds (flask_cpu_usage_percent, flask_memory_usage_mb, ...)
+PROCESS_METRICS = PrometheusProcessMetrics(
+    interval=float(os.getenv("PROCESS_METRICS_INTERVAL", "5.0"))
+).start()
+
+# Merged view of all workers' .db files in PROMETHEUS_MULTIPROC_DIR; rendered
+# output is reused for METRICS_CACHE_TTL seconds across scrapers
+EXPOSITION = MultiProcessExposition(ttl=float(os.getenv("METRICS_CACHE_TTL", "1.0")))
+
 # ----------------
 # Routes
 # ----------------
@@ -40,21 +69,13 @@ from flask import Response
 
 @app.route("/")
 def home():
-    endpoint = "/"
-    REQUEST_COUNT.labels(endpoint=endpoint).inc()
-    IN_PROGRESS.labels(endpoint=endpoint).inc()
     start = time.time()
 
-    # Simulated CPU + Memory load
-    sleep_time = random.uniform(0.1, 0.5)
-    time.sleep(sleep_time)
-    CPU_USAGE.set(random.uniform(5, 95))
-    MEMORY_USAGE.set(random.uniform(50, 500))
+    # Simulated work
+    WORKLOAD.run("/")
 
     duration = time.time() - start
-    REQUEST_LATENCY.labels(endpoint=endpoint).observe(duration)
     logger.info("Home endpoint hit", extra={"latency": duration})
-    IN_PROGRESS.labels(endpoint=endpoint).dec()
 
     html = """
     <h1>Hello from Flask Metrics Demo!</h1>
@@ -69,38 +90,25 @@ def home():
 
 @app.route("/work")
 def work():
-    endpoint = "/work"
-    REQUEST_COUNT.labels(endpoint=endpoint).inc()
-    IN_PROGRESS.labels(endpoint=endpoint).inc()
     start = time.time()
 
     with WORK_SUMMARY.time():
-        sleep_time = random.uniform(0.2, 1.0)
-        time.sleep(sleep_time)
-        CPU_USAGE.set(random.uniform(10, 90))
-        MEMORY_USAGE.set(random.uniform(100, 1000))
+        WORKLOAD.run("/work")
 
     duration = time.time() - start
-    REQUEST_LATENCY.labels(endpoint=endpoint).observe(duration)
     logger.info("Work endpoint done", extra={"latency": duration})
-    IN_PROGRESS.labels(endpoint=endpoint).dec()
 
     return f"Work completed in {duration:.2f} seconds"
 
 @app.route("/error")
 def error():
-    endpoint = "/error"
-    REQUEST_COUNT.labels(endpoint=endpoint).inc()
-    logger.error("Simulated error triggered", extra={"endpoint": endpoint})
+    logger.error("Simulated error triggered", extra={"endpoint": "/error"})
     raise Exception("Simulated failure in /error")
 
 @app.route("/metrics")
 def metrics():
-    # Default metrics + custom
-    registry = CollectorRegistry()
-    multiprocess.MultiProcessCollector(registry)
-    data = generate_latest(registry)
-    return Response(data, mimetype=CONTENT_TYPE_LATEST)
+    # Text or OpenMetrics, gzip if the scraper accepts it
+    return EXPOSITION.flask_response(request)
 
 # ----------------
 # Main